@@ -0,0 +1,346 @@
+# -*- coding: utf-8 -*-
+"""数据构建和转换的性能测试
+
+用仓库中的数据文件测试 merge_unihan.py 的各个步骤、拼音转换和两个生成脚本，
+记录耗时、峰值内存和每秒处理的条目数：
+
+    python benchmark.py                  # 运行所有测试，与基准比较
+    python benchmark.py --save-baseline  # 把本次结果保存为基准
+    python benchmark.py -k save_data2 -n 5
+
+每次的结果追加到 .cache/benchmark_history.json，
+比基准慢 --threshold（默认 20%）以上的测试会被列出，并且返回 1。
+生成文件的测试在临时目录中运行，不会改动仓库中的文件。
+
+另外在新的进程中测量 pinyin_compact 的启动开销（导入、加载并查询一个 BMP 汉字），
+惰性加载超过 STARTUP_LIMITS 或者解析了 BMP 以外的范围时同样返回 1。
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import runpy
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import compare_sources
+import merge_unihan
+import pinyin_tone
+
+DATA_DIR = os.path.dirname(os.path.abspath(__file__))
+HISTORY_PATH = os.path.join(DATA_DIR, '.cache', 'benchmark_history.json')
+BASELINE_PATH = os.path.join(DATA_DIR, '.cache', 'benchmark_baseline.json')
+
+BENCHMARKS = {}
+
+# 惰性加载时导入 pinyin_compact 并查询一个 BMP 汉字的上限，不包括解释器本身的启动
+STARTUP_LIMITS = {'seconds': 0.05, 'rss_mb': 4}
+_STARTUP_SCRIPT = '''
+import json, os, sys, time
+
+
+def rss_mb():
+    try:
+        with open('/proc/self/statm') as fp:
+            return int(fp.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except OSError:  # 不是 Linux 时不测内存
+        return 0.0
+
+
+rss = rss_mb()
+start = time.perf_counter()
+import pinyin_compact
+imported = time.perf_counter()
+compact = pinyin_compact.{}()
+compact.lookup('中')
+end = time.perf_counter()
+json.dump({{
+    'import': imported - start,
+    'seconds': end - start,
+    'rss_mb': rss_mb() - rss,
+    'pages': sum(table.loaded_pages if isinstance(table, pinyin_compact.LazyTable)
+                 else -(-len(table) // pinyin_compact.PAGE_SIZE)
+                 for _, _, table in compact.ranges),
+}}, sys.stdout)
+'''
+
+
+def benchmark(func):
+    """注册测试，func() 返回 (要计时的函数, 每次调用处理的条目数)"""
+    BENCHMARKS[func.__name__] = func
+    return func
+
+
+def _read(name):
+    with open(os.path.join(DATA_DIR, name), encoding='utf8') as fp:
+        return fp.read()
+
+
+@contextlib.contextmanager
+def _chdir(path):
+    old = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(old)
+
+
+def _merged():
+    with _chdir(DATA_DIR):
+        return dict(merge_unihan.merge_sources())
+
+
+@contextlib.contextmanager
+def _workdir():
+    """临时目录中只有 pinyin.txt，生成的文件都写在这里"""
+    with tempfile.TemporaryDirectory() as tmp:
+        shutil.copy(os.path.join(DATA_DIR, 'pinyin.txt'), tmp)
+        with _chdir(tmp):
+            yield
+
+
+@benchmark
+def parse_pinyins():
+    text = _read('kMandarin.txt')
+    lines = text.count('\n')
+    return lambda: merge_unihan.parse_pinyins(io.StringIO(text)), lines
+
+
+@benchmark
+def merge_sources():
+    def run():
+        with _chdir(DATA_DIR):
+            for _ in merge_unihan.merge_sources():
+                pass
+    return run, len(_merged())
+
+
+@benchmark
+def merge():
+    maps = {}
+    for name in ('kXHC1983.txt', 'kMandarin.txt', 'overwrite.txt'):
+        maps[name] = merge_unihan.parse_pinyins(io.StringIO(_read(name)))
+    raw, adjust, overwrite = maps.values()
+    return lambda: merge_unihan.merge(raw, adjust, overwrite), len(raw)
+
+
+@benchmark
+def sort_pinyin_dict():
+    merged = _merged()
+    items = list(merged.items())[::-1]
+
+    def run():
+        # sort_pinyin_dict 会原地排序拼音，每次都用新的列表
+        merge_unihan.sort_pinyin_dict({code: list(pinyins) for code, pinyins in items})
+    return run, len(items)
+
+
+@benchmark
+def save_data2():
+    merged = merge_unihan.sort_pinyin_dict(_merged())
+
+    def run():
+        with _workdir():
+            merge_unihan.save_data2(merged)
+    return run, len(merged)
+
+
+@benchmark
+def compare_all_sources():
+    with _chdir(DATA_DIR):
+        table = compare_sources.build_table()
+    names = [name for name, _ in compare_sources.COMPARE_SOURCES if name != 'merged']
+
+    def run():
+        for name in names:
+            compare_sources.compare(table, 'merged', name)
+    return run, len(table.codes) * len(names)
+
+
+def _all_pinyins():
+    return sorted({pinyin for pinyins in _merged().values() for pinyin in pinyins})
+
+
+@benchmark
+def pinyin_to_ascii_num():
+    pinyins = _all_pinyins()
+
+    def run():
+        pinyin_tone.convert.cache_clear()
+        for pinyin in pinyins:
+            merge_unihan.pinyin_to_ascii_num(pinyin)
+    return run, len(pinyins)
+
+
+@benchmark
+def pinyin_to_double_pinyin_xiaohe():
+    pinyins = _all_pinyins()
+
+    def run():
+        pinyin_tone.convert.cache_clear()
+        for pinyin in pinyins:
+            merge_unihan.pinyin_to_double_pinyin_xiaohe(pinyin)
+    return run, len(pinyins)
+
+
+def _generator(script):
+    path = os.path.join(DATA_DIR, 'generate', script)
+
+    def run():
+        with _workdir():
+            # 生成脚本用 sys.path.append('.') 导入仓库中的模块
+            if DATA_DIR not in sys.path:
+                sys.path.insert(0, DATA_DIR)
+            with contextlib.redirect_stdout(io.StringIO()):
+                runpy.run_path(path, run_name='__main__')
+    return run, _read('pinyin.txt').count('\n') - 2
+
+
+@benchmark
+def pinyin_initial_regex():
+    return _generator('pinyin_initial_regex.py')
+
+
+@benchmark
+def pinyin_initial_table():
+    return _generator('pinyin_initial_table.py')
+
+
+def run_benchmark(name, repeat):
+    func, items = BENCHMARKS[name]()
+    func()  # 预热
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    # tracemalloc 会拖慢运行，峰值内存单独测一次
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    best = min(times)
+    return {
+        'min': best,
+        'median': statistics.median(times),
+        'peak_memory': peak,
+        'items': items,
+        'items_per_second': items / best if best else None,
+    }
+
+
+def measure_startup(loader, repeat=3):
+    """在新的进程中运行 pinyin_compact.<loader>()，返回耗时最少的一次"""
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, '-c', _STARTUP_SCRIPT.format(loader)],
+            cwd=DATA_DIR, stdout=subprocess.PIPE, check=True,
+        ).stdout
+        runs.append(json.loads(output))
+    return min(runs, key=lambda run: run['seconds'])
+
+
+def check_startup(startup, limits=STARTUP_LIMITS):
+    """返回惰性加载超出上限的描述"""
+    lazy = startup['load_lazy']
+    problems = ['startup {} {:.3f} > {}'.format(key, lazy[key], limit)
+                for key, limit in sorted(limits.items()) if lazy[key] > limit]
+    if lazy['pages'] != 1:
+        problems.append('startup parsed {} pages for a BMP lookup'.format(lazy['pages']))
+    return problems
+
+
+def compare(results, baseline, threshold):
+    """返回比基准慢 threshold 以上的 [(名称, 基准耗时, 本次耗时)]"""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base and result['min'] > base['min'] * (1 + threshold):
+            regressions.append((name, base['min'], result['min']))
+    return regressions
+
+
+def _load_json(path, default):
+    try:
+        with open(path, encoding='utf8') as fp:
+            return json.load(fp)
+    except (OSError, ValueError):
+        return default
+
+
+def _save_json(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf8') as fp:
+        json.dump(data, fp, indent=1, sort_keys=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='benchmark the data build')
+    parser.add_argument('-k', dest='names', action='append', choices=BENCHMARKS,
+                        help='only run this benchmark, can be repeated')
+    parser.add_argument('-n', '--repeat', type=int, default=3)
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='allowed slowdown relative to the baseline (default 0.2)')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--history', default=HISTORY_PATH)
+    parser.add_argument('--save-baseline', action='store_true')
+    args = parser.parse_args(argv)
+
+    results = {}
+    print('{:32} {:>10} {:>10} {:>10} {:>12}'.format(
+        'benchmark', 'min (s)', 'median', 'peak (MB)', 'items/s'))
+    for name in args.names or BENCHMARKS:
+        result = results[name] = run_benchmark(name, args.repeat)
+        print('{:32} {:10.4f} {:10.4f} {:10.2f} {:12.0f}'.format(
+            name, result['min'], result['median'], result['peak_memory'] / 2**20,
+            result['items_per_second'] or 0))
+
+    startup = {}
+    print()
+    print('{:32} {:>10} {:>10} {:>10} {:>12}'.format(
+        'startup', 'import (s)', 'total', 'rss (MB)', 'pages'))
+    for loader in ('load', 'load_binary', 'load_lazy'):
+        result = startup[loader] = measure_startup(loader, args.repeat)
+        print('{:32} {:10.4f} {:10.4f} {:10.2f} {:12}'.format(
+            loader, result['import'], result['seconds'], result['rss_mb'],
+            result['pages']))
+
+    history = _load_json(args.history, [])
+    history.append({
+        'time': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'results': results,
+        'startup': startup,
+    })
+    _save_json(args.history, history)
+
+    if args.save_baseline:
+        baseline = _load_json(args.baseline, {})
+        baseline.update(results)
+        _save_json(args.baseline, baseline)
+        print('saved baseline to {}'.format(args.baseline))
+        return 0
+
+    regressions = compare(results, _load_json(args.baseline, {}), args.threshold)
+    for name, base, current in regressions:
+        print('regression: {} {:.4f}s -> {:.4f}s ({:+.0%})'.format(
+            name, base, current, current / base - 1))
+    problems = check_startup(startup)
+    for problem in problems:
+        print('regression: ' + problem)
+    return 1 if regressions or problems else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+"""生成所有数据文件
+
+每个任务声明输入和输出文件，一个任务的输入是另一个任务的输出时，它在后者完成后运行，
+互不依赖的任务在进程池中并行运行。输入和输出都没有变化的任务会跳过：
+
+    python build_all.py                # 生成所有文件
+    python build_all.py -j 4 pinyin.txt initial_regex_gbk
+    python build_all.py --list
+
+输入和输出文件的哈希记录在 .cache/build_all.json 中。
+"""
+import argparse
+from collections import namedtuple
+import concurrent.futures
+import json
+import os
+import runpy
+import subprocess
+import sys
+
+import charset_index
+import merge_unihan
+import pinyin_phrase
+
+DATA_DIR = os.path.dirname(os.path.abspath(__file__))
+STATE_PATH = '.cache/build_all.json'
+
+# manual 的任务只在指定时运行，它的输出是手工维护的来源，不作为其他任务的依赖
+Job = namedtuple('Job', 'name inputs outputs func args manual')
+
+
+def _merge():
+    merge_unihan.build(verbose=False)
+
+
+def _index():
+    runpy.run_path('pinyin_index.py', run_name='__main__')
+
+
+def _charset():
+    charset_index.main([])
+
+
+def _initial_regex(charset):
+    module = runpy.run_path('generate/pinyin_initial_regex.py',
+                            run_name='pinyin_initial_regex')
+    module['generate'](charset, module['load_lines']())
+
+
+def _initial_table():
+    runpy.run_path('generate/pinyin_initial_table.py', run_name='__main__')
+
+
+def _cc_cedict():
+    with open('cc_cedict.txt', 'w', encoding='utf8') as fp:
+        subprocess.run([sys.executable, 'gen_cc_cedict.py',
+                        'phrase-pinyin-data/cc_cedict.txt'],
+                       cwd='tools', stdout=fp, check=True)
+
+
+def _phrase():
+    pinyin_phrase.main([])
+
+
+def _pua():
+    with open('GBK_PUA.txt', 'w', encoding='utf8') as fp:
+        subprocess.run([sys.executable, 'tools/gen_gb_pua.py'], stdout=fp, check=True)
+
+
+_MERGE_CODE = ('merge_unihan.py', 'pinyin_compact.py', 'page_table.py', 'pinyin_map.py',
+               'pinyin_tone.py', 'double_pinyin.py', 'profiling.py')
+JOBS = (
+    Job('pinyin', merge_unihan.SOURCES + _MERGE_CODE, merge_unihan.OUTPUTS,
+        _merge, (), False),
+    Job('index', merge_unihan.SOURCES + _MERGE_CODE + (
+        'pinyin_index.py', 'tools/china-8105-06062014.txt', 'pinyin_compact.txt',
+    ), ('pinyin_index.bin',), _index, (), False),
+    Job('charset', ('pinyin.txt', 'charset_index.py', 'pinyin_index.py',
+                    'tools/china-8105-06062014.txt',
+                    'pinyin_compact.txt') + _MERGE_CODE,
+        ('charset_index.bin',) + tuple(
+            'pinyin_compact_{}.{}'.format(charset, ext)
+            for charset in charset_index.SUBSET_CHARSETS for ext in ('txt', 'bin')
+        ), _charset, (), False),
+) + tuple(
+    Job('initial_regex_' + charset, (
+        'pinyin.txt', 'generate/pinyin_initial_regex.py', 'pinyin_regex.py',
+        'pinyin_tone.py',
+    ) + (('charset_index.bin',) if charset in charset_index.CHARSETS else ()),
+        ('output_pinyin_initial_regex_{}.txt'.format(charset),),
+        _initial_regex, (charset,), False)
+    for charset in ('gb2312', 'gbk', 'utf8')
+) + (
+    Job('initial_table', (
+        'pinyin.txt', 'charset_index.bin', 'generate/pinyin_initial_table.py',
+        'page_table.py', 'pinyin_initial.py', 'pinyin_tone.py',
+    ), tuple(
+        'output_pinyin_initial_table{}.{}'.format(suffix, ext)
+        for suffix in ('',) + tuple('_' + charset for charset in charset_index.SUBSET_CHARSETS)
+        for ext in ('txt', 'bin')
+    ), _initial_table, (), False),
+    Job('cc_cedict', (
+        'tools/phrase-pinyin-data/cc_cedict.txt', 'tools/gen_cc_cedict.py',
+    ), ('cc_cedict.txt',), _cc_cedict, (), False),
+    Job('phrase', tuple(
+        os.path.relpath(path, DATA_DIR) for path in pinyin_phrase.DEFAULT_SOURCES
+    ) + ('pinyin_phrase.py',), ('pinyin_phrase.bin',), _phrase, (), False),
+    Job('pua', ('pinyin.txt', 'tools/gen_gb_pua.py'), ('GBK_PUA.txt',),
+        _pua, (), True),
+)
+
+
+def select_jobs(targets, jobs=JOBS):
+    """按任务名或输出文件选择任务，没有指定时选择所有非 manual 的任务"""
+    if not targets:
+        return [job for job in jobs if not job.manual]
+    selected = []
+    for target in targets:
+        for job in jobs:
+            if target == job.name or target in job.outputs:
+                if job not in selected:
+                    selected.append(job)
+                break
+        else:
+            raise ValueError('unknown target: {}'.format(target))
+    return selected
+
+
+def dependencies(jobs):
+    """{任务名: {依赖的任务名}}，只考虑 jobs 中的任务"""
+    producers = {
+        output: job.name for job in jobs if not job.manual for output in job.outputs
+    }
+    return {
+        job.name: {producers[path] for path in job.inputs
+                   if path in producers and producers[path] != job.name}
+        for job in jobs
+    }
+
+
+def _hashes(paths):
+    return {path: merge_unihan.file_hash(path) for path in paths}
+
+
+def is_up_to_date(job, state):
+    recorded = state.get(job.name)
+    if not recorded or not all(map(os.path.exists, job.outputs)):
+        return False
+    return (recorded['inputs'] == _hashes(job.inputs)
+            and recorded['outputs'] == _hashes(job.outputs))
+
+
+def _load_state(path):
+    try:
+        with open(path, encoding='utf8') as fp:
+            return json.load(fp)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_state(path, state):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf8') as fp:
+        json.dump(state, fp, indent=1, sort_keys=True)
+
+
+def _run(job):
+    job.func(*job.args)
+
+
+def build(targets=None, processes=None, force=False, state_path=STATE_PATH,
+          log=print):
+    """返回 {任务名: 状态}，状态是 built、up to date、missing input、failed 或 skipped"""
+    jobs = {job.name: job for job in select_jobs(targets)}
+    deps_of = dependencies(jobs.values())
+    pending = {name: set(deps) for name, deps in deps_of.items()}
+    state = _load_state(state_path)
+    status = {}
+    running = {}
+
+    def finish(name, result):
+        status[name] = result
+        log('{:24} {}'.format(name, result))
+        for deps in pending.values():
+            deps.discard(name)
+
+    with concurrent.futures.ProcessPoolExecutor(processes) as pool:
+        while pending or running:
+            ready = [name for name, deps in pending.items() if not deps]
+            if not ready and not running:
+                raise ValueError('dependency cycle: {}'.format(' '.join(pending)))
+            for name in ready:
+                del pending[name]
+                job = jobs[name]
+                missing = [path for path in job.inputs if not os.path.exists(path)]
+                if any(status[dep] not in ('built', 'up to date')
+                       for dep in deps_of[name]):
+                    finish(name, 'skipped')
+                elif missing:
+                    finish(name, 'missing input ' + ', '.join(missing))
+                elif not force and is_up_to_date(job, state):
+                    finish(name, 'up to date')
+                else:
+                    running[pool.submit(_run, job)] = name
+            if not running:
+                continue
+            done, _ = concurrent.futures.wait(
+                running, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                job = jobs[name]
+                if future.exception() is not None:
+                    finish(name, 'failed: {!r}'.format(future.exception()))
+                    continue
+                state[name] = {'inputs': _hashes(job.inputs),
+                               'outputs': _hashes(job.outputs)}
+                _save_state(state_path, state)
+                finish(name, 'built')
+    return status
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='build all generated data files')
+    parser.add_argument('targets', nargs='*',
+                        help='job names or output files, default all but manual jobs')
+    parser.add_argument('-j', '--processes', type=int, default=None,
+                        help='number of worker processes, default all cores')
+    parser.add_argument('--force', action='store_true',
+                        help='rebuild even if inputs did not change')
+    parser.add_argument('--list', action='store_true', help='list jobs and exit')
+    args = parser.parse_args(argv)
+
+    os.chdir(DATA_DIR)
+    if args.list:
+        for job in JOBS:
+            print('{}{}: {} -> {}'.format(
+                job.name, ' (manual)' if job.manual else '',
+                ' '.join(job.inputs), ' '.join(job.outputs)))
+        return 0
+    status = build(args.targets, args.processes, args.force)
+    return 1 if any(result.startswith('failed') for result in status.values()) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+"""按码位查询 pinyin.txt 中的汉字属于哪些字符集
+
+    >>> import charset_index
+    >>> index = charset_index.load_binary()
+    >>> ord('中') in index['gb2312'], ord('丟') in index['big5']
+    (True, True)
+    >>> index.charsets_of(ord('㐀'))
+    ['gb18030']
+
+支持 GB2312、GBK、GB18030、Big5 和《通用规范汉字表》（8105），
+前四种与 hanzi.encode(charset) 不抛出 UnicodeEncodeError 等价。
+每个字符集保存为一个位图：从第一个属于它的码位（按 8 对齐）开始，每个码位一位，
+charset_index.bin 是位图的二进制版本，可以用 mmap 零拷贝读取，
+其中记录了生成时 pinyin.txt 的哈希，load_or_build 发现 pinyin.txt 变化时重新计算。
+
+    python charset_index.py -v  # 生成 charset_index.bin 和各字符集的子集，输出大小
+
+子集只包含属于该字符集的汉字，范围收缩到这些汉字所在的码位（大段空白处拆开），
+拼音和拼音组合也只保留用到的，给只需要 GB2312 或 8105 的嵌入式程序使用：
+
+    pinyin_compact_gb2312.txt, pinyin_compact_gb2312.bin
+    pinyin_compact_8105.txt, pinyin_compact_8105.bin
+"""
+import argparse
+import collections
+import io
+import mmap
+import os
+import struct
+import sys
+
+import merge_unihan
+from pinyin_index import CHINA_8105_PATH, load_8105_levels
+
+DATA_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_PATH = os.path.join(DATA_DIR, 'charset_index.bin')
+PINYIN_PATH = os.path.join(DATA_DIR, 'pinyin.txt')
+
+# 8105 是《通用规范汉字表》，其余是 Python 的编码名
+CHARSETS = ('gb2312', 'gbk', 'gb18030', 'big5', '8105')
+# 生成子集的字符集
+SUBSET_CHARSETS = ('gb2312', '8105')
+
+# charset_index.bin 的格式，所有整数都是小端序：
+#
+#   header: magic, version, 字符集数, 生成时 pinyin.txt 的 sha256
+#   字符集目录: (名称, 起始码位, 位数, 成员数) * 字符集数，名称是 8 字节 ASCII，不足补 \0
+#   位图: 所有字符集的位图依次拼接，码位 start + i 对应第 i // 8 字节的第 i % 8 位
+#
+# 每一段都按 4 字节对齐
+BINARY_MAGIC = b'PYCS'
+BINARY_VERSION = 2
+BINARY_HEADER = struct.Struct('<4sHH32s')
+BINARY_CHARSET = struct.Struct('<8sIII')
+
+
+class Bitmap:
+    """一个字符集的成员，code in bitmap 是 O(1) 的"""
+    __slots__ = ('start', 'size', 'count', 'bits')
+
+    def __init__(self, start, size, count, bits):
+        self.start = start
+        self.size = size
+        self.count = count
+        self.bits = bits
+
+    @classmethod
+    def from_codes(cls, codes):
+        codes = sorted(set(codes))
+        if not codes:
+            return cls(0, 0, 0, bytearray())
+        start = codes[0] & ~7
+        size = codes[-1] + 1 - start
+        bits = bytearray((size + 7) // 8)
+        for code in codes:
+            i = code - start
+            bits[i >> 3] |= 1 << (i & 7)
+        return cls(start, size, len(codes), bits)
+
+    def __contains__(self, code):
+        i = code - self.start
+        return 0 <= i < self.size and bool(self.bits[i >> 3] >> (i & 7) & 1)
+
+    def __iter__(self):
+        start = self.start
+        for j, byte in enumerate(self.bits):
+            while byte:
+                low = byte & -byte
+                yield start + j * 8 + low.bit_length() - 1
+                byte ^= low
+
+    def __len__(self):
+        return self.count
+
+
+class CharsetIndex:
+    __slots__ = ('bitmaps', 'source_hash')
+
+    def __init__(self, bitmaps, source_hash=None):
+        self.bitmaps = bitmaps  # {字符集: Bitmap}，顺序与 CHARSETS 相同
+        self.source_hash = source_hash  # 码位来自的 pinyin.txt 的 sha256 十六进制，未知时是 None
+
+    def __getitem__(self, charset):
+        return self.bitmaps[charset]
+
+    def __contains__(self, charset):
+        return charset in self.bitmaps
+
+    def contains(self, charset, code):
+        return code in self.bitmaps[charset]
+
+    def charsets_of(self, code):
+        return [name for name, bitmap in self.bitmaps.items() if code in bitmap]
+
+
+def _encodable(code, charset):
+    try:
+        chr(code).encode(charset)
+    except UnicodeEncodeError:
+        return False
+    return True
+
+
+def load_codes(path=PINYIN_PATH):
+    """pinyin.txt 中的所有码位"""
+    with open(path, encoding='utf8') as fp:
+        return [merge_unihan.code_to_int(code) for code, _ in merge_unihan.iter_pinyins(fp)]
+
+
+def build(codes=None, levels=None, source_hash=None):
+    """codes 中每个码位属于哪些字符集，默认是 pinyin.txt 中的码位"""
+    if codes is None:
+        codes = load_codes()
+        source_hash = merge_unihan.file_hash(PINYIN_PATH)
+    if levels is None:
+        levels = load_8105_levels(CHINA_8105_PATH)
+    bitmaps = {}
+    for charset in CHARSETS:
+        if charset == '8105':
+            members = [code for code in codes if code in levels]
+        else:
+            members = [code for code in codes if _encodable(code, charset)]
+        bitmaps[charset] = Bitmap.from_codes(members)
+    return CharsetIndex(bitmaps, source_hash)
+
+
+def _pad(size):
+    return b'\0' * (-size % 4)
+
+
+def save_binary(index, fp):
+    fp.write(BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, len(index.bitmaps),
+                                bytes.fromhex(index.source_hash or '')))
+    for name, bitmap in index.bitmaps.items():
+        fp.write(BINARY_CHARSET.pack(name.encode('ascii'), bitmap.start,
+                                     bitmap.size, bitmap.count))
+    for bitmap in index.bitmaps.values():
+        fp.write(bitmap.bits)
+        fp.write(_pad(len(bitmap.bits)))
+
+
+def parse_binary(buffer):
+    view = memoryview(buffer)
+    magic, version, count, source_hash = BINARY_HEADER.unpack_from(view)
+    if magic != BINARY_MAGIC:
+        raise ValueError('not a charset_index.bin file')
+    if version != BINARY_VERSION:
+        raise ValueError('unsupported version: {}'.format(version))
+    pos = BINARY_HEADER.size
+    entries = []
+    for _ in range(count):
+        entries.append(BINARY_CHARSET.unpack_from(view, pos))
+        pos += BINARY_CHARSET.size
+
+    bitmaps = {}
+    for name, start, size, members in entries:
+        length = (size + 7) // 8
+        bitmaps[name.rstrip(b'\0').decode('ascii')] = Bitmap(
+            start, size, members, view[pos:pos + length])
+        pos += length + (-length % 4)
+    return CharsetIndex(bitmaps, source_hash.hex() if any(source_hash) else None)
+
+
+def load_binary(path=DEFAULT_PATH):
+    with open(path, 'rb') as fp:
+        buffer = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+    return parse_binary(buffer)
+
+
+def load_or_build(path=DEFAULT_PATH, pinyin_path=PINYIN_PATH):
+    """charset_index.bin 不存在（它不在版本库中）、格式不对或者不是由当前的
+    pinyin_path 生成时，从 pinyin_path 计算"""
+    source_hash = merge_unihan.file_hash(pinyin_path)
+    try:
+        index = load_binary(path)
+    except (OSError, ValueError, struct.error):
+        index = None
+    if index is not None and index.source_hash == source_hash:
+        return index
+    return build(load_codes(pinyin_path), source_hash=source_hash)
+
+
+def save_subset(charset, index, pinyin_map):
+    """生成 pinyin_compact_{charset}.txt 和 .bin，返回两个文件的字节数"""
+    bitmap = index[charset]
+    subset = collections.OrderedDict(
+        (code, pinyins) for code, pinyins in pinyin_map.items()
+        if merge_unihan.code_to_int(code) in bitmap
+    )
+    all_pinyins, _, pinyin_multi_combinations, tables = \
+        merge_unihan.build_compact_tables(subset, merge_unihan.compact_ranges(
+            map(merge_unihan.code_to_int, subset)))
+    pinyin_rows = merge_unihan.compact_pinyin_rows(all_pinyins)
+    paths = ('pinyin_compact_{}.txt'.format(charset),
+             'pinyin_compact_{}.bin'.format(charset))
+    merge_unihan.save_compact(paths[0], paths[1], pinyin_rows,
+                              pinyin_multi_combinations, tables)
+    return [os.path.getsize(path) for path in paths]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='build charset membership bitmaps')
+    parser.add_argument('--subset', dest='subsets', action='append',
+                        choices=CHARSETS,
+                        help='write pinyin_compact_CHARSET.txt/.bin, can be repeated, '
+                             'default: {}'.format(','.join(SUBSET_CHARSETS)))
+    parser.add_argument('-v', '--verbose', action='store_true',
+                        help='print bitmap and subset sizes')
+    args = parser.parse_args(argv)
+
+    os.chdir(DATA_DIR)
+    with open('pinyin.txt', encoding='utf8') as fp:
+        pinyin_map = merge_unihan.parse_pinyins(fp)
+    index = build([merge_unihan.code_to_int(code) for code in pinyin_map],
+                  source_hash=merge_unihan.file_hash('pinyin.txt'))
+    f = io.BytesIO()
+    save_binary(index, f)
+    merge_unihan.write_if_changed('charset_index.bin', f.getvalue())
+
+    sizes = {charset: save_subset(charset, index, pinyin_map)
+             for charset in args.subsets or SUBSET_CHARSETS}
+    if not args.verbose:
+        return 0
+    print('{:10} {:>8} {:>10}'.format('charset', 'chars', 'bitmap'))
+    for name, bitmap in index.bitmaps.items():
+        print('{:10} {:8} {:10}'.format(name, len(bitmap), len(bitmap.bits)))
+    full = [os.path.getsize(path) for path in ('pinyin_compact.txt', 'pinyin_compact.bin')]
+    print('\n{:10} {:>10} {:>10}'.format('subset', 'txt', 'bin'))
+    print('{:10} {:10} {:10}'.format('all', *full))
+    for charset, (txt, binary) in sizes.items():
+        print('{:10} {:10} {:10}'.format(charset, txt, binary))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+"""比较各个拼音来源，列出读音不一致的汉字
+
+    python compare_sources.py                     # 各来源与合并结果（pinyin.txt）比较
+    python compare_sources.py --reference zdic --details diff.tsv
+    python compare_sources.py -s kMandarin -s zdic
+
+所有来源一次读入一张按码位排列的列式表：所有来源的码位的并集是表的行，
+每个来源一列，保存为 (starts, ids)，第 r 行的读音是 ids[starts[r]:starts[r + 1]]，
+第一个是最常用的读音。比较两个来源就是对这些数组做集合运算，有 numpy 时是向量化的。
+
+对每个来源报告（相对于 --reference）：
+* primary: 两边都有的字，最常用的读音不同
+* missing: 两边都有的字，来源中有而 reference 中没有的读音
+* extra: 两边都有的字，reference 中有而来源中没有的读音
+* only: 只有来源中有的字
+
+解析后的表按文件哈希缓存在 .cache/compare_sources.pickle 中。
+"""
+from array import array
+import argparse
+from collections import namedtuple
+import os
+import pickle
+import re
+import sys
+import time
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+import merge_unihan
+from pinyin_map import SyllableTable, int_to_code
+
+# (来源名, 文件)，merged 是合并后的结果
+COMPARE_SOURCES = (
+    ('kHanyuPinyin', 'kHanyuPinyin.txt'),
+    ('kXHC1983', 'kXHC1983.txt'),
+    ('kTGHZ2013', 'kTGHZ2013.txt'),
+    ('kMandarin', 'kMandarin.txt'),
+    ('kHanyuPinlu', 'kHanyuPinlu.txt'),
+    ('zdic', 'zdic.txt'),
+    ('cc_cedict', 'cc_cedict.txt'),
+    ('merged', 'pinyin.txt'),
+)
+CACHE_PATH = '.cache/compare_sources.pickle'
+KINDS = ('primary', 'missing', 'extra', 'only')
+
+_LINE = re.compile(r'^U\+([0-9A-Fa-f]+):([^#\n]*)', re.M)
+
+Column = namedtuple('Column', 'starts ids')
+# 一个来源与 reference 比较的结果，都是行号，missing 和 extra 是 (行号, 音节 id)
+Diff = namedtuple('Diff', KINDS)
+
+
+class SourceTable:
+    """codes: 所有来源的码位的并集，有序；columns: {来源名: Column}"""
+    __slots__ = ('syllables', 'codes', 'columns')
+
+    def __init__(self, syllables, codes, columns):
+        self.syllables = syllables
+        self.codes = codes
+        self.columns = columns
+
+    def readings(self, name, row):
+        column = self.columns[name]
+        names = self.syllables.names
+        return [names[i] for i in column.ids[column.starts[row]:column.starts[row + 1]]]
+
+
+def parse_source(text, syllables):
+    """{int code: [音节 id]}，同一个码位重复的读音只保留第一个"""
+    intern = syllables.intern
+    parsed = {}  # 读音字符串大量重复，每种只解析一次
+    readings = {}
+    for code, pinyins in _LINE.findall(text):
+        ids = parsed.get(pinyins)
+        if ids is None:
+            ids = parsed[pinyins] = list(dict.fromkeys(
+                intern(pinyin) for pinyin in pinyins.replace(',', ' ').split()
+            ))
+        if ids:
+            readings[int(code, 16)] = ids
+    return readings
+
+
+def _read(path):
+    with open(path, encoding='utf8') as fp:
+        return fp.read()
+
+
+def _merged_primary(readings, parsed, syllables):
+    """pinyin.txt 中的读音是排序后的，多音字最常用的读音按合并规则重新计算"""
+    names = syllables.names
+    for code, ids in readings.items():
+        if len(ids) < 2:
+            continue
+        pinyins = merge_unihan.merge_readings({
+            name: [names[i] for i in source[code]]
+            for name, source in parsed.items() if code in source
+        }, sort=False)
+        primary = syllables.intern(pinyins[0])
+        readings[code] = [primary] + [i for i in ids if i != primary]
+
+
+def build_table(sources=COMPARE_SOURCES, directory='.'):
+    """读取所有来源，每个文件只读一次"""
+    syllables = SyllableTable()
+    paths = {path for _, path in sources} | set(merge_unihan.SOURCES)
+    parsed = {path: parse_source(_read(os.path.join(directory, path)), syllables)
+              for path in sorted(paths)}
+    columns = {name: parsed[path] for name, path in sources}
+    if 'merged' in columns:
+        merged = columns['merged'] = dict(columns['merged'])
+        _merged_primary(merged, {name: parsed[name] for name in merge_unihan.SOURCES},
+                        syllables)
+
+    codes = array('I', sorted(set().union(*columns.values())))
+    for name, readings in columns.items():
+        starts = array('I', [0])
+        ids = array('H')
+        for code in codes:
+            ids.extend(readings.get(code, ()))
+            starts.append(len(ids))
+        columns[name] = Column(starts, ids)
+    return SourceTable(syllables, codes, columns)
+
+
+def load_table(sources=COMPARE_SOURCES, cache_path=CACHE_PATH):
+    """与 build_table 相同，所有文件都没有改动时使用缓存"""
+    paths = sorted({path for _, path in sources} | set(merge_unihan.SOURCES)) + [
+        os.path.abspath(__file__), os.path.abspath(merge_unihan.__file__)]
+    key = (tuple(sources), {path: merge_unihan.file_hash(path) for path in paths})
+    # 作为脚本运行时类在 __main__ 中，缓存中只保存 array 等内置类型
+    try:
+        with open(cache_path, 'rb') as fp:
+            cached_key, (names, codes, columns) = pickle.load(fp)
+        if cached_key == key:
+            return SourceTable(SyllableTable(names), codes, {
+                name: Column(*column) for name, column in columns.items()
+            })
+    except (OSError, EOFError, pickle.UnpicklingError, ValueError):
+        pass
+    table = build_table(sources)
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    with open(cache_path, 'wb') as fp:
+        pickle.dump((key, (table.syllables.names, table.codes, {
+            name: tuple(column) for name, column in table.columns.items()
+        })), fp, protocol=pickle.HIGHEST_PROTOCOL)
+    return table
+
+
+def _arrays(column, width):
+    """(present, primary, keys)，keys 是有序的 行号 * width + 音节 id"""
+    starts = np.frombuffer(column.starts, dtype=np.uint32).astype(np.int64)
+    ids = np.frombuffer(column.ids, dtype=np.uint16).astype(np.int64)
+    counts = np.diff(starts)
+    present = counts > 0
+    primary = np.full(len(counts), -1, dtype=np.int64)
+    primary[present] = ids[starts[:-1][present]]
+    rows = np.repeat(np.arange(len(counts)), counts)
+    keys = rows * width + ids
+    keys.sort()
+    return present, primary, keys
+
+
+def _contains(keys, values):
+    """values 中的每一项是否在有序的 keys 中，比 np.isin 快"""
+    if not len(keys):
+        return np.zeros(len(values), dtype=bool)
+    index = np.minimum(np.searchsorted(keys, values), len(keys) - 1)
+    return keys[index] == values
+
+
+def _pairs(keys, width):
+    rows, ids = np.divmod(keys, width)
+    return list(zip(rows.tolist(), ids.tolist()))
+
+
+def _compare_numpy(table, reference, name):
+    width = len(table.syllables)
+    ref_present, ref_primary, ref_keys = _arrays(table.columns[reference], width)
+    present, primary, keys = _arrays(table.columns[name], width)
+    both = ref_present & present
+    missing = keys[both[keys // width] & ~_contains(ref_keys, keys)]
+    extra = ref_keys[both[ref_keys // width] & ~_contains(keys, ref_keys)]
+    return Diff(
+        np.flatnonzero(both & (primary != ref_primary)).tolist(),
+        _pairs(missing, width),
+        _pairs(extra, width),
+        np.flatnonzero(present & ~ref_present).tolist(),
+    )
+
+
+def _compare_python(table, reference, name):
+    ref = table.columns[reference]
+    column = table.columns[name]
+    diff = Diff([], [], [], [])
+    for row in range(len(table.codes)):
+        ids = column.ids[column.starts[row]:column.starts[row + 1]]
+        if not ids:
+            continue
+        ref_ids = ref.ids[ref.starts[row]:ref.starts[row + 1]]
+        if not ref_ids:
+            diff.only.append(row)
+            continue
+        if ids[0] != ref_ids[0]:
+            diff.primary.append(row)
+        diff.missing.extend((row, i) for i in sorted(set(ids) - set(ref_ids)))
+        diff.extra.extend((row, i) for i in sorted(set(ref_ids) - set(ids)))
+    return diff
+
+
+def compare(table, reference, name):
+    """name 与 reference 比较的 Diff"""
+    if np is not None:
+        return _compare_numpy(table, reference, name)
+    return _compare_python(table, reference, name)
+
+
+def format_details(table, reference, name, diff):
+    """产生 TSV 行：来源, 类型, 码位, 汉字, 来源的读音, reference 的读音"""
+    names = table.syllables.names
+    rows = [(row, 'primary', None) for row in diff.primary]
+    rows += [(row, 'missing', i) for row, i in diff.missing]
+    rows += [(row, 'extra', i) for row, i in diff.extra]
+    rows += [(row, 'only', None) for row in diff.only]
+    for row, kind, syllable in sorted(rows, key=lambda x: (x[0], KINDS.index(x[1]))):
+        code = table.codes[row]
+        pinyins = ','.join(table.readings(name, row))
+        if syllable is not None:
+            pinyins = names[syllable]
+        yield '\t'.join((name, kind, int_to_code(code), chr(code), pinyins,
+                         ','.join(table.readings(reference, row))))
+
+
+def main(argv=None):
+    names = [name for name, _ in COMPARE_SOURCES]
+    parser = argparse.ArgumentParser(description='compare pinyin sources')
+    parser.add_argument('-s', '--source', dest='sources', action='append',
+                        choices=names, help='only compare this source, can be repeated')
+    parser.add_argument('--reference', default='merged', choices=names,
+                        help='compare sources with this one, default: %(default)s')
+    parser.add_argument('--details', metavar='PATH',
+                        help='write every difference as TSV to PATH')
+    parser.add_argument('--no-cache', action='store_true')
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    if args.no_cache:
+        table = build_table()
+    else:
+        table = load_table()
+    loaded = time.perf_counter()
+
+    compared = [name for name in args.sources or names if name != args.reference]
+    diffs = {name: compare(table, args.reference, name) for name in compared}
+    print('{:14} {:>8} {:>8} {:>8} {:>8} {:>8}'.format('vs ' + args.reference,
+                                                       'chars', *KINDS))
+    for name in compared:
+        starts = table.columns[name].starts
+        chars = sum(1 for a, b in zip(starts, starts[1:]) if a != b)
+        print('{:14} {:8} {:8} {:8} {:8} {:8}'.format(
+            name, chars, *map(len, diffs[name])))
+
+    if args.details:
+        with open(args.details, 'w', encoding='utf8') as fp:
+            fp.write('\t'.join(('source', 'kind', 'code', 'hanzi', 'pinyins',
+                                args.reference)) + '\n')
+            for name in compared:
+                for line in format_details(table, args.reference, name, diffs[name]):
+                    fp.write(line + '\n')
+    print('{} code points, {} sources: load {:.2f}s, compare {:.2f}s'.format(
+        len(table.codes), len(table.columns), loaded - start,
+        time.perf_counter() - loaded), file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
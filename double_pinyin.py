@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+"""双拼方案
+
+内置小鹤、自然码、微软、搜狗、智能ABC 双拼，也可以用 JSON 文件定义方案：
+
+    {
+        "name": "my_scheme",
+        "initials": {"zh": "v", "ch": "i", "sh": "u", ...},
+        "finals": {"iu": "q", "ei": "w", ...},
+        "zero_initials": {"a": "aa", "ang": "ah", ...}
+    }
+
+initials 中没有列出的声母保持原样；zero_initials 是零声母音节的完整按键，
+没有列出的零声母音节在 zero_initial_key 不为空时用它加上韵母键。
+
+方案会对整个拼音表编译一次，得到 {不带声调的拼音: 按键}，
+编译时检查无法转换的拼音和按键冲突。
+"""
+import json
+
+import pinyin_tone
+
+INITIALS = (
+    'b', 'p', 'm', 'f',
+    'd', 't', 'n', 'z', 'c', 's', 'l',
+    'zh', 'ch', 'sh', 'r',
+    'j', 'q', 'x',
+    'g', 'k', 'h',
+    'y', 'w',
+)
+# 单独成音节的鼻音按最接近的普通音节处理
+ALIASES = {
+    'hm': 'hen',  # 噷
+    'hng': 'heng',  # 哼
+    'm': 'mu',  # 呒呣嘸
+    'n': 'en',  # 唔嗯 㕶 𠮾
+    'ng': 'en',
+}
+# 不区分的音节，例如大部分方案中 o 与 uo 是同一个键
+AMBIGUOUS = (
+    {'lo', 'luo'},
+)
+
+
+class Scheme:
+    __slots__ = ('name', 'initials', 'finals', 'zero_initials',
+                 'zero_initial_key', '_initials')
+
+    def __init__(self, name, initials, finals, zero_initials=None,
+                 zero_initial_key=''):
+        self.name = name
+        self.initials = dict({initial: initial for initial in INITIALS},
+                             **initials)
+        self.finals = finals
+        self.zero_initials = zero_initials or {}
+        self.zero_initial_key = zero_initial_key
+        # 最长匹配，zh/ch/sh 优先
+        self._initials = sorted(self.initials, key=lambda x: -len(x))
+
+    def convert(self, pinyin):
+        """转换单个拼音，pinyin 可以带声调"""
+        ascii = pinyin_tone.to_ascii(pinyin)
+        ascii = ALIASES.get(ascii, ascii)
+        if keys := self.zero_initials.get(ascii):
+            return keys
+
+        result = ''
+        for initial in self._initials:
+            if ascii.startswith(initial):
+                ascii = ascii[len(initial):]
+                result = self.initials[initial]
+                break
+        else:
+            result = self.zero_initial_key
+
+        if final := self.finals.get(ascii):
+            return result + final
+        raise ValueError('{}: cannot convert {!r}'.format(self.name, pinyin))
+
+    def compile(self, pinyins):
+        """对所有拼音生成 {不带声调的拼音: 按键}，检查无法转换的拼音和按键冲突"""
+        table = {}
+        errors = []
+        for ascii in sorted(set(pinyin_tone.to_ascii_all(pinyins))):
+            try:
+                table[ascii] = self.convert(ascii)
+            except ValueError:
+                errors.append(ascii)
+        if errors:
+            raise ValueError('{}: cannot convert {}'.format(
+                self.name, ' '.join(errors)))
+
+        syllables = {}  # {按键: {音节}}
+        for ascii, keys in table.items():
+            syllables.setdefault(keys, set()).add(ALIASES.get(ascii, ascii))
+        conflicts = [
+            '{}={}'.format(keys, '/'.join(sorted(value)))
+            for keys, value in sorted(syllables.items())
+            if len(value) > 1 and value not in AMBIGUOUS
+        ]
+        if conflicts:
+            raise ValueError('{}: conflicts {}'.format(
+                self.name, ' '.join(conflicts)))
+        return table
+
+
+SCHEMES = {}
+
+
+def register(scheme):
+    SCHEMES[scheme.name] = scheme
+    return scheme
+
+
+def load_json(path):
+    with open(path, encoding='utf8') as fp:
+        data = json.load(fp)
+    return register(Scheme(
+        data['name'], data.get('initials', {}), data['finals'],
+        data.get('zero_initials'), data.get('zero_initial_key', ''),
+    ))
+
+
+def get_scheme(name):
+    try:
+        return SCHEMES[name]
+    except KeyError:
+        raise ValueError('unknown double pinyin scheme: {!r}'.format(name))
+
+
+def compile_schemes(names, pinyins):
+    """返回 {方案名: {不带声调的拼音: 按键}}"""
+    pinyins = list(pinyins)
+    return {name: get_scheme(name).compile(pinyins) for name in names}
+
+
+# 零声母音节：a ai an ang ao e ei en eng er o ou
+_ZERO_INITIALS = {
+    'a': 'aa', 'ai': 'ai', 'an': 'an', 'ang': 'ah', 'ao': 'ao',
+    'e': 'ee', 'ei': 'ei', 'en': 'en', 'eng': 'eg', 'er': 'er',
+    'o': 'oo', 'ou': 'ou',
+}
+
+# 小鹤双拼
+register(Scheme('xiaohe', {
+    'zh': 'v', 'ch': 'i', 'sh': 'u',
+}, {
+    'i': 'i', 'u': 'u', 'v': 'v',
+    'e': 'e', 'ie': 'p', 'o': 'o', 'uo': 'o', 'ue': 't', 've': 't',
+    'a': 'a', 'ia': 'x', 'ua': 'x',
+    'ei': 'w', 'ui': 'v',
+    'ai': 'd', 'uai': 'k',
+    'ou': 'z', 'iu': 'q',
+    'ao': 'c', 'iao': 'n',
+    'in': 'b', 'un': 'y', 'vn': 'y',
+    'en': 'f',
+    'an': 'j', 'ian': 'm', 'uan': 'r', 'van': 'r',
+    'ing': 'k',
+    'ong': 's', 'iong': 's',
+    'eng': 'g',
+    'ang': 'h', 'iang': 'l', 'uang': 'l',
+    'er': 'er',
+}, {
+    'e': 'ee', 'o': 'oo',
+    'a': 'aa',
+    'ei': 'ei',
+    'ai': 'ai',
+    'ou': 'ou',
+    'ao': 'ao',
+    'en': 'en',
+    'an': 'an',
+    'eng': 'eg',
+    'ang': 'ah',
+}))
+
+# 自然码
+register(Scheme('ziranma', {
+    'zh': 'v', 'ch': 'i', 'sh': 'u',
+}, {
+    'i': 'i', 'u': 'u', 'v': 'v',
+    'e': 'e', 'ie': 'x', 'o': 'o', 'uo': 'o', 'ue': 't', 've': 't',
+    'a': 'a', 'ia': 'w', 'ua': 'w',
+    'ei': 'z', 'ui': 'v',
+    'ai': 'l', 'uai': 'y',
+    'ou': 'b', 'iu': 'q',
+    'ao': 'k', 'iao': 'c',
+    'in': 'n', 'un': 'p', 'vn': 'p',
+    'en': 'f',
+    'an': 'j', 'ian': 'm', 'uan': 'r', 'van': 'r',
+    'ing': 'y',
+    'ong': 's', 'iong': 's',
+    'eng': 'g',
+    'ang': 'h', 'iang': 'd', 'uang': 'd',
+}, _ZERO_INITIALS))
+
+# 微软双拼
+register(Scheme('microsoft', {
+    'zh': 'v', 'ch': 'i', 'sh': 'u',
+}, {
+    'i': 'i', 'u': 'u', 'v': 'y',
+    'e': 'e', 'ie': 'x', 'o': 'o', 'uo': 'o', 'ue': 't', 've': 'v',
+    'a': 'a', 'ia': 'w', 'ua': 'w',
+    'ei': 'z', 'ui': 'v',
+    'ai': 'l', 'uai': 'y',
+    'ou': 'b', 'iu': 'q',
+    'ao': 'k', 'iao': 'c',
+    'in': 'n', 'un': 'p', 'vn': 'p',
+    'en': 'f',
+    'an': 'j', 'ian': 'm', 'uan': 'r', 'van': 'r',
+    'ing': ';',
+    'ong': 's', 'iong': 's',
+    'eng': 'g',
+    'ang': 'h', 'iang': 'd', 'uang': 'd',
+    'er': 'r',
+}, zero_initial_key='o'))
+
+# 搜狗双拼
+register(Scheme('sogou', {
+    'zh': 'v', 'ch': 'i', 'sh': 'u',
+}, {
+    'i': 'i', 'u': 'u', 'v': 'y',
+    'e': 'e', 'ie': 'x', 'o': 'o', 'uo': 'o', 'ue': 't', 've': 't',
+    'a': 'a', 'ia': 'w', 'ua': 'w',
+    'ei': 'z', 'ui': 'v',
+    'ai': 'l', 'uai': 'y',
+    'ou': 'b', 'iu': 'q',
+    'ao': 'k', 'iao': 'c',
+    'in': 'n', 'un': 'p', 'vn': 'p',
+    'en': 'f',
+    'an': 'j', 'ian': 'm', 'uan': 'r', 'van': 'r',
+    'ing': ';',
+    'ong': 's', 'iong': 's',
+    'eng': 'g',
+    'ang': 'h', 'iang': 'd', 'uang': 'd',
+    'er': 'r',
+}, zero_initial_key='o'))
+
+# 智能ABC
+register(Scheme('abc', {
+    'zh': 'a', 'ch': 'e', 'sh': 'v',
+}, {
+    'i': 'i', 'u': 'u', 'v': 'v',
+    'e': 'e', 'ie': 'x', 'o': 'o', 'uo': 'o', 'ue': 'm', 've': 'm',
+    'a': 'a', 'ia': 'd', 'ua': 'd',
+    'ei': 'q', 'ui': 'm',
+    'ai': 'l', 'uai': 'c',
+    'ou': 'b', 'iu': 'r',
+    'ao': 'k', 'iao': 'z',
+    'in': 'c', 'un': 'n', 'vn': 'n',
+    'en': 'f',
+    'an': 'j', 'ian': 'w', 'uan': 'p', 'van': 'p',
+    'ing': 'y',
+    'ong': 's', 'iong': 's',
+    'eng': 'g',
+    'ang': 'h', 'iang': 't', 'uang': 't',
+    'er': 'r',
+}, zero_initial_key='o'))
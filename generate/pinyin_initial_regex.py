@@ -1,82 +1,54 @@
-﻿import re
-import string
+﻿import string
+import sys
 
-def generate(charset):
-    dic = { letter: [] for letter in string.ascii_lowercase }  # { 首字母: [汉字] }
+sys.path.append('.')
 
-    with open('pinyin.txt', encoding='utf8') as f:
-        ranges = { letter: [0, 0] for letter in string.ascii_lowercase }  # 连续汉字合并成范围
-        total_ranges = { letter: [0, 0] for letter in string.ascii_lowercase }
+import charset_index
+import pinyin_regex
+import pinyin_tone
 
-        def append_range(letter, rng):
-            length = rng[1] - rng[0]
+def generate(charset, lines, index=None):
+    dic = { letter: [] for letter in string.ascii_lowercase }  # { 首字母: [码位] }
+    # utf8 不在 charset_index 中，保留所有汉字
+    members = None
+    if charset in charset_index.CHARSETS:
+        if index is None:
+            index = charset_index.load_or_build(pinyin_path='pinyin.txt')
+        members = index[charset]
 
-            # 加入 dic
-            lst = dic[letter]
-            lst.append(chr(rng[0]))
-            if length == 0:  # a
-                pass
-            elif length == 1:  # ab
-                lst.append(chr(rng[1]))
-            elif length == 2:  # abc，应该略快于 a-c
-                lst.append(chr(rng[0] + 1))
-                lst.append(chr(rng[1]))
-            else:  # a-d
-                lst.append('-')
-                lst.append(chr(rng[1]))
-            
-            # 更新 total_ranges
-            total_ranges[letter][1] = rng[1]
+    for hanzi, pinyins in lines:
+        # 只保留指定字符集汉字
+        if members is not None and ord(hanzi) not in members:
+            continue
 
+        for letter in { pinyin[0] for pinyin in pinyins }:
+            dic[letter].append(ord(hanzi))
 
-        for line in f.readlines()[2:]:
-            try:
-                hanzi = line[-2]
+    with open(f'output_pinyin_initial_regex_{charset}.txt', 'w', encoding='utf8') as f:
+        for key, codes in sorted(dic.items()):
+            if not codes:  # i u v
+                f.write(f'{key}\n')
+            else:
+                # 连续汉字合并成范围
+                f.write(f'[{key}{ pinyin_regex.char_ranges(codes) }]\n')
 
-                # 只保留指定字符集汉字
-                hanzi.encode(charset)
 
-                # 获取拼音
-                begin = line.find(': ') + 2
-                pinyin_seq = line[begin:-6]
-                # (?:: |,)[^a-zāáǎàēéěèê̄ếê̌ềōóǒòḿńňǹ]
-                pinyin_seq = re.sub('[āáǎà]', 'a', pinyin_seq)
-                pinyin_seq = re.sub('[ēéěèê̄ếê̌ề]', 'e', pinyin_seq)
-                pinyin_seq = re.sub('[ōóǒò]', 'o', pinyin_seq)
-                pinyin_seq = re.sub('[ḿ]', 'm', pinyin_seq)
-                pinyin_seq = re.sub('[ńňǹ]', 'n', pinyin_seq)
-                pinyins = pinyin_seq.split(',')
+def load_lines():
+    """[(汉字, [不带声调的拼音])]，只读取一次 pinyin.txt"""
+    with open('pinyin.txt', encoding='utf8') as f:
+        lines = []
+        for line in f.readlines()[2:]:
+            # 获取拼音
+            begin = line.find(': ') + 2
+            pinyin_seq = line[begin:-6]
+            lines.append((line[-2], pinyin_tone.to_ascii_all(pinyin_seq.split(','))))
+    return lines
 
-                # 处理拼音
-                for pinyin in pinyins:
-                    letter = pinyin[0]
-                    rng = ranges[letter]
-                    if rng[1] == 0:  # 初始化
-                        rng[:] = [ord(hanzi), ord(hanzi)]
-                        total_ranges[letter][0] = ord(hanzi)
-                    elif ord(hanzi) == rng[1]:  # 忽略同一汉字
-                        pass
-                    elif ord(hanzi) == rng[1] + 1:  # 并入范围
-                        rng[1] += 1
-                    else:  # 开始新 range
-                        append_range(letter, rng)
-                        rng[:] = [ord(hanzi), ord(hanzi)]
-                
-            except UnicodeEncodeError:
-                pass
-        
-        # 处理剩余 range
-        for letter, rng in ranges.items():
-            append_range(letter, rng)
 
-    with open(f'output_pinyin_initial_regex_{charset}.txt', 'w', encoding='utf8') as f:
-        for key, value in sorted(dic.items()):
-            if len(value) == 1:  # i u v
-                f.write(f'{key}\n')
-            else:
-                # f.write('({0}|(?=[{1}-{2}])[{3}])\n'.format(key, chr(total_ranges[key][0]), chr(total_ranges[key][1]), ''.join(value)))
-                f.write(f'[{key}{ "".join(value) }]\n')
+CHARSETS = ('gb2312', 'gbk', 'utf8')
 
-generate('gb2312')
-generate('gbk')
-generate('utf8')
\ No newline at end of file
+if __name__ == '__main__':
+    lines = load_lines()
+    index = charset_index.load_or_build(pinyin_path='pinyin.txt')
+    for charset in CHARSETS:
+        generate(charset, lines, index)
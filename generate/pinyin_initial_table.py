@@ -1,60 +1,55 @@
-import re
-
-tables = {
-    range(0x3400, 0x9FED+1): [],  # .{1017}\0
-    range(0x20000, 0x2D016+1): [],
-    range(0x3007, 0x3007+1): [],
-    range(0xE815, 0xE864+1): [],  # .{18472}\0
-    range(0xFA18, 0xFA18+1): [],  # .{4532}\0
-    range(0x2F835, 0x2F835+1): [],  # .{10271}\0
-    range(0x30EDD, 0x30EDE+1): []  # .{5800}\0
-}
-for rng, lst in tables.items():
-    lst[:] = [0] * (rng.stop - rng.start)
-
-with open('pinyin.txt', encoding='utf8') as f:
-    for line in f.readlines()[2:]:
-        # 获取拼音
-        begin = line.find(': ') + 2
-        pinyin_seq = line[begin:-6]
-        # (?:: |,)[^a-zāáǎàēéěèê̄ếê̌ềōóǒòḿńňǹ]
-        pinyin_seq = re.sub('[āáǎà]', 'a', pinyin_seq)
-        pinyin_seq = re.sub('[ēéěèê̄ếê̌ề]', 'e', pinyin_seq)
-        pinyin_seq = re.sub('[ōóǒò]', 'o', pinyin_seq)
-        pinyin_seq = re.sub('[ḿ]', 'm', pinyin_seq)
-        pinyin_seq = re.sub('[ńňǹ]', 'n', pinyin_seq)
-        pinyins = pinyin_seq.split(',')
-
-        # 转换成 flags
-        pinyin_flags = 0
-        for pinyin in pinyins:
-            pinyin_flags |= 2 ** (ord(pinyin[0]) - ord('a'))
-
-        # 保存到 tables
-        hanzi = ord(line[-2])
-        for rng, lst in tables.items():
-            if hanzi in rng:
-                lst[hanzi - rng.start] = pinyin_flags
-                break
-        else:
-            raise
-
-with open(f'output_pinyin_initial_table.txt', 'w', encoding='utf8') as f:
-    for rng, lst in tables.items():
-        f.write('uint32_t table_{:X}_{:X}[]{{ {} }};\n'.format(
-            rng.start,
-            rng.stop - 1,
-            ','.join(str(flags) for flags in lst)  # 16^n ≥ 10^(n+2) -> n ≥ 10，十位以下用 0x十六进制 的编码效率低于十进制
-            ))
-    
-    f.write(f'''
-PinyinRange pinyin_ranges[{ len(tables) }]{{
-''')
-
-    for rng, lst in tables.items():
-        f.write('{{ 0x{0:X}, 0x{1:X}, table_{0:X}_{1:X} }},\n'.format(
-            rng.start,
-            rng.stop - 1
-            ))
-    
-    f.write('};')
\ No newline at end of file
+import sys
+
+sys.path.append('.')
+
+import charset_index
+import page_table
+import pinyin_initial
+import pinyin_tone
+
+# 生成子集的字符集，见 charset_index.py
+CHARSETS = charset_index.SUBSET_CHARSETS
+
+
+def generate(charset=None, index=None):
+    """charset 为 None 时包含所有汉字，否则只包含该字符集的汉字
+
+    输出两级表（见 page_table.py）的 C 代码 output_pinyin_initial_table{_charset}.txt
+    和二进制文件 output_pinyin_initial_table{_charset}.bin
+    """
+    members = None
+    name = 'pinyin_initial'
+    if charset is not None:
+        if index is None:
+            index = charset_index.load_or_build(pinyin_path='pinyin.txt')
+        members = index[charset]
+        name += f'_{charset}'
+
+    masks = {}  # {码位: 首字母 mask}
+    with open('pinyin.txt', encoding='utf8') as f:
+        for line in f.readlines()[2:]:
+            hanzi = ord(line[-2])
+            if members is not None and hanzi not in members:
+                continue
+            # 获取拼音
+            begin = line.find(': ') + 2
+            pinyin_seq = line[begin:-6]
+            pinyins = pinyin_tone.to_ascii_all(pinyin_seq.split(','))
+
+            # 转换成 flags
+            masks[hanzi] = pinyin_initial.initial_mask(pinyins)
+
+    table = page_table.build(masks, 0, 'I')
+    output = name.replace('pinyin_initial', 'output_pinyin_initial_table', 1)
+    with open(f'{output}.txt', 'w', encoding='utf8') as f:
+        f.write(page_table.format_c(table, name))
+    with open(f'{output}.bin', 'wb') as f:
+        page_table.save_binary(table, f)
+    return table
+
+
+if __name__ == '__main__':
+    generate()
+    index = charset_index.load_or_build(pinyin_path='pinyin.txt')
+    for charset in CHARSETS:
+        generate(charset, index)
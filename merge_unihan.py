@@ -1,16 +1,39 @@
 # -*- coding: utf-8 -*-
+from array import array
+import argparse
+import bisect
 import collections
-import re
+import hashlib
+import heapq
+import inspect
+import io
+import itertools
+import json
+import operator
+import os
+import pickle
+
+import double_pinyin
+import page_table
+import pinyin_compact
+import pinyin_tone
+import profiling
+from pinyin_compact import (
+    DEFAULT_DOUBLE_PINYINS, PinyinCompact, pinyin_type, save_binary, check_binary
+)
+from pinyin_map import PinyinMap, SyllableTable, code_to_int, int_to_code
 
 def code_to_hanzi(code):
-    hanzi = chr(int(code.replace('U+', '0x'), 16))
+    hanzi = chr(code_to_int(code))
     return hanzi
 
 
 def sort_pinyin_dict(pinyin_dict):
+    # 每个码位只解析一次
     dic = collections.OrderedDict(
-        sorted(pinyin_dict.items(),
-               key=lambda item: int(item[0].replace('U+', '0x'), 16))
+        item for _, item in sorted(
+            (code_to_int(item[0]), item) for item in pinyin_dict.items()
+        )
     )
     for item in dic.items():  # pinyin_combinations 要求
         item[1][:] = sorted(item[1])
@@ -25,16 +48,24 @@ def remove_dup_items(lst):
     return new_lst
 
 
-def parse_pinyins(fp):
-    pinyin_map = {}
+def iter_pinyins(fp):
+    """按文件顺序产生 (code, pinyins)"""
     for line in fp:
         line = line.strip()
         if line.startswith('#') or not line:
             continue
         code, pinyin = line.split('#')[0].split(':')
         pinyin = ','.join([x.strip() for x in pinyin.split() if x.strip()])
-        pinyin_map[code.strip()] = pinyin.split(',')
-    return pinyin_map
+        yield code.strip(), pinyin.split(',')
+
+
+def parse_pinyins(fp):
+    return dict(iter_pinyins(fp))
+
+
+def load_pinyin_map(fp, syllables=None):
+    """与 parse_pinyins 相同，返回以整数码位为键的 PinyinMap"""
+    return PinyinMap.from_items(iter_pinyins(fp), syllables)
 
 
 def merge(raw_pinyin_map, adjust_pinyin_map, overwrite_pinyin_map):
@@ -58,27 +89,10 @@ def save_data(pinyin_map, writer):
         writer.write(line)
 
 def pinyin_to_ascii(pinyin):
-    py = re.sub('[āáǎà]', 'a', pinyin)
-    py = re.sub('[ēéěèếề]|ê̄|ê̌', 'e', py)  # ê̄=ê+̄ , ê̌=ê+̌ 
-    py = re.sub('[īíǐì]', 'i', py)
-    py = re.sub('[ōóǒò]', 'o', py)
-    py = re.sub('[ūúǔù]', 'u', py)
-    py = re.sub('[üǘǚǜ]', 'v', py)
-    py = re.sub('[ńňǹ]', 'n', py)
-    py = re.sub('[ḿ]|m̀', 'm', py)
-    return py
+    return pinyin_tone.to_ascii(pinyin)
 
 def pinyin_to_ascii_num(pinyin):
-    py = pinyin_to_ascii(pinyin)
-    if re.search('[āēīōū]|ê̄', pinyin):  # ü
-        return py + '1'
-    if re.search('[áéếíóúǘḿń]', pinyin):
-        return py + '2'
-    if re.search('[ǎěǐǒǔǚň]|ê̌', pinyin):
-        return py + '3'
-    if re.search('[àèềìòùǜǹ]|m̀', pinyin):
-        return py + '4'
-    return py + '5'  # 0不好输入
+    return pinyin_tone.to_ascii_num(pinyin)
 
 def pinyin_convert(pinyin: str, pinyin_map: dict, initial_map: dict, final_map: dict):
     # https://en.wikipedia.org/wiki/Pinyin
@@ -129,130 +143,139 @@ def pinyin_convert(pinyin: str, pinyin_map: dict, initial_map: dict, final_map:
         # 'uei', 'uen', 'ueng'
     }
     '''
-    ascii = pinyin_to_ascii(pinyin)
-    if ascii == 'hm':  # 噷
-        ascii = 'hen'
-    elif ascii == 'hng':  # 哼
-        ascii = 'heng'
-    elif ascii == 'm':  # 呒呣嘸
-        ascii = 'mu'
-    elif ascii == 'n' or ascii == 'ng':  # 唔嗯 㕶 𠮾
-        ascii = 'en'
-    
-    if py := pinyin_map.get(ascii):
-        return py
-    
-    result = ''
-    for initial in sorted(initial_map, key=lambda x: -len(x)):
-        if ascii.startswith(initial):
-            ascii = ascii[len(initial):]
-            result = initial_map[initial]
-            break
-    
-    if final := final_map.get(ascii):
-        result += final
-    else:
-        raise ValueError
-
-    return result
+    scheme = double_pinyin.Scheme('', initial_map, final_map, pinyin_map)
+    return scheme.convert(pinyin)
 
 # 小鹤双拼
 def pinyin_to_double_pinyin_xiaohe(pinyin):
-    pinyin_map = {
-        'e': 'ee', 'o': 'oo',
-        'a': 'aa',
-        'ei': 'ei',
-        'ai': 'ai',
-        'ou': 'ou',
-        'ao': 'ao',
-        'en': 'en',
-        'an': 'an',
-        'eng': 'eg',
-        'ang': 'ah'
-    }
-    initial_map = {
-        'b': 'b', 'p': 'p', 'm': 'm', 'f': 'f',
-        'd': 'd', 't': 't', 'n': 'n', 'z': 'z', 'c': 'c', 's': 's', 'l': 'l',
-        'zh': 'v', 'ch': 'i', 'sh': 'u', 'r': 'r',
-        'j': 'j', 'q': 'q', 'x': 'x',
-        'g': 'g', 'k': 'k', 'h': 'h',
-        'y': 'y', 'w': 'w'
-    }
-    final_map = {
-        'i': 'i', 'u': 'u', 'v': 'v',
-        'e': 'e', 'ie': 'p', 'o': 'o', 'uo': 'o', 'ue': 't', 've': 't',
-        'a': 'a', 'ia': 'x', 'ua': 'x',
-        'ei': 'w', 'ui': 'v',
-        'ai': 'd', 'uai': 'k',
-        'ou': 'z', 'iu': 'q',
-        'ao': 'c', 'iao': 'n',
-        'in': 'b', 'un': 'y', 'vn': 'y',
-        'en': 'f',
-        'an': 'j', 'ian': 'm', 'uan': 'r', 'van': 'r',
-        'ing': 'k',
-        'ong': 's', 'iong': 's',
-        'eng': 'g',
-        'ang': 'h', 'iang': 'l', 'uang': 'l',
-        'er': 'er'
-    }
-    return pinyin_convert(pinyin, pinyin_map, initial_map, final_map)
-
-def save_data2(pinyin_map):
+    return double_pinyin.get_scheme('xiaohe').convert(pinyin)
+
+# pinyin_compact.txt 中的范围，是文件格式的一部分，顺序和边界不能随数据改变
+COMPACT_RANGES = (
+    # 粗略匹配有拼音的汉字：
+    # [〇-礼][𠀀-𰻞]
+    # [〇㐀-鿭-礼][𠀀-𭀖灰𰻝𰻞]
+    range(0x3400, 0x9FED+1),  # .{1017}\0
+    range(0x20000, 0x2D016+1),
+    range(0x3007, 0x3007+1),
+    range(0xE815, 0xE864+1),  # .{18472}\0
+    range(0xFA18, 0xFA18+1),  # .{4532}\0
+    range(0x2F835, 0x2F835+1),  # .{10271}\0
+    range(0x30EDD, 0x30EDE+1)  # .{5800}\0
+)
+# 子集等新文件的范围从数据得出，连续超过 RANGE_GAP 个码位没有拼音时拆开
+RANGE_GAP = 256
+
+
+def compact_ranges(codes, gap=RANGE_GAP):
+    """codes 是整数码位"""
+    return page_table.derive_ranges(codes, gap)
+
+
+def build_compact_tables(pinyin_map, ranges=COMPACT_RANGES):
+    """生成 pinyin_compact.txt 的数据
+
+    返回 (all_pinyins, pinyin_combinations, pinyin_multi_combinations, tables)，
+    tables 是 {range: array('H')}，顺序与 ranges 相同
+    """
     all_pinyins = set()
     pinyin_combinations = set()
     for pinyins in pinyin_map.values():
-        for pinyin in pinyins:
-            all_pinyins.add(pinyin)
+        all_pinyins.update(pinyins)
         pinyin_combinations.add(' '.join(pinyins))
     all_pinyins = sorted(all_pinyins, key=lambda x: (pinyin_to_ascii_num(x), x))
     pinyin_combinations = sorted(pinyin_combinations, key=lambda x: (x.count(' '), x))
+    pinyin_ids = {pinyin: i for i, pinyin in enumerate(all_pinyins)}
 
+    # 拼音组合 -> 排序后的拼音 id
     pinyin_multi_combination_map = {}
     for pinyins in pinyin_map.values():
         if len(pinyins) > 1:
-            pinyin_multi_combination_map[' '.join(pinyins)] = sorted([ all_pinyins.index(pinyin) for pinyin in pinyins ])
+            key = ' '.join(pinyins)
+            if key not in pinyin_multi_combination_map:
+                pinyin_multi_combination_map[key] = sorted(pinyin_ids[pinyin] for pinyin in pinyins)
     pinyin_multi_combinations = sorted(pinyin_multi_combination_map.values())
-    for key, val in pinyin_multi_combination_map.items():
-        pinyin_multi_combination_map[key] = pinyin_multi_combinations.index(val)
-
-    # pinyin_compact.txt
-    tables = {
-        # 粗略匹配有拼音的汉字：
-        # [〇-礼][𠀀-𰻞]
-        # [〇㐀-鿭-礼][𠀀-𭀖灰𰻝𰻞]
-        range(0x3400, 0x9FED+1): [],  # .{1017}\0
-        range(0x20000, 0x2D016+1): [],
-        range(0x3007, 0x3007+1): [],
-        range(0xE815, 0xE864+1): [],  # .{18472}\0
-        range(0xFA18, 0xFA18+1): [],  # .{4532}\0
-        range(0x2F835, 0x2F835+1): [],  # .{10271}\0
-        range(0x30EDD, 0x30EDE+1): []  # .{5800}\0
-    }
-    for rng, lst in tables.items():
-        lst[:] = [0xFFFF] * (rng.stop - rng.start)
+    combination_ids = {tuple(ids): i for i, ids in enumerate(pinyin_multi_combinations)}
+    # 表中的值：单个拼音是拼音 id，多个拼音是 len(all_pinyins) + 组合 id
+    values = dict(pinyin_ids)
+    for key, ids in pinyin_multi_combination_map.items():
+        values[key] = len(all_pinyins) + combination_ids[tuple(ids)]
+
+    tables = {rng: array('H', [0xFFFF]) * len(rng) for rng in ranges}
+    # 按起点排序，二分查找码位所在的范围
+    sorted_tables = sorted(tables.items(), key=lambda item: item[0].start)
+    starts = [rng.start for rng, _ in sorted_tables]
     for code, pinyins in pinyin_map.items():
-        hanzi = int(code.replace('U+', '0x'), 16)
-        for rng, lst in tables.items():
-            if hanzi in rng:
-                if len(pinyins) == 1:
-                    lst[hanzi - rng.start] = all_pinyins.index(pinyins[0])
-                else:
-                    lst[hanzi - rng.start] = len(all_pinyins) + pinyin_multi_combination_map[' '.join(pinyins)]
+        hanzi = int(code[2:], 16)
+        i = bisect.bisect_right(starts, hanzi) - 1
+        if i < 0:
+            continue
+        rng, table = sorted_tables[i]
+        if hanzi < rng.stop:
+            table[hanzi - rng.start] = values[' '.join(pinyins)]
 
-    with open('pinyin_compact.txt', 'w', encoding='utf8') as f:
-        f.write(f'''pinyins:
-{ chr(10).join(','.join((pinyin, pinyin_to_ascii(pinyin), pinyin_to_ascii_num(pinyin), pinyin_to_double_pinyin_xiaohe(pinyin))) for pinyin in all_pinyins) }
+    return all_pinyins, pinyin_combinations, pinyin_multi_combinations, tables
+
+
+def compact_pinyin_rows(all_pinyins, double_pinyins=DEFAULT_DOUBLE_PINYINS):
+    """pinyins 段的每一行，每个双拼方案对整个拼音表编译一次"""
+    double_pinyin_tables = double_pinyin.compile_schemes(double_pinyins, all_pinyins)
+    Pinyin = pinyin_type(double_pinyins)
+    return [
+        Pinyin(forms.pinyin, forms.ascii, forms.ascii_num,
+               *(double_pinyin_tables[name][forms.ascii] for name in double_pinyins))
+        for forms in pinyin_tone.convert_all(all_pinyins)
+    ]
+
+
+def format_compact(pinyin_rows, pinyin_multi_combinations, tables,
+                   double_pinyins=DEFAULT_DOUBLE_PINYINS):
+    """pinyin_compact.txt 的内容"""
+    pinyins_header = 'pinyins:'
+    if double_pinyins != DEFAULT_DOUBLE_PINYINS:
+        pinyins_header += ' ' + ','.join(double_pinyins)
+    return f'''{ pinyins_header }
+{ chr(10).join(','.join(row) for row in pinyin_rows) }
 
 pinyin_combinations:
 { chr(10).join(','.join(str(v) for v in combinations) for combinations in pinyin_multi_combinations) }
 
 pinyin_tables:
-{ chr(10).join(f'0x{ rng.start :X}, 0x{ rng.stop - 1 :X}:{ chr(10) }{ ",".join(str(v) for v in lst) }' for rng, lst in tables.items()) }''')
-
+{ chr(10).join(f'0x{ rng.start :X}, 0x{ rng.stop - 1 :X}:{ chr(10) }{ ",".join(str(v) for v in lst) }' for rng, lst in tables.items()) }'''
+
+
+def save_compact(path, binary_path, pinyin_rows, pinyin_multi_combinations, tables,
+                 double_pinyins=DEFAULT_DOUBLE_PINYINS, profiler=profiling.NULL_PROFILER):
+    """写入 pinyin_compact.txt 格式的文本和对应的二进制文件"""
+    with profiler.stage('save_data2 ' + path):
+        write_if_changed(path, format_compact(
+            pinyin_rows, pinyin_multi_combinations, tables, double_pinyins))
+    with profiler.stage('save_data2 ' + binary_path):
+        compact = PinyinCompact(pinyin_rows, pinyin_multi_combinations, [
+            (rng.start, rng.stop, lst) for rng, lst in tables.items()
+        ])
+        f = io.BytesIO()
+        save_binary(compact, f)
+        write_if_changed(binary_path, f.getvalue())
+
+
+def save_data2(pinyin_map, double_pinyins=DEFAULT_DOUBLE_PINYINS,
+               profiler=profiling.NULL_PROFILER):
+    with profiler.stage('save_data2 tables') as counts:
+        all_pinyins, pinyin_combinations, pinyin_multi_combinations, tables = \
+            build_compact_tables(pinyin_map)
+        counts.update(syllables=len(all_pinyins),
+                      combinations=len(pinyin_combinations))
+    with profiler.stage('save_data2 pinyins') as counts:
+        pinyin_rows = compact_pinyin_rows(all_pinyins, double_pinyins)
+        counts['double_pinyins'] = len(double_pinyins)
+
+    save_compact('pinyin_compact.txt', 'pinyin_compact.bin', pinyin_rows,
+                 pinyin_multi_combinations, tables, double_pinyins, profiler)
 
     # all_pinyin.md
-    with open('all_pinyins.md', 'w', encoding='utf8') as f:
-        f.write(f'''## All Pinyins
+    with profiler.stage('save_data2 all_pinyins.md'):
+        write_if_changed('all_pinyins.md', f'''## All Pinyins
 { len(all_pinyins) }
 ```
 { ' '.join(sorted(all_pinyins)) }
@@ -274,66 +297,375 @@ def extend_pinyins(old_map, new_map, only_no_exists=False):
             old_map.setdefault(code, []).extend(pinyins)
 
 
+# 合并规则中各个来源的顺序
+SOURCES = (
+    'kXHC1983.txt',
+    'nonCJKUI.txt',
+    'kMandarin_8105.txt',
+    'kMandarin_overwrite.txt',
+    'kMandarin.txt',
+    'kTGHZ2013.txt',
+    'kHanyuPinlu.txt',  # 只用于检查，不参与合并
+    'GBK_PUA.txt',
+    'kanji.txt',
+    'overwrite.txt',
+)
+# 这些来源的拼音会作为调整后的读音放在最前面
+ADJUST_SOURCES = (
+    'kMandarin_8105.txt',
+    'kMandarin_overwrite.txt',
+    'kMandarin.txt',
+    'kTGHZ2013.txt',
+)
+# 手工维护的文件（README 中标注了可以修改），不保证按码位排序
+EDITABLE_SOURCES = (
+    'nonCJKUI.txt',
+    'kMandarin_8105.txt',
+    'kMandarin_overwrite.txt',
+    'GBK_PUA.txt',
+    'kanji.txt',
+    'overwrite.txt',
+)
+CACHE_PATH = '.cache/merge_unihan.pickle'
+OUTPUTS = ('pinyin.txt', 'pinyin_compact.txt', 'pinyin_compact.bin',
+           'all_pinyins.md')
+
+
+def merge_readings(readings, sort=True):
+    """按合并规则计算单个码位的拼音
+
+    readings 是 {来源: pinyins}，只包含有这个码位的来源。
+    所有来源都没有这个码位时返回 None。
+    sort=False 时保留合并规则中的顺序，第一个是最常用的读音。
+    各码位之间互不影响，所以可以按码位流式合并，增量构建时也只需要重新计算改动过的码位。
+    """
+    raw = None
+    adjust = None
+
+    if (pinyins := readings.get('kXHC1983.txt')) is not None:
+        raw = list(pinyins)
+    if (pinyins := readings.get('nonCJKUI.txt')) is not None:
+        raw = (raw or []) + pinyins
+    for name in ADJUST_SOURCES:
+        if (pinyins := readings.get(name)) is not None:
+            adjust = (adjust or []) + pinyins
+        if adjust is not None:
+            raw = (raw or []) + adjust
+    if (pinyins := readings.get('GBK_PUA.txt')) is not None:
+        raw = (raw or []) + pinyins
+    if raw is None and (pinyins := readings.get('kanji.txt')) is not None:
+        raw = list(pinyins)  # 只当 code 不存在时才更新
+    overwrite = readings.get('overwrite.txt')
+    if overwrite is not None:
+        raw = (raw or []) + overwrite
+    if raw is None:
+        return None
+
+    if overwrite is not None:
+        pinyins = overwrite
+    elif adjust is not None:
+        pinyins = adjust + raw
+    else:
+        pinyins = raw
+    pinyins = remove_dup_items(pinyins)
+    if sort:
+        pinyins.sort()  # pinyin_combinations 要求
+    return pinyins
+
+
+def merge_code(code, source_maps):
+    """source_maps 是 {来源: PinyinMap}"""
+    code = code_to_int(code)
+    return merge_readings({
+        name: list(pinyin_map[code])
+        for name, pinyin_map in source_maps.items() if code in pinyin_map
+    })
+
+
+def iter_source(name, directory='.'):
+    """按码位顺序产生 (int code, code, pinyins)
+
+    Unihan 生成的文件本身就是有序的，直接流式读取；
+    手工维护的文件不保证顺序，但都很小，读入后排序。
+    同一个文件中重复的码位以最后一个为准，与 parse_pinyins 一致。
+    """
+    with open(os.path.join(directory, name), encoding='utf8') as fp:
+        if name in EDITABLE_SOURCES:
+            items = sorted(
+                (int(code[2:], 16), code, pinyins)
+                for code, pinyins in parse_pinyins(fp).items()
+            )
+            yield from items
+            return
+
+        pending = None
+        for code, pinyins in iter_pinyins(fp):
+            item = (int(code[2:], 16), code, pinyins)
+            if pending is not None:
+                if item[0] < pending[0]:
+                    raise ValueError('{}: {} is not sorted'.format(name, code))
+                if item[0] > pending[0]:
+                    yield pending
+            pending = item
+        if pending is not None:
+            yield pending
+
+
+def merge_sources(sources=None, sort=True, directory='.'):
+    """k 路归并所有有序来源，按码位顺序产生 (code, pinyins)
+
+    sources 是 {来源: 有序的 (int code, code, pinyins) 迭代器}，
+    默认读取 directory 下的 SOURCES。
+    内存占用与来源的大小无关（手工维护的小文件除外），结果不需要再排序。
+    sort 的含义与 merge_readings 相同。
+    """
+    if sources is None:
+        sources = {name: iter_source(name, directory) for name in SOURCES}
+    streams = [_tag(stream, name) for name, stream in sources.items()]
+    merged = heapq.merge(*streams, key=operator.itemgetter(0))
+    for _, group in itertools.groupby(merged, key=operator.itemgetter(0)):
+        readings = {}
+        for _, code, name, pinyins in group:
+            readings[name] = pinyins
+        pinyins = merge_readings(readings, sort)
+        # 只出现在 kHanyuPinlu.txt 中的码位，与 check 中的检查一致
+        assert pinyins is not None, (code, sorted(readings))
+        yield code, pinyins
+
+
+def load_primary_pinyins(directory='.'):
+    """{int code: 最常用的读音}，只包含多音字
+
+    pinyin.txt 中的读音是排序后的，最常用的读音需要按合并规则重新计算：
+    overwrite.txt 优先，其次是 kMandarin_8105.txt、kMandarin.txt 等调整读音的来源
+    """
+    return {
+        int(code[2:], 16): pinyins[0]
+        for code, pinyins in merge_sources(sort=False, directory=directory)
+        if len(pinyins) > 1
+    }
+
+
+def _tag(stream, name):
+    for code_int, code, pinyins in stream:
+        yield code_int, code, name, pinyins
+
+
+def _record(stream, items):
+    for item in stream:
+        items.append((item[0], item[2]))
+        yield item
+
+
+def file_hash(path):
+    with open(path, 'rb') as fp:
+        return hashlib.sha256(fp.read()).hexdigest()
+
+
+def code_hash():
+    """合并规则或输出格式变化时缓存失效"""
+    h = hashlib.sha256()
+    for module in (__file__, pinyin_compact.__file__, page_table.__file__,
+                   inspect.getfile(PinyinMap), double_pinyin.__file__,
+                   pinyin_tone.__file__):
+        with open(module, 'rb') as fp:
+            h.update(fp.read())
+    return h.hexdigest()
+
+
+def schemes_hash(double_pinyins):
+    """双拼方案的内容哈希，--double-pinyin-json 加载的方案改动后输出也要重新生成"""
+    h = hashlib.sha256()
+    for name in double_pinyins:
+        scheme = double_pinyin.get_scheme(name)
+        h.update(json.dumps([
+            scheme.name, scheme.initials, scheme.finals, scheme.zero_initials,
+            scheme.zero_initial_key,
+        ], sort_keys=True, ensure_ascii=False).encode('utf8'))
+    return h.hexdigest()
+
+
+def write_if_changed(path, content):
+    """内容没有变化时不重写文件，返回是否写入"""
+    mode = 'b' if isinstance(content, bytes) else ''
+    encoding = None if mode else 'utf8'
+    if os.path.exists(path):
+        with open(path, 'r' + mode, encoding=encoding) as fp:
+            if fp.read() == content:
+                return False
+    with open(path, 'w' + mode, encoding=encoding) as fp:
+        fp.write(content)
+    return True
+
+
+def load_cache(path):
+    try:
+        with open(path, 'rb') as fp:
+            cache = pickle.load(fp)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        return None
+    if cache.get('version') != code_hash():
+        return None
+    return cache
+
+
+def save_cache(path, cache):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + '.tmp', 'wb') as fp:
+        pickle.dump(cache, fp, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(path + '.tmp', path)
+
+
+def check(source_maps, pinyin_map):
+    code_set = set(map(code_to_int, pinyin_map.keys()))
+    for name in ('kHanyuPinlu.txt', 'kXHC1983.txt', 'kMandarin_8105.txt',
+                 'kMandarin_overwrite.txt', 'kMandarin.txt', 'kTGHZ2013.txt',
+                 'overwrite.txt', 'GBK_PUA.txt'):
+        assert set(source_maps[name].keys()) - code_set == set(), name
+
+
+def build(cache_path=CACHE_PATH, verbose=True,
+          double_pinyins=DEFAULT_DOUBLE_PINYINS, profiler=profiling.NULL_PROFILER):
+    """合并所有来源，生成 pinyin.txt 等文件
+
+    没有缓存时流式归并所有来源。
+    缓存中记录了每个来源的内容哈希、解析结果和合并结果，
+    重新运行时只解析改动过的来源，只重新合并它们涉及的码位，
+    并且只重写内容有变化的输出文件。
+
+    profiler 记录每个阶段的耗时和内存，启用时先逐个解析来源再归并，
+    以便分别统计解析和合并。
+    """
+    with profiler.stage('load_cache'):
+        cache = load_cache(cache_path) if cache_path else None
+    if cache is None:
+        source_items = {name: [] for name in SOURCES}
+        sources = {name: iter_source(name) for name in SOURCES}
+        if profiler.enabled:
+            for name in SOURCES:
+                with profiler.stage('parse ' + name) as counts:
+                    items = list(sources[name])
+                    counts.update(profiling.count_pinyins(item[2] for item in items))
+                profiler.record_input(name, (item[2] for item in items))
+                sources[name] = iter(items)
+        if cache_path:  # 顺便记录解析结果，用于之后的增量构建
+            sources = {name: _record(stream, source_items[name])
+                       for name, stream in sources.items()}
+        with profiler.stage('merge') as counts:
+            pinyin_map = collections.OrderedDict(merge_sources(sources))
+            counts.update(profiling.count_pinyins(pinyin_map.values()))
+        touched = pinyin_map.keys()
+        # 所有来源共用一张音节表
+        syllables = SyllableTable()
+        source_maps = {name: PinyinMap.from_items(items, syllables)
+                       for name, items in source_items.items()}
+        cache = {
+            'version': code_hash(),
+            'sources': {name: (file_hash(name), source_maps[name])
+                        for name in SOURCES},
+            'merged': pinyin_map,
+            'outputs': {},
+        }
+    else:
+        cached_sources = cache['sources']
+        source_maps = {}
+        touched = set()
+        for name in SOURCES:
+            digest = file_hash(name)
+            cached_digest, old_map = cached_sources[name]
+            if cached_digest == digest:
+                source_maps[name] = old_map
+                profiler.record_input(name, old_map.values())
+                continue
+            with profiler.stage('parse ' + name) as counts:
+                with open(name, encoding='utf8') as fp:
+                    new_map = load_pinyin_map(fp, old_map.syllables)
+                counts.update(profiling.count_pinyins(new_map.values()))
+            profiler.record_input(name, new_map.values())
+            # 新增、删除和改动的码位
+            touched.update(
+                int_to_code(code) for code in old_map.keys() | new_map.keys()
+                if old_map.get(code) != new_map.get(code)
+            )
+            source_maps[name] = new_map
+            cached_sources[name] = (digest, new_map)
+            if verbose:
+                print('parsed {}'.format(name))
+
+        pinyin_map = cache['merged']
+        added = False
+        with profiler.stage('merge') as counts:
+            for code in touched:
+                pinyins = merge_code(code, source_maps)
+                if pinyins is None:
+                    pinyin_map.pop(code, None)
+                else:
+                    added = added or code not in pinyin_map
+                    pinyin_map[code] = pinyins
+            counts['touched'] = len(touched)
+        if added:  # 只有新增码位时才需要重新排序
+            with profiler.stage('sort'):
+                pinyin_map = collections.OrderedDict(
+                    sorted(pinyin_map.items(), key=lambda item: code_to_int(item[0]))
+                )
+            cache['merged'] = pinyin_map
+        with profiler.stage('check'):
+            check(source_maps, pinyin_map)
+    if verbose:
+        print('merged {} of {} code points'.format(len(touched), len(pinyin_map)))
+
+    schemes = schemes_hash(double_pinyins)
+    outputs_ok = cache.get('double_pinyins') == schemes and all(
+        os.path.exists(path) and cache['outputs'].get(path) == file_hash(path)
+        for path in OUTPUTS
+    )
+    if touched or not outputs_ok:
+        with profiler.stage('save_data') as counts:
+            writer = io.StringIO()
+            writer.write('# version: 0.11.0\n')
+            writer.write('# source: https://github.com/mozillazg/pinyin-data\n')
+            save_data(pinyin_map, writer)
+            write_if_changed('pinyin.txt', writer.getvalue())
+            counts.update(profiling.count_pinyins(pinyin_map.values()))
+        save_data2(pinyin_map, double_pinyins, profiler)
+        with profiler.stage('check_binary'):
+            check_binary('pinyin_compact.txt', 'pinyin_compact.bin')
+        cache['outputs'] = {path: file_hash(path) for path in OUTPUTS}
+        cache['double_pinyins'] = schemes
+    elif verbose:
+        print('outputs are up to date')
+
+    if cache_path:
+        with profiler.stage('save_cache'):
+            save_cache(cache_path, cache)
+    return pinyin_map
+
+
 if __name__ == '__main__':
-    raw_pinyin_map = {}
-    '''
-    with open('kHanyuPinyin.txt', encoding='utf8') as fp:
-        khanyupinyin = parse_pinyins(fp)
-        raw_pinyin_map.update(khanyupinyin)
-    with open('kXHC1983.txt', encoding='utf8') as fp:
-        kxhc1983 = parse_pinyins(fp)
-        extend_pinyins(raw_pinyin_map, kxhc1983)
-    '''
-    with open('kXHC1983.txt', encoding='utf8') as fp:
-        kxhc1983 = parse_pinyins(fp)
-        raw_pinyin_map.update(kxhc1983)
-    with open('nonCJKUI.txt', encoding='utf8') as fp:
-        noncjkui = parse_pinyins(fp)
-        extend_pinyins(raw_pinyin_map, noncjkui)
-    with open('kMandarin_8105.txt', encoding='utf8') as fp:
-        adjust_pinyin_map = parse_pinyins(fp)
-        extend_pinyins(raw_pinyin_map, adjust_pinyin_map)
-    with open('kMandarin_overwrite.txt', encoding='utf8') as fp:
-        _map = parse_pinyins(fp)
-        extend_pinyins(adjust_pinyin_map, _map)
-        extend_pinyins(raw_pinyin_map, adjust_pinyin_map)
-    with open('kMandarin.txt', encoding='utf8') as fp:
-        _map = parse_pinyins(fp)
-        extend_pinyins(adjust_pinyin_map, _map)
-        extend_pinyins(raw_pinyin_map, adjust_pinyin_map)
-    with open('kTGHZ2013.txt', encoding='utf8') as fp:
-        _map = parse_pinyins(fp)
-        extend_pinyins(adjust_pinyin_map, _map)
-        extend_pinyins(raw_pinyin_map, adjust_pinyin_map)
-    with open('kHanyuPinlu.txt', encoding='utf8') as fp:
-        khanyupinyinlu = parse_pinyins(fp)
-        extend_pinyins(adjust_pinyin_map, _map)
-        extend_pinyins(raw_pinyin_map, adjust_pinyin_map)
-    with open('GBK_PUA.txt', encoding='utf8') as fp:
-        pua_pinyin_map = parse_pinyins(fp)
-        extend_pinyins(raw_pinyin_map, pua_pinyin_map)
-    with open('kanji.txt', encoding='utf8') as fp:
-        _map = parse_pinyins(fp)
-        extend_pinyins(raw_pinyin_map, _map, only_no_exists=True)
-
-    with open('overwrite.txt', encoding='utf8') as fp:
-        overwrite_pinyin_map = parse_pinyins(fp)
-        extend_pinyins(raw_pinyin_map, overwrite_pinyin_map)
-
-    new_pinyin_map = merge(raw_pinyin_map, adjust_pinyin_map,
-                           overwrite_pinyin_map)
-    new_pinyin_map = sort_pinyin_dict(new_pinyin_map)
-
-    assert len(new_pinyin_map) == len(raw_pinyin_map)
-    code_set = set(new_pinyin_map.keys())
-    #assert set(khanyupinyin.keys()) - code_set == set()
-    assert set(khanyupinyinlu.keys()) - code_set == set()
-    assert set(kxhc1983.keys()) - code_set == set()
-    assert set(adjust_pinyin_map.keys()) - code_set == set()
-    assert set(overwrite_pinyin_map.keys()) - code_set == set()
-    assert set(pua_pinyin_map.keys()) - code_set == set()
-    with open('pinyin.txt', 'w', encoding='utf8') as fp:
-        fp.write('# version: 0.11.0\n')
-        fp.write('# source: https://github.com/mozillazg/pinyin-data\n')
-        save_data(new_pinyin_map, fp)
-    save_data2(new_pinyin_map)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='merge Unihan data')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='ignore {} and rebuild everything'.format(
+                            CACHE_PATH))
+    parser.add_argument('--double-pinyin', default=','.join(DEFAULT_DOUBLE_PINYINS),
+                        help='comma separated double pinyin schemes written to '
+                             'pinyin_compact.txt, available: {}'.format(
+                                 ','.join(double_pinyin.SCHEMES)))
+    parser.add_argument('--double-pinyin-json', action='append', default=[],
+                        metavar='PATH', help='load a double pinyin scheme from a JSON file')
+    parser.add_argument('--profile', metavar='REPORT',
+                        default=os.environ.get(profiling.ENV_REPORT),
+                        help='write per-stage timings and memory peaks to a JSON '
+                             'report (env: {})'.format(profiling.ENV_REPORT))
+    parser.add_argument('--cprofile', metavar='PATH',
+                        default=os.environ.get(profiling.ENV_CPROFILE),
+                        help='dump cProfile stats of the slowest stage '
+                             '(env: {})'.format(profiling.ENV_CPROFILE))
+    args = parser.parse_args()
+    for path in args.double_pinyin_json:
+        double_pinyin.load_json(path)
+    profiler = profiling.NULL_PROFILER
+    if args.profile or args.cprofile:
+        profiler = profiling.Profiler(cprofile=bool(args.cprofile))
+    build(cache_path=None if args.no_cache else CACHE_PATH,
+          double_pinyins=tuple(args.double_pinyin.split(',')), profiler=profiler)
+    profiler.save(args.profile, args.cprofile)
@@ -0,0 +1,324 @@
+# -*- coding: utf-8 -*-
+"""两级查找表：码位空间按 2 ** shift 个码位分页，内容相同的页只保存一份
+
+    >>> import page_table
+    >>> table = page_table.build({0x4E2D: 7, 0x4E2E: 8}, default=0xFFFF)
+    >>> table[0x4E2D], table[0x4E00], table[0x10FFFF]
+    (7, 65535, 65535)
+
+第一级 index 的下标是页号，值是第二级 pages 中的页号，
+code 的值是 pages[index[code >> shift] << shift | code & (2 ** shift - 1)]，
+超出 index 的码位是 default。大段没有数据的码位都指向同一个空白页，
+不需要手写范围。shift 默认选择两级总字节数最小的。
+
+pinyin_compact.bin 和 generate/pinyin_initial_table.py 生成的 C 代码使用这种格式。
+
+    python page_table.py  # 比较平铺的范围表和两级表的大小和查询耗时
+"""
+from array import array
+import bisect
+import struct
+import sys
+import time
+
+SHIFTS = range(4, 11)  # 每页 16 到 1024 个码位
+INDEX_TYPECODE = 'H'  # 第一级的页号是 uint16
+
+# output_pinyin_initial_table*.bin 等单独保存的两级表的格式，所有整数都是小端序：
+#
+#   header: magic, version, shift, 值的字节数, 默认值, index 长度, 页数
+#   index: uint16 * index 长度
+#   pages: 值 * (页数 << shift)
+#
+# 每一段都按 4 字节对齐
+BINARY_MAGIC = b'PYPT'
+BINARY_VERSION = 1
+BINARY_HEADER = struct.Struct('<4sHBBIII')
+_TYPECODES = {2: 'H', 4: 'I'}
+C_TYPES = {'H': 'uint16_t', 'I': 'uint32_t'}
+
+
+class PageTable:
+    __slots__ = ('shift', 'index', 'pages', 'default')
+
+    def __init__(self, shift, index, pages, default):
+        self.shift = shift
+        self.index = index  # array('H') 或 memoryview
+        self.pages = pages
+        self.default = default
+
+    def __getitem__(self, code):
+        shift = self.shift
+        page = code >> shift
+        if page >= len(self.index):
+            return self.default
+        return self.pages[self.index[page] << shift | code & ((1 << shift) - 1)]
+
+    def __len__(self):
+        """index 覆盖的码位数"""
+        return len(self.index) << self.shift
+
+    @property
+    def page_count(self):
+        return len(self.pages) >> self.shift
+
+    @property
+    def nbytes(self):
+        return (len(self.index) * self.index.itemsize
+                + len(self.pages) * self.pages.itemsize)
+
+    def view(self, start, stop):
+        return TableView(self, start, stop - start)
+
+
+class TableView:
+    """PageTable 中的一个范围，与 PinyinCompact.ranges 中的 array('H') 用法相同"""
+    __slots__ = ('table', 'start', 'length')
+
+    def __init__(self, table, start, length):
+        self.table = table
+        self.start = start
+        self.length = length
+
+    def __getitem__(self, index):
+        if not 0 <= index < self.length:
+            raise IndexError(index)
+        return self.table[self.start + index]
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+        table = self.table
+        return (table[code] for code in range(self.start, self.start + self.length))
+
+    def tobytes(self):
+        return array(_typecode(self.table.pages), self).tobytes()
+
+
+def _typecode(values):
+    """array 的 typecode 或 memoryview 的 format"""
+    return getattr(values, 'typecode', None) or values.format
+
+
+def derive_ranges(codes, gap):
+    """有数据的码位组成的范围，连续超过 gap 个码位没有数据时拆开，按码位排序"""
+    codes = sorted(codes)
+    if not codes:
+        return ()
+    result = []
+    start = previous = codes[0]
+    for code in codes[1:]:
+        if code - previous > gap:
+            result.append(range(start, previous + 1))
+            start = code
+        previous = code
+    result.append(range(start, previous + 1))
+    return tuple(result)
+
+
+def _build(values, default, typecode, shift):
+    size = 1 << shift
+    by_page = {}
+    for code, value in values.items():
+        by_page.setdefault(code >> shift, []).append((code & (size - 1), value))
+    blank = array(typecode, [default]) * size
+    page_ids = {}
+    pages = array(typecode)
+    index = array(INDEX_TYPECODE)
+    for page in range(max(by_page) + 1 if by_page else 0):
+        data = blank
+        if page in by_page:
+            data = array(typecode, blank)
+            for offset, value in by_page[page]:
+                data[offset] = value
+        key = data.tobytes()
+        page_id = page_ids.get(key)
+        if page_id is None:
+            page_id = page_ids[key] = len(page_ids)
+            pages.extend(data)
+        index.append(page_id)
+    return PageTable(shift, index, pages, default)
+
+
+def build(values, default, typecode='H', shift=None):
+    """{code: value} 的两级表，shift 为 None 时在 SHIFTS 中选择总字节数最小的"""
+    if shift is not None:
+        return _build(values, default, typecode, shift)
+    return min((_build(values, default, typecode, shift) for shift in SHIFTS),
+               key=lambda table: table.nbytes)
+
+
+def _pad(size):
+    return b'\0' * (-size % 4)
+
+
+def _tobytes(values):
+    values = array(_typecode(values), values)
+    if sys.byteorder != 'little':
+        values.byteswap()
+    return values.tobytes()
+
+
+def _cast(view, typecode):
+    view = view.cast(typecode)
+    if sys.byteorder != 'little':  # 大端机器上只能复制一份
+        data = array(typecode, view)
+        data.byteswap()
+        return data
+    return view
+
+
+def write_sections(table, fp):
+    """index 和 pages 两段，每段按 4 字节对齐"""
+    for data in (_tobytes(table.index), _tobytes(table.pages)):
+        fp.write(data)
+        fp.write(_pad(len(data)))
+
+
+def read_sections(view, pos, shift, index_length, page_count, typecode, default):
+    """与 write_sections 相对，返回 (PageTable, 结束位置)，不复制 view 中的数据"""
+    itemsize = array(typecode).itemsize
+    size = index_length * 2
+    index = _cast(view[pos:pos + size], INDEX_TYPECODE)
+    pos += size + (-size % 4)
+    size = (page_count << shift) * itemsize
+    pages = _cast(view[pos:pos + size], typecode)
+    pos += size + (-size % 4)
+    return PageTable(shift, index, pages, default), pos
+
+
+def save_binary(table, fp):
+    itemsize = table.pages.itemsize
+    fp.write(BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, table.shift, itemsize,
+                                table.default, len(table.index), table.page_count))
+    write_sections(table, fp)
+
+
+def parse_binary(buffer):
+    view = memoryview(buffer)
+    (magic, version, shift, itemsize, default, index_length,
+     page_count) = BINARY_HEADER.unpack_from(view)
+    if magic != BINARY_MAGIC:
+        raise ValueError('not a page table file')
+    if version != BINARY_VERSION:
+        raise ValueError('unsupported version: {}'.format(version))
+    table, _ = read_sections(view, BINARY_HEADER.size, shift, index_length,
+                             page_count, _TYPECODES[itemsize], default)
+    return table
+
+
+def format_c(table, name):
+    """C 代码：name_index、name_pages 两个数组和 name_lookup(code) 函数"""
+    ctype = C_TYPES[_typecode(table.pages)]
+    upper = name.upper()
+    return '''#define {upper}_SHIFT {shift}
+#define {upper}_LIMIT 0x{limit:X}  /* 大于等于它的码位没有数据 */
+
+static const uint16_t {name}_index[{index_length}] = {{ {index} }};
+static const {ctype} {name}_pages[{pages_length}] = {{ {pages} }};
+
+static inline {ctype} {name}_lookup(uint32_t code)
+{{
+    if (code >= {upper}_LIMIT)
+        return {default};
+    return {name}_pages[({name}_index[code >> {upper}_SHIFT] << {upper}_SHIFT)
+                        | (code & ((1u << {upper}_SHIFT) - 1))];
+}}
+'''.format(
+        upper=upper, name=name, ctype=ctype, shift=table.shift, limit=len(table),
+        index_length=len(table.index), pages_length=len(table.pages),
+        # 16^n ≥ 10^(n+2) -> n ≥ 10，十位以下用 0x十六进制 的编码效率低于十进制
+        index=','.join(map(str, table.index)), pages=','.join(map(str, table.pages)),
+        default=table.default,
+    )
+
+
+def flat_nbytes(ranges, itemsize):
+    """每个范围一个平铺数组时的字节数，每个范围另有 (start, stop, 指针) 三个 uint32"""
+    return sum(len(rng) for rng in ranges) * itemsize + len(ranges) * 12
+
+
+def _time_lookups(lookup, codes, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for code in codes:
+            lookup(code)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best / len(codes) * 1e9
+
+
+def report(name, values, default, typecode, ranges):
+    """两级表各个 shift 的大小，以及平铺的范围表和两级表的查询耗时"""
+    itemsize = array(typecode).itemsize
+    flat = flat_nbytes(ranges, itemsize)
+    tables = [_build(values, default, typecode, shift) for shift in SHIFTS]
+    best = min(tables, key=lambda table: table.nbytes)
+    print('{}: {} code points, {} ranges, flat {} bytes'.format(
+        name, len(values), len(ranges), flat))
+    print('{:>6} {:>8} {:>8} {:>10} {:>7}'.format('shift', 'index', 'pages', 'bytes', 'ratio'))
+    for table in tables:
+        print('{:6} {:8} {:8} {:10} {:6.1%}{}'.format(
+            table.shift, len(table.index), table.page_count, table.nbytes,
+            table.nbytes / flat, ' *' if table is best else ''))
+
+    # 与 PinyinCompact.lookup_codepoint 相同的逐个范围比较，
+    # 范围数组按起点排序后二分查找，以及两级表
+    arrays = [(rng.start, rng.stop, array(typecode, (values.get(code, default)
+                                                      for code in rng)))
+              for rng in ranges]
+    starts = [start for start, _, _ in arrays]
+
+    def linear(code):
+        for start, stop, data in arrays:
+            if start <= code < stop:
+                return data[code - start]
+        return default
+
+    def binary_search(code):
+        i = bisect.bisect_right(starts, code) - 1
+        if i >= 0:
+            start, stop, data = arrays[i]
+            if code < stop:
+                return data[code - start]
+        return default
+
+    codes = sorted(values)
+    assert all(best[code] == linear(code) == binary_search(code) for code in codes)
+    print('lookup ns: ranges linear {:.0f}, ranges bisect {:.0f}, two-stage {:.0f} '
+          '(2 array reads)\n'.format(_time_lookups(linear, codes),
+                                     _time_lookups(binary_search, codes),
+                                     _time_lookups(best.__getitem__, codes)))
+    return best
+
+
+def main(argv=None):
+    import argparse  # pinyin_compact 导入本模块，命令行用到的模块不在启动时导入
+
+    parser = argparse.ArgumentParser(
+        description='report sizes and lookup cost of two-stage tables')
+    parser.parse_args(argv)
+
+    import merge_unihan
+    import pinyin_compact
+    import pinyin_initial
+
+    compact = pinyin_compact.load()
+    values = {}
+    for start, stop, table in compact.ranges:
+        for code, value in zip(range(start, stop), table):
+            if value != pinyin_compact.NO_PINYIN:
+                values[code] = value
+    ranges = merge_unihan.compact_ranges(values)
+    report('pinyin_compact', values, pinyin_compact.NO_PINYIN, 'H', ranges)
+
+    masks = pinyin_initial.build_masks(compact)
+    values = {code: masks[code] for code in values}
+    report('pinyin_initial', values, 0, 'I', ranges)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
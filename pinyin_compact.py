@@ -0,0 +1,415 @@
+# -*- coding: utf-8 -*-
+"""加载 pinyin_compact.txt，按码位 O(1) 查询汉字的拼音
+
+    >>> import pinyin_compact
+    >>> pinyin_compact.lookup('中')  # doctest: +ELLIPSIS
+    (Pinyin(pinyin='zhōng', ascii='zhong', ascii_num='zhong1', xiaohe='vs'), ...)
+
+pinyin_compact.bin 是同样数据的二进制版本，可以用 mmap 零拷贝读取，
+多个进程共享同一份页缓存，表保存为去重的两级表（见 page_table.py）：
+
+    >>> compact = pinyin_compact.load_binary()
+
+lookup 等函数使用 load_lazy 加载：打开文件时只解析拼音和组合，
+记下每个范围的表在文件中的位置，表按 PAGE_SIZE 个码位分页，
+第一次查询某一页中的码位时才解析这一页，只查询 BMP 汉字时不会解析扩展 B 等大范围。
+"""
+from array import array
+from collections import namedtuple
+import functools
+import io
+import mmap
+import os
+import struct
+import sys
+
+import page_table
+
+Pinyin = namedtuple('Pinyin', 'pinyin ascii ascii_num xiaohe')
+# pinyins 段中双拼方案的列，默认只有小鹤双拼；
+# 其他方案会写在段名后面，例如 "pinyins: xiaohe,ziranma"
+DEFAULT_DOUBLE_PINYINS = ('xiaohe',)
+
+NO_PINYIN = 0xFFFF  # pinyin_tables 中没有拼音的码位
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            'pinyin_compact.txt')
+DEFAULT_BINARY_PATH = os.path.splitext(DEFAULT_PATH)[0] + '.bin'
+
+# pinyin_compact.bin 的格式，所有整数都是小端序：
+#
+#   header: magic, version, 拼音数, 组合数, 范围数, 字符串池字节数, 组合 id 数
+#   字符串池: UTF-8，第一行是双拼方案的列名，
+#            之后每个拼音一行，各列用逗号分隔（与 pinyins 段相同）
+#   组合偏移: uint16 * (组合数 + 1)
+#   组合 id: uint16 * 组合 id 数
+#   范围目录: (start, stop) uint32 * 2 * 范围数，与 pinyin_compact.txt 的范围相同
+#   两级表的 header: shift, index 长度, 页数 uint32 * 3
+#   两级表: index uint16 * index 长度, pages uint16 * (页数 << shift)
+#
+# 每一段都按 4 字节对齐
+BINARY_MAGIC = b'PYCB'
+BINARY_VERSION = 3
+BINARY_HEADER = struct.Struct('<4sHHHHII')
+BINARY_RANGE = struct.Struct('<II')
+BINARY_PAGES = struct.Struct('<III')
+
+PAGE_SIZE = 1024  # load_lazy 每次解析的码位数
+_PAGE_BYTES = PAGE_SIZE * len('65535,')  # 一页在文本中最多的字节数
+
+
+@functools.lru_cache(maxsize=None)
+def pinyin_type(double_pinyins=DEFAULT_DOUBLE_PINYINS):
+    """带有指定双拼方案列的 Pinyin 类型"""
+    if double_pinyins == DEFAULT_DOUBLE_PINYINS:
+        return Pinyin
+    return namedtuple('Pinyin', ('pinyin', 'ascii', 'ascii_num') + double_pinyins)
+
+
+class PinyinCompact:
+    """pinyin_compact.txt 的内存表示
+
+    * pinyins: 所有拼音，下标即 pinyin_tables 中的拼音 id，
+      每项是 pinyin_type() 返回的类型
+    * combinations: 多音字的拼音组合，每项是 pinyins 的下标列表
+    * ranges: [(start, stop, array('H'))]，与 save_data2 输出的范围一致
+    * table: 按码位直接取值的表，load_binary 中是两级表 page_table.PageTable，
+      load 和 load_lazy 中是 RangeIndex，查询不需要逐个比较范围
+    """
+    __slots__ = ('pinyins', 'combinations', 'ranges', 'table', '_entries')
+
+    def __init__(self, pinyins, combinations, ranges, table=None):
+        self.pinyins = pinyins
+        self.combinations = combinations
+        self.ranges = ranges
+        self.table = table
+        # 表中的值 v < len(pinyins) 时是单个拼音，否则是
+        # combinations[v - len(pinyins)]，预先生成所有结果避免查询时创建对象
+        self._entries = [(pinyin,) for pinyin in pinyins] + [
+            tuple(pinyins[i] for i in ids) for ids in combinations
+        ]
+
+    def lookup_codepoint(self, code):
+        if self.table is not None:
+            value = self.table[code]
+            if value == NO_PINYIN:
+                return ()
+            return self._entries[value]
+        for start, stop, table in self.ranges:
+            if start <= code < stop:
+                value = table[code - start]
+                if value == NO_PINYIN:
+                    return ()
+                return self._entries[value]
+        return ()
+
+    def lookup(self, hanzi):
+        return self.lookup_codepoint(ord(hanzi))
+
+
+def parse_compact(fp):
+    pinyins = []
+    combinations = []
+    ranges = []
+    section = None
+    rng = None
+    for line in fp:
+        line = line.rstrip('\n')
+        if not line:
+            continue
+        if ':' in line and not line.startswith('0x'):  # 段名
+            section, columns = line.split(':')
+            if section == 'pinyins':
+                columns = columns.strip()
+                Type = pinyin_type(tuple(columns.split(','))
+                                   if columns else DEFAULT_DOUBLE_PINYINS)
+            continue
+
+        if section == 'pinyins':
+            pinyins.append(Type(*line.split(',')))
+        elif section == 'pinyin_combinations':
+            combinations.append([int(x) for x in line.split(',')])
+        elif section == 'pinyin_tables':
+            if rng is None:  # 0x3400, 0x9FED:
+                start, end = line[:-1].split(',')
+                rng = int(start, 16), int(end, 16) + 1
+            else:
+                table = array('H', map(int, line.split(',')))
+                assert len(table) == rng[1] - rng[0]
+                ranges.append((rng[0], rng[1], table))
+                rng = None
+        else:
+            raise ValueError('unknown section: {!r}'.format(section))
+
+    return PinyinCompact(pinyins, combinations, ranges, RangeIndex(ranges))
+
+
+def load(path=DEFAULT_PATH):
+    with open(path, encoding='utf8') as fp:
+        return parse_compact(fp)
+
+
+class RangeIndex:
+    """ranges 按码位的索引，index[code] 与 PageTable 相同，是码位的值或 NO_PINYIN
+
+    码位空间按 2 ** shift 分块，每块记下与它相交的范围（通常只有一个），
+    查询时不需要逐个比较所有范围；表本身不复制，LazyTable 依然按页惰性解析
+    """
+    __slots__ = ('shift', 'blocks')
+
+    def __init__(self, ranges, shift=10):
+        self.shift = shift
+        stop = max((stop for _, stop, _ in ranges), default=0)
+        self.blocks = [()] * -(-stop >> shift)
+        for rng in ranges:
+            for block in range(rng[0] >> shift, (rng[1] - 1 >> shift) + 1):
+                self.blocks[block] += (rng,)
+
+    def __getitem__(self, code):
+        block = code >> self.shift
+        if block < len(self.blocks):
+            for start, stop, table in self.blocks[block]:
+                if start <= code < stop:
+                    return table[code - start]
+        return NO_PINYIN
+
+
+class LazyTable:
+    """pinyin_tables 中一个范围的表，按 PAGE_SIZE 个码位分页，第一次访问某一页时才解析这一页"""
+    __slots__ = ('buffer', 'begin', 'end', 'length', '_pages', '_offsets')
+
+    def __init__(self, buffer, begin, end, length):
+        self.buffer = buffer  # 文件的 mmap，表是 buffer[begin:end] 中的一行
+        self.begin = begin
+        self.end = end
+        self.length = length
+        self._pages = [None] * -(-length // PAGE_SIZE)
+        # {页号: 这一页在 buffer 中的起始位置}，最后一页之后的位置是行尾之后
+        self._offsets = {0: begin, len(self._pages): end + 1}
+
+    @property
+    def loaded_pages(self):
+        return sum(page is not None for page in self._pages)
+
+    def _offset(self, page):
+        """第 page * PAGE_SIZE 个逗号之后的位置
+
+        从最近的已知位置开始逐页查找，每次只从 mmap 中复制一页的字节，
+        经过的每一页的位置都记下来
+        """
+        offset = self._offsets.get(page)
+        if offset is not None:
+            return offset
+        below = max(known for known in self._offsets if known < page)
+        above = min(known for known in self._offsets if known > page)
+        if page - below <= above - page:
+            for known in range(below, page):
+                self._offsets[known + 1] = self._next_offset(self._offsets[known])
+        else:
+            for known in range(above, page, -1):
+                self._offsets[known - 1] = self._previous_offset(
+                    known - 1, self._offsets[known])
+        return self._offsets[page]
+
+    def _next_offset(self, begin):
+        """从 begin 开始的一页之后的位置"""
+        data = self.buffer[begin:min(begin + _PAGE_BYTES, self.end)]
+        values = data.split(b',', PAGE_SIZE)
+        assert len(values) == PAGE_SIZE + 1
+        return begin + len(data) - len(values[-1])
+
+    def _previous_offset(self, page, end):
+        """第 page 页（page > 0）的起始位置，end 是下一页的起始位置"""
+        count = min(PAGE_SIZE, self.length - page * PAGE_SIZE)
+        begin = max(self.begin, end - 1 - _PAGE_BYTES)
+        data = self.buffer[begin:end - 1]
+        values = data.rsplit(b',', count)
+        assert len(values) == count + 1
+        return begin + len(values[0]) + 1
+
+    def _load_page(self, page):
+        begin = self._offset(page)
+        if page + 1 < len(self._pages):
+            end = self._offset(page + 1) - 1
+        else:
+            end = self.end
+        table = array('H', map(int, self.buffer[begin:end].split(b',')))
+        assert len(table) == min(PAGE_SIZE, self.length - page * PAGE_SIZE)
+        self._pages[page] = table
+        return table
+
+    def __getitem__(self, index):
+        page, index = divmod(index, PAGE_SIZE)
+        table = self._pages[page]
+        if table is None:
+            table = self._load_page(page)
+        return table[index]
+
+    def __len__(self):
+        return self.length
+
+    def materialize(self):
+        """整个表的 array('H')，不会缓存"""
+        table = array('H', map(int, self.buffer[self.begin:self.end].split(b',')))
+        assert len(table) == self.length
+        return table
+
+    def __iter__(self):
+        return iter(self.materialize())
+
+    def tobytes(self):
+        return self.materialize().tobytes()
+
+
+def load_lazy(path=DEFAULT_PATH):
+    """与 load 相同，但 ranges 中的表是 LazyTable"""
+    with open(path, 'rb') as fp:
+        buffer = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+    # 拼音和组合只有几千行，直接解析
+    tables_at = buffer.find(b'\npinyin_tables:')
+    if tables_at < 0:
+        raise ValueError('no pinyin_tables section')
+    compact = parse_compact(io.StringIO(buffer[:tables_at].decode('utf8')))
+
+    pos = buffer.find(b'\n', tables_at + 1) + 1
+    size = len(buffer)
+    while pos < size:
+        header_end = buffer.find(b'\n', pos)
+        if header_end == pos:  # 空行
+            pos += 1
+            continue
+        start, end = buffer[pos:header_end].rstrip(b':').split(b',')
+        start, stop = int(start, 16), int(end, 16) + 1
+        begin = header_end + 1
+        end = buffer.find(b'\n', begin)
+        if end < 0:
+            end = size
+        compact.ranges.append((start, stop, LazyTable(buffer, begin, end, stop - start)))
+        pos = end + 1
+    compact.table = RangeIndex(compact.ranges)
+    return compact
+
+
+def _pad(size):
+    return b'\0' * (-size % 4)
+
+
+def _uint16s(values):
+    data = array('H', values)
+    if sys.byteorder != 'little':
+        data.byteswap()
+    return data.tobytes()
+
+
+def save_binary(compact, fp):
+    pool = '\n'.join([','.join(compact.pinyins[0]._fields[3:])] + [
+        ','.join(pinyin) for pinyin in compact.pinyins
+    ])
+    pool = pool.encode('utf8')
+    offsets = [0]
+    ids = []
+    for combination in compact.combinations:
+        ids.extend(combination)
+        offsets.append(len(ids))
+
+    table = page_table.build({
+        code: value
+        for start, stop, values in compact.ranges
+        for code, value in zip(range(start, stop), values) if value != NO_PINYIN
+    }, NO_PINYIN)
+
+    fp.write(BINARY_HEADER.pack(
+        BINARY_MAGIC, BINARY_VERSION, len(compact.pinyins),
+        len(compact.combinations), len(compact.ranges), len(pool), len(ids)
+    ))
+    for data in (pool, _uint16s(offsets), _uint16s(ids)):
+        fp.write(data)
+        fp.write(_pad(len(data)))
+    for start, stop, _ in compact.ranges:
+        fp.write(BINARY_RANGE.pack(start, stop))
+    fp.write(BINARY_PAGES.pack(table.shift, len(table.index), table.page_count))
+    page_table.write_sections(table, fp)
+
+
+def _cast_uint16(view):
+    view = view.cast('H')
+    if sys.byteorder != 'little':  # 大端机器上只能复制一份
+        data = array('H', view)
+        data.byteswap()
+        return data
+    return view
+
+
+def parse_binary(buffer):
+    """从 bytes/mmap 解析，表直接引用 buffer 中的内存，不复制"""
+    view = memoryview(buffer)
+    (magic, version, pinyin_count, combination_count, range_count,
+     pool_size, id_count) = BINARY_HEADER.unpack_from(view)
+    if magic != BINARY_MAGIC:
+        raise ValueError('not a pinyin_compact.bin file')
+    if version != BINARY_VERSION:
+        raise ValueError('unsupported version: {}'.format(version))
+
+    pos = BINARY_HEADER.size
+
+    def take(size):
+        nonlocal pos
+        data = view[pos:pos + size]
+        pos += size + (-size % 4)
+        return data
+
+    pool = bytes(take(pool_size)).decode('utf8')
+    columns, *lines = pool.split('\n')
+    Type = pinyin_type(tuple(columns.split(',')))
+    pinyins = [Type(*line.split(',')) for line in lines]
+    assert len(pinyins) == pinyin_count
+    offsets = _cast_uint16(take((combination_count + 1) * 2))
+    ids = _cast_uint16(take(id_count * 2))
+    combinations = [list(ids[offsets[i]:offsets[i + 1]])
+                    for i in range(combination_count)]
+
+    directory = [BINARY_RANGE.unpack_from(view, pos + i * BINARY_RANGE.size)
+                 for i in range(range_count)]
+    pos += range_count * BINARY_RANGE.size
+    shift, index_length, page_count = BINARY_PAGES.unpack_from(view, pos)
+    table, _ = page_table.read_sections(view, pos + BINARY_PAGES.size, shift,
+                                        index_length, page_count, 'H', NO_PINYIN)
+    ranges = [(start, stop, table.view(start, stop)) for start, stop in directory]
+    return PinyinCompact(pinyins, combinations, ranges, table)
+
+
+def load_binary(path=DEFAULT_BINARY_PATH):
+    with open(path, 'rb') as fp:
+        # mmap 在文件关闭后依然有效，由两级表中的 memoryview 保持引用
+        buffer = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+    return parse_binary(buffer)
+
+
+def check_binary(path=DEFAULT_PATH, binary_path=DEFAULT_BINARY_PATH):
+    """检查二进制文件与文本文件的内容是否一致"""
+    text = load(path)
+    binary = load_binary(binary_path)
+    assert binary.pinyins == text.pinyins
+    assert binary.combinations == text.combinations
+    assert len(binary.ranges) == len(text.ranges)
+    for (start, stop, table), (start2, stop2, table2) in zip(
+            binary.ranges, text.ranges):
+        assert (start, stop) == (start2, stop2)
+        assert table.tobytes() == table2.tobytes()
+
+
+_default = None
+
+
+def get_default():
+    global _default
+    if _default is None:
+        _default = load_lazy()
+    return _default
+
+
+def lookup(hanzi):
+    return get_default().lookup(hanzi)
+
+
+def lookup_codepoint(code):
+    return get_default().lookup_codepoint(code)
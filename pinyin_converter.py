@@ -0,0 +1,272 @@
+# -*- coding: utf-8 -*-
+"""把文本中的汉字转换为拼音，非汉字原样输出
+
+    >>> from pinyin_converter import Converter
+    >>> Converter().convert('我爱Python。')
+    'wǒ ài Python。'
+
+convert_chunks 逐块转换任意大的文本，convert_file 把大文件按行切分后用多进程转换：
+
+    python pinyin_converter.py --style tone_num -j 8 corpus.txt corpus.pinyin.txt
+"""
+import argparse
+import itertools
+import multiprocessing
+import os
+import re
+import sys
+
+import double_pinyin
+import pinyin_compact
+
+DATA_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _initial(pinyin):
+    """零声母音节（爱、鹅、欧）用第一个字母"""
+    for initial in _INITIALS:
+        if pinyin.ascii.startswith(initial):
+            return initial
+    return pinyin.ascii[0]
+
+
+_INITIALS = sorted(double_pinyin.INITIALS, key=lambda x: -len(x))
+STYLES = {
+    'tone': lambda pinyin: pinyin.pinyin,  # zhōng
+    'tone_num': lambda pinyin: pinyin.ascii_num,  # zhong1
+    'ascii': lambda pinyin: pinyin.ascii,  # zhong
+    'initial': _initial,  # zh
+    'first_letter': lambda pinyin: pinyin.ascii[0],  # z
+}
+
+
+def _char_class(codes, max_gap=256):
+    """把有序的码位合并成正则字符类中的范围
+
+    字符类中的范围越多匹配越慢，所以间隔不超过 max_gap 的范围也合并在一起，
+    范围内没有拼音的字符在转换时再单独处理
+    """
+    ranges = []
+    for code in codes:
+        if ranges and code - ranges[-1][1] <= max_gap:
+            ranges[-1][1] = code
+        else:
+            ranges.append([code, code])
+    return '[{}]'.format(''.join(
+        '{}-{}'.format(re.escape(chr(start)), re.escape(chr(end)))
+        for start, end in ranges
+    ))
+
+
+def build_mapping(compact, style='tone', heteronym=False,
+                  heteronym_separator='/', primary_pinyins=None):
+    """{汉字: 转换结果}
+
+    heteronym=False 时多音字只输出最常用的读音，由 primary_pinyins 决定，
+    primary_pinyins 为 None 时按合并规则从数据文件中计算
+    """
+    to_text = STYLES[style]
+    if not heteronym and primary_pinyins is None:
+        from merge_unihan import load_primary_pinyins
+        primary_pinyins = load_primary_pinyins(DATA_DIR)
+
+    mapping = {}
+    for start, stop, _ in compact.ranges:
+        for code in range(start, stop):
+            pinyins = compact.lookup_codepoint(code)
+            if not pinyins:
+                continue
+            if heteronym:
+                # 去重，例如 ascii 风格中 zhōng 和 zhòng 都是 zhong
+                texts = dict.fromkeys(to_text(pinyin) for pinyin in pinyins)
+                mapping[chr(code)] = heteronym_separator.join(texts)
+                continue
+            pinyin = pinyins[0]
+            primary = primary_pinyins.get(code)
+            if len(pinyins) > 1 and primary is not None:
+                for pinyin in pinyins:
+                    if pinyin.pinyin == primary:
+                        break
+                else:
+                    pinyin = pinyins[0]
+            mapping[chr(code)] = to_text(pinyin)
+    return mapping
+
+
+# 已输出文本结尾字符的类型
+_OTHER, _HANZI, _ALNUM = range(3)
+
+
+class Converter:
+    """汉字之间用 separator 分隔；汉字与相邻的字母、数字之间也加上 separator"""
+
+    def __init__(self, compact=None, style='tone', heteronym=False,
+                 separator=' ', heteronym_separator='/', primary_pinyins=None,
+                 mapping=None):
+        if mapping is None:
+            if compact is None:
+                compact = pinyin_compact.get_default()
+            mapping = build_mapping(compact, style, heteronym,
+                                    heteronym_separator, primary_pinyins)
+        self.mapping = mapping
+        self.separator = separator
+        self._re_hanzi = re.compile(
+            _char_class(sorted(ord(hanzi) for hanzi in mapping)) + '+'
+        )
+
+    def _convert(self, text, state):
+        """返回 (结果, 结尾字符的类型)，类型用于处理下一块开头的分隔符"""
+        sep = self.separator
+        output = []
+        pos = 0
+        for match in self._re_hanzi.finditer(text):
+            start = match.start()
+            if start > pos:
+                state = self._append_other(output, text[pos:start], state)
+            hanzi = match.group()
+            try:
+                pinyins = sep.join(self._convert_hanzi(hanzi))
+            except KeyError:  # 合并后的范围中没有拼音的字符
+                state = self._append_mixed(output, hanzi, state)
+            else:
+                if state != _OTHER:
+                    output.append(sep)
+                output.append(pinyins)
+                state = _HANZI
+            pos = match.end()
+        if pos < len(text):
+            state = self._append_other(output, text[pos:], state)
+        return ''.join(output), state
+
+    def _append_mixed(self, output, text, state):
+        for is_hanzi, chars in itertools.groupby(text, self.mapping.__contains__):
+            chars = ''.join(chars)
+            if is_hanzi:
+                if state != _OTHER:
+                    output.append(self.separator)
+                output.append(self.separator.join(self._convert_hanzi(chars)))
+                state = _HANZI
+            else:
+                state = self._append_other(output, chars, state)
+        return state
+
+    def _convert_hanzi(self, hanzi):
+        """一段连续汉字的转换结果，每个汉字一项；有汉字没有拼音时抛出 KeyError"""
+        return map(self.mapping.__getitem__, hanzi)
+
+    def _append_other(self, output, other, state):
+        if state == _HANZI and other[0].isalnum():
+            output.append(self.separator)
+        output.append(other)
+        return _ALNUM if other[-1].isalnum() else _OTHER
+
+    def convert(self, text):
+        return self._convert(text, _OTHER)[0]
+
+    def worker_args(self):
+        """(类, 参数)，用于在子进程中创建相同的转换器"""
+        return type(self), {'mapping': self.mapping, 'separator': self.separator}
+
+    def convert_chunks(self, chunks):
+        """逐块转换，块的边界可以在任意位置"""
+        state = _OTHER
+        for chunk in chunks:
+            if not chunk:
+                continue
+            output, state = self._convert(chunk, state)
+            yield output
+
+    def convert_fp(self, fp, writer, chunk_size=1 << 20):
+        chunks = iter(lambda: fp.read(chunk_size), '')
+        for output in self.convert_chunks(chunks):
+            writer.write(output)
+
+
+def iter_shards(path, shard_size):
+    """按字节切分文件，切分点移到下一个换行符之后，产生 (start, end)"""
+    size = os.path.getsize(path)
+    with open(path, 'rb') as fp:
+        start = 0
+        while start < size:
+            end = min(start + shard_size, size)
+            if end < size:
+                fp.seek(end)
+                end += len(fp.readline())
+            yield start, end
+            start = end
+
+
+_worker = None
+
+
+def _init_worker(cls, kwargs):
+    global _worker
+    _worker = cls(**kwargs)
+
+
+def _convert_shard(args):
+    path, start, end = args
+    with open(path, 'rb') as fp:
+        fp.seek(start)
+        text = fp.read(end - start).decode('utf8')
+    return _worker.convert(text)
+
+
+def convert_file(path, writer, converter=None, processes=None,
+                 shard_size=8 << 20):
+    """多进程转换大文件，输出顺序与输入一致
+
+    每个分片都从行首开始，换行符两边不会加分隔符，所以结果与单进程转换相同；
+    分片按字节读取，换行符原样保留，单进程转换时也用 newline='' 打开文件
+    """
+    if converter is None:
+        converter = Converter()
+    shards = ((path, start, end) for start, end in iter_shards(path, shard_size))
+    with multiprocessing.Pool(
+        processes, _init_worker, converter.worker_args()
+    ) as pool:
+        for output in pool.imap(_convert_shard, shards):
+            writer.write(output)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='convert hanzi to pinyin')
+    parser.add_argument('input', help='input file, - for stdin')
+    parser.add_argument('output', nargs='?', default='-',
+                        help='output file, - for stdout')
+    parser.add_argument('--style', choices=STYLES, default='tone')
+    parser.add_argument('--heteronym', action='store_true',
+                        help='output all readings of polyphones')
+    parser.add_argument('--separator', default=' ')
+    parser.add_argument('--phrases', metavar='PATH',
+                        help='use phrase readings from pinyin_phrase.bin '
+                             '(see pinyin_phrase.py) for polyphones')
+    parser.add_argument('-j', '--processes', type=int, default=1,
+                        help='number of worker processes, 0 for all cores')
+    args = parser.parse_args(argv)
+
+    if args.phrases:
+        from pinyin_phrase import PhraseConverter
+        converter = PhraseConverter(style=args.style, heteronym=args.heteronym,
+                                    separator=args.separator, store_path=args.phrases)
+    else:
+        converter = Converter(style=args.style, heteronym=args.heteronym,
+                              separator=args.separator)
+    writer = sys.stdout
+    if args.output != '-':
+        writer = open(args.output, 'w', encoding='utf8', newline='')
+    try:
+        if args.input == '-':
+            converter.convert_fp(sys.stdin, writer)
+        elif args.processes != 1:
+            convert_file(args.input, writer, converter, args.processes or None)
+        else:
+            with open(args.input, encoding='utf8', newline='') as fp:
+                converter.convert_fp(fp, writer)
+    finally:
+        if writer is not sys.stdout:
+            writer.close()
+
+
+if __name__ == '__main__':
+    main()
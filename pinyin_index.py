@@ -0,0 +1,272 @@
+# -*- coding: utf-8 -*-
+"""拼音到汉字的反向索引，支持带声调、数字声调、不带声调、前缀和声母查询
+
+    >>> import pinyin_index
+    >>> index = pinyin_index.build()
+    >>> index.lookup('zhong')[:3]
+    ['中', '仲', '众']
+
+结果中读音是该字最常用读音的汉字排在前面，同一组中按《通用规范汉字表》的级别
+（一级字、二级字、三级字、表外字）排序，最后按码位排序。
+
+索引保存在有序数组中：每种拼音形式一张表，包括有序的拼音列表、
+每个拼音在码位数组中的起止位置、码位数组和排序用的 rank 数组。
+pinyin_index.bin 是索引的二进制版本，可以用 mmap 零拷贝读取：
+
+    python pinyin_index.py  # 生成 pinyin_index.bin
+"""
+from array import array
+import bisect
+import mmap
+import os
+import struct
+import sys
+
+import double_pinyin
+import pinyin_compact
+
+DATA_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_PATH = os.path.join(DATA_DIR, 'pinyin_index.bin')
+
+# 每种拼音形式一张表，与 pinyin_compact.Pinyin 的字段同名
+KINDS = ('pinyin', 'ascii_num', 'ascii')
+# 排序用的 rank：先按是否是该字最常用的读音（只有一个读音时也算），
+# 再按字在《通用规范汉字表》中的级别，表外的字排在最后
+LEVEL_COUNT = 4
+RANK_OTHER = LEVEL_COUNT  # 不是最常用读音的 rank 从这里开始
+CHINA_8105_PATH = os.path.join(DATA_DIR, 'tools', 'china-8105-06062014.txt')
+
+# pinyin_index.bin 的格式，所有整数都是小端序：
+#
+#   header: magic, version, 表数
+#   每张表: 拼音数, 条目数, 拼音字符串池字节数,
+#          字符串池（UTF-8，换行分隔）, offsets uint32 * (拼音数 + 1),
+#          codes uint32 * 条目数, ranks uint8 * 条目数
+#
+# 每一段都按 4 字节对齐
+BINARY_MAGIC = b'PYIX'
+BINARY_VERSION = 1
+BINARY_HEADER = struct.Struct('<4sHH')
+BINARY_TABLE = struct.Struct('<III')
+
+
+class _Table:
+    __slots__ = ('keys', 'offsets', 'codes', 'ranks')
+
+    def __init__(self, keys, offsets, codes, ranks):
+        self.keys = keys
+        self.offsets = offsets
+        self.codes = codes
+        self.ranks = ranks
+
+    def exact(self, key):
+        i = bisect.bisect_left(self.keys, key)
+        if i == len(self.keys) or self.keys[i] != key:
+            return []
+        return list(self.codes[self.offsets[i]:self.offsets[i + 1]])
+
+    def key_range(self, prefix):
+        """以 prefix 开头的拼音在 keys 中的范围"""
+        start = bisect.bisect_left(self.keys, prefix)
+        stop = bisect.bisect_left(self.keys, prefix + '\U0010FFFF')
+        return start, stop
+
+    def entries(self, key_ids):
+        """多个拼音的条目合并后按 (rank, code) 排序，同一个字只出现一次"""
+        best = {}
+        for i in key_ids:
+            for j in range(self.offsets[i], self.offsets[i + 1]):
+                code = self.codes[j]
+                rank = self.ranks[j]
+                if best.get(code, 0xFF) > rank:
+                    best[code] = rank
+        return sorted(best, key=lambda code: (best[code], code))
+
+
+class PinyinIndex:
+    __slots__ = ('tables',)
+
+    def __init__(self, tables):
+        self.tables = tables  # {kind: _Table}
+
+    @staticmethod
+    def kind_of(pinyin):
+        if not pinyin.isascii():
+            return 'pinyin'
+        if pinyin[-1:].isdigit():
+            return 'ascii_num'
+        return 'ascii'
+
+    def lookup_codes(self, pinyin):
+        """精确查询：zhōng / zhong1 / zhong"""
+        return self.tables[self.kind_of(pinyin)].exact(pinyin)
+
+    def lookup(self, pinyin):
+        return [chr(code) for code in self.lookup_codes(pinyin)]
+
+    def prefix_codes(self, prefix):
+        """前缀查询：zh / zhon / zhong1（数字声调和带声调的前缀也可以）"""
+        table = self.tables[self.kind_of(prefix)]
+        return table.entries(range(*table.key_range(prefix)))
+
+    def prefix(self, prefix):
+        return [chr(code) for code in self.prefix_codes(prefix)]
+
+    def initial_codes(self, initial):
+        """声母查询：z 不包括 zh，零声母用空字符串"""
+        table = self.tables['ascii']
+        key_ids = [
+            i for i in range(*table.key_range(initial))
+            if _initial_of(table.keys[i]) == initial
+        ]
+        return table.entries(key_ids)
+
+    def initial(self, initial):
+        return [chr(code) for code in self.initial_codes(initial)]
+
+
+_INITIALS = sorted(double_pinyin.INITIALS, key=lambda x: -len(x))
+
+
+def _initial_of(ascii):
+    for initial in _INITIALS:
+        if ascii.startswith(initial):
+            return initial
+    return ''
+
+
+def load_8105_levels(path=CHINA_8105_PATH):
+    """{int code: 级别}，表中的序号 1-3500 是一级字，3501-6500 是二级字，其余是三级字"""
+    levels = {}
+    with open(path, encoding='utf8') as fp:
+        for line in fp:
+            line = line.strip()
+            if line.startswith('#') or not line:
+                continue
+            code, number = line.split()[:2]
+            number = int(number)
+            levels[int(code[2:], 16)] = 1 if number <= 3500 else 2 if number <= 6500 else 3
+    return levels
+
+
+def build(compact=None, primary_pinyins=None, levels=None):
+    """从 pinyin_compact 和合并规则中的最常用读音生成索引"""
+    if compact is None:
+        compact = pinyin_compact.get_default()
+    if primary_pinyins is None:
+        from merge_unihan import load_primary_pinyins
+        primary_pinyins = load_primary_pinyins(DATA_DIR)
+    if levels is None:
+        levels = load_8105_levels()
+
+    entries = {kind: [] for kind in KINDS}  # [(key, rank, code)]
+    for start, stop, _ in compact.ranges:
+        for code in range(start, stop):
+            pinyins = compact.lookup_codepoint(code)
+            primary = primary_pinyins.get(code)
+            level = levels.get(code, LEVEL_COUNT) - 1
+            for pinyin in pinyins:
+                rank = level
+                if len(pinyins) > 1 and pinyin.pinyin != primary:
+                    rank += RANK_OTHER
+                for kind in KINDS:
+                    entries[kind].append((getattr(pinyin, kind), rank, code))
+
+    tables = {}
+    for kind, items in entries.items():
+        keys = []
+        offsets = array('I')
+        codes = array('I')
+        ranks = array('B')
+        seen = set()
+        for key, rank, code in sorted(items):
+            if key != (keys[-1] if keys else None):
+                keys.append(key)
+                offsets.append(len(codes))
+                seen.clear()
+            if code in seen:  # 不带声调时同一个字的多个读音相同
+                continue
+            seen.add(code)
+            codes.append(code)
+            ranks.append(rank)
+        offsets.append(len(codes))
+        tables[kind] = _Table(keys, offsets, codes, ranks)
+    return PinyinIndex(tables)
+
+
+def _pad(size):
+    return b'\0' * (-size % 4)
+
+
+def _tobytes(values):
+    if sys.byteorder != 'little' and values.itemsize > 1:
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def save_binary(index, fp):
+    fp.write(BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, len(KINDS)))
+    for kind in KINDS:
+        table = index.tables[kind]
+        pool = '\n'.join(table.keys).encode('utf8')
+        fp.write(BINARY_TABLE.pack(len(table.keys), len(table.codes), len(pool)))
+        for data in (pool, _tobytes(table.offsets), _tobytes(table.codes),
+                     _tobytes(table.ranks)):
+            fp.write(data)
+            fp.write(_pad(len(data)))
+
+
+def _cast(view, typecode):
+    view = view.cast(typecode)
+    if sys.byteorder != 'little' and view.itemsize > 1:
+        data = array(typecode, view)
+        data.byteswap()
+        return data
+    return view
+
+
+def parse_binary(buffer):
+    view = memoryview(buffer)
+    magic, version, table_count = BINARY_HEADER.unpack_from(view)
+    if magic != BINARY_MAGIC:
+        raise ValueError('not a pinyin_index.bin file')
+    if version != BINARY_VERSION:
+        raise ValueError('unsupported version: {}'.format(version))
+    pos = BINARY_HEADER.size
+
+    def take(size):
+        nonlocal pos
+        data = view[pos:pos + size]
+        pos += size + (-size % 4)
+        return data
+
+    tables = {}
+    for kind in KINDS[:table_count]:
+        key_count, entry_count, pool_size = BINARY_TABLE.unpack_from(view, pos)
+        pos += BINARY_TABLE.size
+        keys = bytes(take(pool_size)).decode('utf8').split('\n')
+        assert len(keys) == key_count
+        offsets = _cast(take((key_count + 1) * 4), 'I')
+        codes = _cast(take(entry_count * 4), 'I')
+        ranks = _cast(take(entry_count), 'B')
+        tables[kind] = _Table(keys, offsets, codes, ranks)
+    return PinyinIndex(tables)
+
+
+def load_binary(path=DEFAULT_PATH):
+    with open(path, 'rb') as fp:
+        buffer = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+    return parse_binary(buffer)
+
+
+if __name__ == '__main__':
+    index = build()
+    with open(DEFAULT_PATH, 'wb') as fp:
+        save_binary(index, fp)
+    loaded = load_binary(DEFAULT_PATH)
+    for kind in KINDS:
+        table, table2 = index.tables[kind], loaded.tables[kind]
+        assert table.keys == table2.keys
+        assert table.codes.tobytes() == bytes(table2.codes)
+        assert table.ranks.tobytes() == bytes(table2.ranks)
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""按拼音首字母匹配文本，例如 zgr 匹配「中国人」「张广荣」
+
+每个汉字的首字母保存为 26 位的 mask（与 generate/pinyin_initial_table.py 生成的表相同），
+多音字的 mask 包含所有读音的首字母，英文字母的 mask 是字母本身。
+
+    >>> from pinyin_initial import InitialMatcher
+    >>> matcher = InitialMatcher()
+    >>> matcher.match('zgr', ['中国人民', '张三', '美国人'])
+    [0]
+    >>> matcher.match('zgr', ['中国人民', '张三', '住在广州的人'], subsequence=True)
+    [0, 2]
+
+安装了 NumPy 时，一批候选字符串会拼接成一个码位数组，用向量化的 mask 运算匹配；
+没有 NumPy 时逐个字符匹配，结果相同。
+"""
+from array import array
+import string
+
+import pinyin_compact
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+LETTER_BITS = {letter: 1 << i for i, letter in enumerate(string.ascii_lowercase)}
+
+
+def initial_mask(pinyins):
+    """拼音（不带声调）列表的首字母 mask"""
+    mask = 0
+    for pinyin in pinyins:
+        mask |= LETTER_BITS[pinyin[0]]
+    return mask
+
+
+def build_masks(compact=None):
+    """array('I')，下标是码位，覆盖到最大的有拼音的码位"""
+    if compact is None:
+        compact = pinyin_compact.get_default()
+    size = max(stop for _, stop, _ in compact.ranges)
+    masks = array('I', [0]) * size
+    for start, stop, _ in compact.ranges:
+        for code in range(start, stop):
+            pinyins = compact.lookup_codepoint(code)
+            if pinyins:
+                masks[code] = initial_mask([pinyin.ascii for pinyin in pinyins])
+    for letter, bit in LETTER_BITS.items():
+        masks[ord(letter)] = masks[ord(letter.upper())] = bit
+    return masks
+
+
+class InitialMatcher:
+    def __init__(self, masks=None):
+        if masks is None:
+            masks = build_masks()
+        self.masks = masks
+        if np is not None:
+            # 最后多一个 0，超出范围的码位都映射到它
+            self._np_masks = np.zeros(len(masks) + 1, dtype=np.uint32)
+            self._np_masks[:-1] = np.frombuffer(masks, dtype=np.uint32)
+
+    @staticmethod
+    def _query_bits(query):
+        try:
+            return [LETTER_BITS[letter] for letter in query.lower()]
+        except KeyError:
+            raise ValueError('query must only contain letters: {!r}'.format(query))
+
+    def match(self, query, candidates, subsequence=False):
+        """返回匹配的候选字符串的下标
+
+        subsequence=False 时首字母必须连续出现，否则只需要按顺序出现
+        """
+        bits = self._query_bits(query)
+        candidates = list(candidates)
+        if not bits:
+            return list(range(len(candidates)))
+        if np is None:
+            return self._match_python(bits, candidates, subsequence)
+        return self._match_numpy(bits, candidates, subsequence)
+
+    def filter(self, query, candidates, subsequence=False):
+        candidates = list(candidates)
+        return [candidates[i] for i in self.match(query, candidates, subsequence)]
+
+    def _match_numpy(self, bits, candidates, subsequence):
+        # 候选字符串之间用 \0 分隔，\0 的 mask 是 0，连续匹配不会跨过边界
+        codes = np.frombuffer('\0'.join(candidates).encode('utf-32-le'),
+                              dtype='<u4')
+        masks = self._np_masks[np.minimum(codes, len(self._np_masks) - 1)]
+        lengths = np.fromiter(map(len, candidates), dtype=np.int64,
+                              count=len(candidates))
+        starts = np.zeros(len(candidates), dtype=np.int64)
+        np.cumsum(lengths[:-1] + 1, out=starts[1:])
+        ends = starts + lengths
+        n = len(masks)
+
+        if not subsequence:
+            k = len(bits)
+            if n < k:
+                return []
+            hit = (masks[:n - k + 1] & bits[0]) != 0
+            for i, bit in enumerate(bits[1:], 1):
+                hit &= (masks[i:n - k + 1 + i] & bit) != 0
+            positions = np.flatnonzero(hit)
+            ids = np.searchsorted(starts, positions, side='right') - 1
+            return np.unique(ids).tolist()
+
+        # 贪心匹配：next_hit[i] 是 i 之后（含 i）第一个匹配 bit 的位置
+        positions = starts.copy()
+        ok = np.ones(len(candidates), dtype=bool)
+        index = np.arange(n + 1)
+        for bit in bits:
+            hit = np.empty(n + 1, dtype=bool)
+            hit[:n] = (masks & bit) != 0
+            hit[n] = True
+            next_hit = np.minimum.accumulate(np.where(hit, index, n)[::-1])[::-1]
+            found = next_hit[np.minimum(positions, n)]
+            ok &= found < ends
+            positions = found + 1
+        return np.flatnonzero(ok).tolist()
+
+    def _match_python(self, bits, candidates, subsequence):
+        masks = self.masks
+        size = len(masks)
+        result = []
+        for i, candidate in enumerate(candidates):
+            text_masks = [masks[code] if code < size else 0
+                          for code in map(ord, candidate)]
+            if subsequence:
+                j = 0
+                for mask in text_masks:
+                    if mask & bits[j]:
+                        j += 1
+                        if j == len(bits):
+                            break
+                matched = j == len(bits)
+            else:
+                k = len(bits)
+                matched = any(
+                    all(text_masks[start + j] & bit for j, bit in enumerate(bits))
+                    for start in range(len(text_masks) - k + 1)
+                )
+            if matched:
+                result.append(i)
+        return result
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+"""以整数码位为键、拼音保存为音节 id 的紧凑映射
+
+    >>> from pinyin_map import PinyinMap
+    >>> pinyin_map = PinyinMap.from_items([('U+4E2D', ['zhōng', 'zhòng']), (0x4E00, ['yī'])])
+    >>> pinyin_map[0x4E2D]
+    ('zhōng', 'zhòng')
+    >>> list(pinyin_map)
+    [19968, 20013]
+
+所有码位保存在一个有序的 array 中，按二分查找访问；每个码位的拼音是 ids 中的一段，
+音节字符串在 SyllableTable 中只保存一份。与 {'U+XXXX': [拼音]} 相比内存少一个数量级，
+排序和合并都是整数运算。
+"""
+from array import array
+import bisect
+import collections.abc
+
+
+def code_to_int(code):
+    """'U+4E2D' 或 0x4E2D -> 0x4E2D"""
+    if isinstance(code, int):
+        return code
+    return int(code[2:], 16)
+
+
+def int_to_code(code):
+    return 'U+{:04X}'.format(code)
+
+
+class SyllableTable:
+    """音节字符串和 id 的双向映射，多个 PinyinMap 可以共用"""
+    __slots__ = ('names', '_ids')
+
+    def __init__(self, names=()):
+        self.names = []
+        self._ids = {}
+        for name in names:
+            self.intern(name)
+
+    def intern(self, name):
+        syllable_id = self._ids.get(name)
+        if syllable_id is None:
+            syllable_id = self._ids[name] = len(self.names)
+            self.names.append(name)
+        return syllable_id
+
+    def __getitem__(self, syllable_id):
+        return self.names[syllable_id]
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getstate__(self):
+        return self.names
+
+    def __setstate__(self, names):
+        self.names = names
+        self._ids = {name: i for i, name in enumerate(names)}
+
+
+SYLLABLES = SyllableTable()
+
+
+def _key(code):
+    """查询用的整数码位，不是码位时抛出 KeyError"""
+    try:
+        return code_to_int(code)
+    except (TypeError, ValueError):
+        raise KeyError(code) from None
+
+
+class PinyinMap(collections.abc.MutableMapping):
+    """{int 码位: (拼音, ...)}，按码位顺序遍历
+
+    与 from_items 相同，查询、修改和删除时码位也可以是 'U+XXXX'，
+    不是码位的键在查询时抛出 KeyError。
+    codes[i] 的拼音是 ids[starts[i]:starts[i + 1]]。
+    插入和删除需要移动数组，批量创建请用 from_items。
+    """
+    __slots__ = ('syllables', 'codes', 'starts', 'ids')
+
+    def __init__(self, syllables=None):
+        self.syllables = SYLLABLES if syllables is None else syllables
+        self.codes = array('I')
+        self.starts = array('I', [0])
+        self.ids = array('H')
+
+    @classmethod
+    def from_items(cls, items, syllables=None):
+        """items 是 (码位, [拼音])，码位可以是整数或 'U+XXXX'，重复的码位以最后一个为准"""
+        self = cls(syllables)
+        intern = self.syllables.intern
+        readings = {}
+        for code, pinyins in items:
+            readings[code_to_int(code)] = [intern(pinyin) for pinyin in pinyins]
+        for code in sorted(readings):
+            self.codes.append(code)
+            self.ids.extend(readings[code])
+            self.starts.append(len(self.ids))
+        return self
+
+    def _index(self, code):
+        code = _key(code)
+        i = bisect.bisect_left(self.codes, code)
+        if i == len(self.codes) or self.codes[i] != code:
+            raise KeyError(code)
+        return i
+
+    def __getitem__(self, code):
+        i = self._index(code)
+        names = self.syllables.names
+        return tuple(names[j] for j in self.ids[self.starts[i]:self.starts[i + 1]])
+
+    def get_ids(self, code):
+        """拼音的音节 id"""
+        i = self._index(code)
+        return self.ids[self.starts[i]:self.starts[i + 1]]
+
+    def __setitem__(self, code, pinyins):
+        code = code_to_int(code)
+        new_ids = array('H', map(self.syllables.intern, pinyins))
+        i = bisect.bisect_left(self.codes, code)
+        if i < len(self.codes) and self.codes[i] == code:
+            start, stop = self.starts[i], self.starts[i + 1]
+        else:
+            self.codes.insert(i, code)
+            start = stop = self.starts[i]
+            self.starts.insert(i, start)
+        self.ids[start:stop] = new_ids
+        delta = len(new_ids) - (stop - start)
+        if delta:
+            for j in range(i + 1, len(self.starts)):
+                self.starts[j] += delta
+
+    def __delitem__(self, code):
+        i = self._index(code)
+        start, stop = self.starts[i], self.starts[i + 1]
+        del self.ids[start:stop]
+        del self.codes[i]
+        del self.starts[i + 1]
+        for j in range(i + 1, len(self.starts)):
+            self.starts[j] -= stop - start
+
+    def __contains__(self, code):
+        try:
+            code = _key(code)
+        except KeyError:
+            return False
+        i = bisect.bisect_left(self.codes, code)
+        return i < len(self.codes) and self.codes[i] == code
+
+    def __iter__(self):
+        return iter(self.codes)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def items(self):
+        names = self.syllables.names
+        ids, starts = self.ids, self.starts
+        for i, code in enumerate(self.codes):
+            yield code, tuple(names[j] for j in ids[starts[i]:starts[i + 1]])
+
+    def __eq__(self, other):
+        if isinstance(other, PinyinMap) and other.syllables is self.syllables:
+            return (self.codes == other.codes and self.starts == other.starts
+                    and self.ids == other.ids)
+        return super().__eq__(other)
+
+    def __repr__(self):
+        return '{}({} code points)'.format(type(self).__name__, len(self))
+
+    def sorted_readings(self):
+        """每个码位的拼音按字符串排序后的新映射，与 merge_unihan.sort_pinyin_dict 相同"""
+        names = self.syllables.names
+        result = type(self)(self.syllables)
+        result.codes = array('I', self.codes)
+        result.starts = array('I', self.starts)
+        ids, starts = self.ids, self.starts
+        for i in range(len(self.codes)):
+            result.ids.extend(sorted(ids[starts[i]:starts[i + 1]], key=names.__getitem__))
+        return result
+
+    def to_dict(self):
+        """{'U+XXXX': [拼音]}"""
+        return {int_to_code(code): list(pinyins) for code, pinyins in self.items()}
+
+    def nbytes(self):
+        """数组占用的字节数，不包括共用的 SyllableTable"""
+        return sum(len(a) * a.itemsize for a in (self.codes, self.starts, self.ids))
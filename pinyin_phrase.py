@@ -0,0 +1,324 @@
+# -*- coding: utf-8 -*-
+"""词语拼音库和分词，用于多音字消歧
+
+单字数据只能给出每个字最常用的读音，「银行」「长大」「重新」这样的词语需要按词语读音转换。
+词语库从 phrase-pinyin-data 格式的文件生成（每行一个词语：银行: yín háng），
+保存为可以用 mmap 读取的 pinyin_phrase.bin：
+
+    python pinyin_phrase.py  # 从 tools/phrase-pinyin-data 生成 pinyin_phrase.bin
+    python pinyin_phrase.py --output my.bin words.txt overwrite.txt
+
+转换时先按词语库对连续的汉字分词，词语使用词语读音，其余的字使用合并后的单字读音：
+
+    >>> from pinyin_phrase import PhraseConverter
+    >>> PhraseConverter().convert('我们去银行')
+    'wǒ men qù yín háng'
+
+词语库是一棵 trie，节点按广度优先顺序保存，每个节点的子节点是连续的并且按字符排序，
+查找子节点时在这一段中二分查找。分词时对每个位置找出所有从这里开始的词语，
+在这个有向无环图中选择段数最少的切分，段数相同时优先选择较长的词语。
+"""
+from array import array
+import argparse
+import bisect
+import mmap
+import os
+import struct
+import sys
+
+import pinyin_converter
+import pinyin_tone
+
+DATA_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_PATH = os.path.join(DATA_DIR, 'pinyin_phrase.bin')
+PHRASE_DATA_DIR = os.path.join(DATA_DIR, 'tools', 'phrase-pinyin-data')
+# 后面的文件覆盖前面的文件中相同的词语
+DEFAULT_SOURCES = tuple(
+    os.path.join(PHRASE_DATA_DIR, name)
+    for name in ('cc_cedict.txt', 'pinyin.txt', 'overwrite.txt')
+)
+NO_PHRASE = 0xFFFFFFFF
+
+# pinyin_phrase.bin 的格式，所有整数都是小端序：
+#
+#   header: magic, version, 节点数, 词语数, 拼音 id 数, 拼音字符串池字节数
+#   拼音字符串池（UTF-8，换行分隔）,
+#   children uint32 * (节点数 + 1): 节点 k 的子节点是 [children[k], children[k + 1])
+#   labels uint32 * 节点数: 节点的字符
+#   values uint32 * 节点数: 以节点结尾的词语 id，没有时是 0xFFFFFFFF
+#   reading_offsets uint32 * (词语数 + 1), readings uint16 * 拼音 id 数
+#
+# 每一段都按 4 字节对齐
+BINARY_MAGIC = b'PYPH'
+BINARY_VERSION = 1
+BINARY_HEADER = struct.Struct('<4sH2xIIII')
+
+
+def iter_phrases(fp):
+    """产生 (词语, [拼音])，拼音数与字数不同的行会被忽略"""
+    for line in fp:
+        line = line.split('#', 1)[0].strip()
+        if not line:
+            continue
+        phrase, pinyins = line.split(':', 1)
+        phrase = phrase.strip()
+        pinyins = pinyins.split()
+        if len(phrase) == len(pinyins):
+            yield phrase, pinyins
+
+
+class PhraseStore:
+    __slots__ = ('syllables', 'children', 'labels', 'values',
+                 'reading_offsets', 'readings', '_root')
+
+    def __init__(self, syllables, children, labels, values, reading_offsets,
+                 readings):
+        self.syllables = syllables
+        self.children = children
+        self.labels = labels
+        self.values = values
+        self.reading_offsets = reading_offsets
+        self.readings = readings
+        # 根节点的子节点最多，也是每个位置都要查的，用 dict 代替二分查找
+        self._root = {
+            labels[node]: node for node in range(children[0], children[1])
+        }
+
+    def __len__(self):
+        return len(self.reading_offsets) - 1
+
+    def matches(self, text, start=0):
+        """产生 (end, 词语 id)，text[start:end] 是词语"""
+        if start >= len(text):
+            return
+        node = self._root.get(ord(text[start]))
+        if node is None:
+            return
+        children, labels, values = self.children, self.labels, self.values
+        if values[node] != NO_PHRASE:
+            yield start + 1, values[node]
+        for end in range(start + 2, len(text) + 1):
+            lo, hi = children[node], children[node + 1]
+            if lo == hi:
+                return
+            code = ord(text[end - 1])
+            node = bisect.bisect_left(labels, code, lo, hi)
+            if node == hi or labels[node] != code:
+                return
+            if values[node] != NO_PHRASE:
+                yield end, values[node]
+
+    def phrase_readings(self, phrase_id):
+        syllables = self.syllables
+        return [syllables[i] for i in self.readings[
+            self.reading_offsets[phrase_id]:self.reading_offsets[phrase_id + 1]]]
+
+    def lookup(self, phrase):
+        """词语的拼音，没有这个词语时返回 None"""
+        for end, phrase_id in self.matches(phrase):
+            if end == len(phrase):
+                return self.phrase_readings(phrase_id)
+        return None
+
+    def segment(self, text):
+        """把一段汉字切分为 [(片段, 词语 id 或 None)]，不在词语库中的字单独成段"""
+        # 与 matches 相同的查找，展开在循环中以减少生成器的开销
+        children, labels, values = self.children, self.labels, self.values
+        root = self._root
+        codes = list(map(ord, text))
+        n = len(codes)
+        # best[i]: text[i:] 的 (最少段数, 第一段的结束位置, 词语 id)
+        best = [None] * n + [(0, n, None)]
+        for i in range(n - 1, -1, -1):
+            choice = (best[i + 1][0] + 1, i + 1, None)
+            node = root.get(codes[i])
+            end = i + 1
+            while node is not None:
+                phrase_id = values[node]
+                # 段数相同时后面的（较长的）词语优先
+                if phrase_id != NO_PHRASE and best[end][0] + 1 <= choice[0]:
+                    choice = (best[end][0] + 1, end, phrase_id)
+                lo, hi = children[node], children[node + 1]
+                if lo == hi or end == n:
+                    break
+                code = codes[end]
+                node = bisect.bisect_left(labels, code, lo, hi)
+                if node == hi or labels[node] != code:
+                    break
+                end += 1
+            best[i] = choice
+        result = []
+        i = 0
+        while i < n:
+            _, end, phrase_id = best[i]
+            result.append((text[i:end], phrase_id))
+            i = end
+        return result
+
+
+def build(sources=DEFAULT_SOURCES):
+    """从 phrase-pinyin-data 格式的文件生成词语库，只保留两个字以上的词语"""
+    phrases = {}
+    for path in sources:
+        with open(path, encoding='utf8') as fp:
+            for phrase, pinyins in iter_phrases(fp):
+                if len(phrase) > 1:
+                    phrases[phrase] = pinyins
+
+    syllable_ids = {}
+    reading_offsets = array('I', [0])
+    readings = array('H')
+    root = {}
+    for phrase_id, (phrase, pinyins) in enumerate(sorted(phrases.items())):
+        node = root
+        for char in phrase:
+            node = node.setdefault(char, {})
+        node[None] = phrase_id
+        for pinyin in pinyins:
+            readings.append(syllable_ids.setdefault(pinyin, len(syllable_ids)))
+        reading_offsets.append(len(readings))
+
+    # 按广度优先顺序给节点编号，同一个节点的子节点连续并且按字符排序
+    children = array('I')
+    labels = array('I', [0])
+    values = array('I', [root.get(None, NO_PHRASE)])
+    queue = [root]
+    for node in queue:  # queue 在遍历时增长
+        children.append(len(labels))
+        for char in sorted(key for key in node if key is not None):
+            child = node[char]
+            labels.append(ord(char))
+            values.append(child.get(None, NO_PHRASE))
+            queue.append(child)
+    children.append(len(labels))
+    return PhraseStore(list(syllable_ids), children, labels, values,
+                       reading_offsets, readings)
+
+
+def _pad(size):
+    return b'\0' * (-size % 4)
+
+
+def _tobytes(values):
+    if sys.byteorder != 'little' and values.itemsize > 1:
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def save_binary(store, fp):
+    pool = '\n'.join(store.syllables).encode('utf8')
+    fp.write(BINARY_HEADER.pack(
+        BINARY_MAGIC, BINARY_VERSION, len(store.labels), len(store),
+        len(store.readings), len(pool),
+    ))
+    for data in (pool, _tobytes(store.children), _tobytes(store.labels),
+                 _tobytes(store.values), _tobytes(store.reading_offsets),
+                 _tobytes(store.readings)):
+        fp.write(data)
+        fp.write(_pad(len(data)))
+
+
+def _cast(view, typecode):
+    view = view.cast(typecode)
+    if sys.byteorder != 'little' and view.itemsize > 1:
+        data = array(typecode, view)
+        data.byteswap()
+        return data
+    return view
+
+
+def parse_binary(buffer):
+    view = memoryview(buffer)
+    (magic, version, node_count, phrase_count, reading_count,
+     pool_size) = BINARY_HEADER.unpack_from(view)
+    if magic != BINARY_MAGIC:
+        raise ValueError('not a pinyin_phrase.bin file')
+    if version != BINARY_VERSION:
+        raise ValueError('unsupported version: {}'.format(version))
+    pos = BINARY_HEADER.size
+
+    def take(size):
+        nonlocal pos
+        data = view[pos:pos + size]
+        pos += size + (-size % 4)
+        return data
+
+    syllables = bytes(take(pool_size)).decode('utf8').split('\n')
+    children = _cast(take((node_count + 1) * 4), 'I')
+    labels = _cast(take(node_count * 4), 'I')
+    values = _cast(take(node_count * 4), 'I')
+    reading_offsets = _cast(take((phrase_count + 1) * 4), 'I')
+    readings = _cast(take(reading_count * 2), 'H')
+    return PhraseStore(syllables, children, labels, values, reading_offsets,
+                       readings)
+
+
+def load_binary(path=DEFAULT_PATH):
+    with open(path, 'rb') as fp:
+        buffer = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+    return parse_binary(buffer)
+
+
+class PhraseConverter(pinyin_converter.Converter):
+    """先按词语读音转换，不在词语库中的字使用单字读音
+
+    convert_chunks 逐块转换时，跨过块边界的词语按单字转换
+    """
+
+    def __init__(self, store=None, style='tone', store_path=DEFAULT_PATH, **kwargs):
+        super().__init__(style=style, **kwargs)
+        if store is None:
+            store = load_binary(store_path)
+        self.store = store
+        self.style = style
+        self.store_path = store_path
+        self._to_text = pinyin_converter.STYLES[style]
+        self._phrase_texts = {}  # {词语 id: [转换结果]}
+
+    def _phrase_text(self, phrase_id):
+        texts = self._phrase_texts.get(phrase_id)
+        if texts is None:
+            texts = self._phrase_texts[phrase_id] = [
+                self._to_text(pinyin_tone.convert(pinyin))
+                for pinyin in self.store.phrase_readings(phrase_id)
+            ]
+        return texts
+
+    def _convert_hanzi(self, hanzi):
+        if len(hanzi) == 1:
+            return [self.mapping[hanzi]]
+        result = []
+        for part, phrase_id in self.store.segment(hanzi):
+            if phrase_id is None:
+                result.append(self.mapping[part])
+            else:
+                result.extend(self._phrase_text(phrase_id))
+        return result
+
+    def worker_args(self):
+        return type(self), {'mapping': self.mapping, 'separator': self.separator,
+                            'style': self.style, 'store_path': self.store_path}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='build pinyin_phrase.bin')
+    parser.add_argument('sources', nargs='*', default=DEFAULT_SOURCES,
+                        help='phrase pinyin files, later files override earlier ones')
+    parser.add_argument('--output', default=DEFAULT_PATH)
+    args = parser.parse_args(argv)
+
+    sources = args.sources
+    if sources is DEFAULT_SOURCES:  # 没有更新子模块时可能只有一部分文件
+        sources = [path for path in sources if os.path.exists(path)]
+        if not sources:
+            parser.error('{} not found, run: git submodule update --init'.format(
+                PHRASE_DATA_DIR))
+    store = build(sources)
+    with open(args.output, 'wb') as fp:
+        save_binary(store, fp)
+    print('{} phrases, {} nodes'.format(len(store), len(store.labels)))
+
+
+if __name__ == '__main__':
+    main()
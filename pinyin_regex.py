@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+"""把全拼或部分拼音的查询编译成匹配汉字、字母或混合文本的正则
+
+    >>> import pinyin_regex
+    >>> pinyin_regex.compile('zhongguo').search('我爱中国').group()
+    '中国'
+    >>> pinyin_regex.compile('zhong g').search('中g国').group()
+    '中g'
+
+查询中的空格和 ' 是拼音的分隔符，其余部分切分成音节和声母，例如 zg 切分为 z g。
+有多种切分方式时取音节数最少的切分，例如 dier 切分为 die r 和 di er，都会匹配。
+最后一个音节按前缀匹配，例如 zhongg 会匹配「中国」「中关」。
+
+字符类中连续的码位合并成范围，编译好的正则保存在有限大小的 LRU 缓存中：
+
+    >>> pinyin_regex.get_default().compile.cache_info().currsize
+    2
+"""
+import functools
+import re
+
+import double_pinyin
+import pinyin_compact
+
+# 同一个音节有多少种切分方式时只取前几种
+MAX_SEGMENTATIONS = 8
+_INITIALS = frozenset(double_pinyin.INITIALS)
+_RE_SEPARATOR = re.compile(r"[\s']+")
+
+
+def char_ranges(codes):
+    """把有序、不重复的码位合并成字符类的内容，不带方括号
+
+    一到三个字符直接列出（abc 应该略快于 a-c），更长的范围用 a-d 表示
+    """
+    result = []
+    i = 0
+    while i < len(codes):
+        start = codes[i]
+        while i + 1 < len(codes) and codes[i + 1] == codes[i] + 1:
+            i += 1
+        end = codes[i]
+        i += 1
+        if end - start < 3:
+            result.extend(map(chr, range(start, end + 1)))
+        else:
+            result.append('{}-{}'.format(chr(start), chr(end)))
+    return ''.join(result)
+
+
+def char_class(codes, literal=''):
+    """匹配 literal 中的字符和有序、不重复的码位的正则
+
+    re 只对 BMP 中的字符类使用位图，含有 BMP 以外字符的字符类逐个比较范围，非常慢，
+    所以 BMP 以外的字符单独放在一个字符类中，并且先判断字符是否在 BMP 以外
+    """
+    bmp = [code for code in codes if code <= 0xFFFF]
+    astral = codes[len(bmp):]
+    pattern = '[{}{}]'.format(literal, char_ranges(bmp))
+    if astral:
+        pattern = '(?:{}|(?=[\U00010000-\U0010FFFF])[{}])'.format(
+            pattern, char_ranges(astral))
+    return pattern
+
+
+class QueryCompiler:
+    def __init__(self, compact=None, cache_size=1024):
+        if compact is None:
+            compact = pinyin_compact.get_default()
+        self.syllables = {}  # {不带声调的拼音: {码位}}
+        for start, stop, _ in compact.ranges:
+            for code in range(start, stop):
+                for pinyin in compact.lookup_codepoint(code):
+                    self.syllables.setdefault(pinyin.ascii, set()).add(code)
+        self.prefixes = {
+            syllable[:i] for syllable in self.syllables
+            for i in range(1, len(syllable) + 1)
+        }
+        self._unit_pattern = functools.lru_cache(maxsize=None)(self._unit_pattern)
+        self.compile = functools.lru_cache(maxsize=cache_size)(self._compile)
+
+    def _units_at(self, token, i):
+        """token[i:] 开头可以切出的 (单元, 是否按前缀匹配)"""
+        for j in range(len(token), i, -1):
+            unit = token[i:j]
+            if unit in self.syllables or unit in _INITIALS:
+                yield j, unit, self._is_prefix(unit, j == len(token))
+            elif j == len(token) and unit in self.prefixes:
+                yield j, unit, True
+
+    def _is_prefix(self, unit, at_end):
+        """声母和不完整的拼音按前缀匹配，完整音节只在查询末尾按前缀匹配"""
+        return at_end or unit in _INITIALS or unit not in self.syllables
+
+    def segment_token(self, token):
+        """音节数最少的所有切分，每个切分是 ((单元, 是否按前缀匹配), ...)"""
+        # best[i]: token[i:] 的最少单元数
+        best = [None] * len(token) + [0]
+        for i in range(len(token) - 1, -1, -1):
+            counts = [best[j] for j, _, _ in self._units_at(token, i)
+                      if best[j] is not None]
+            if counts:
+                best[i] = min(counts) + 1
+        if best[0] is None:
+            return []
+
+        def walk(i):
+            if i == len(token):
+                yield ()
+                return
+            for j, unit, prefix in self._units_at(token, i):
+                if best[j] is not None and best[j] == best[i] - 1:
+                    for rest in walk(j):
+                        yield ((unit, prefix),) + rest
+
+        result = []
+        for segmentation in walk(0):
+            result.append(segmentation)
+            if len(result) == MAX_SEGMENTATIONS:
+                break
+        return result
+
+    def segment(self, query):
+        """切分整个查询，只有最后一个单元按前缀匹配完整音节"""
+        tokens = [token for token in _RE_SEPARATOR.split(query.lower()) if token]
+        segmentations = [()]
+        for n, token in enumerate(tokens):
+            token_segmentations = self.segment_token(token)
+            if not token_segmentations:
+                raise ValueError('invalid pinyin: {!r}'.format(token))
+            if n != len(tokens) - 1:
+                # 后面还有拼音时，完整音节不再按前缀匹配
+                token_segmentations = [
+                    tuple((unit, prefix and self._is_prefix(unit, False))
+                          for unit, prefix in segmentation)
+                    for segmentation in token_segmentations
+                ]
+            segmentations = [
+                head + tail
+                for head in segmentations for tail in token_segmentations
+            ][:MAX_SEGMENTATIONS]
+        return segmentations
+
+    def _unit_pattern(self, unit, prefix):
+        if prefix:
+            codes = set()
+            for syllable, syllable_codes in self.syllables.items():
+                if syllable.startswith(unit):
+                    codes |= syllable_codes
+        else:
+            codes = self.syllables[unit]
+        codes = sorted(codes)
+        if len(unit) == 1:
+            return char_class(codes, unit + unit.upper())
+        return '(?:(?i:{})|{})'.format(unit, char_class(codes))
+
+    def pattern(self, query):
+        segmentations = self.segment(query)
+        alternatives = [
+            ''.join(self._unit_pattern(unit, prefix) for unit, prefix in segmentation)
+            for segmentation in segmentations
+        ]
+        if len(alternatives) == 1:
+            return alternatives[0]
+        return '(?:{})'.format('|'.join(alternatives))
+
+    def _compile(self, query):
+        return re.compile(self.pattern(query))
+
+
+_default = None
+
+
+def get_default():
+    global _default
+    if _default is None:
+        _default = QueryCompiler()
+    return _default
+
+
+def compile(query):
+    return get_default().compile(query)
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""拼音的声调转换：带声调、不带声调、数字声调
+
+每个拼音只计算一次，结果缓存起来，整个拼音表只有一千多个拼音
+
+    >>> import pinyin_tone
+    >>> pinyin_tone.convert('lǜ')
+    PinyinForms(pinyin='lǜ', ascii='lv', ascii_num='lv4', tone=4, tone_position=1)
+"""
+from collections import namedtuple
+import functools
+
+PinyinForms = namedtuple('PinyinForms', 'pinyin ascii ascii_num tone tone_position')
+
+# {带声调的字母: (不带声调的字母, 声调)}，声调 5 表示轻声
+TONE_MARKS = {
+    'ā': ('a', 1), 'á': ('a', 2), 'ǎ': ('a', 3), 'à': ('a', 4),
+    'ē': ('e', 1), 'é': ('e', 2), 'ě': ('e', 3), 'è': ('e', 4),
+    'ế': ('e', 2), 'ề': ('e', 4),
+    'ī': ('i', 1), 'í': ('i', 2), 'ǐ': ('i', 3), 'ì': ('i', 4),
+    'ō': ('o', 1), 'ó': ('o', 2), 'ǒ': ('o', 3), 'ò': ('o', 4),
+    'ū': ('u', 1), 'ú': ('u', 2), 'ǔ': ('u', 3), 'ù': ('u', 4),
+    'ǖ': ('v', 1), 'ǘ': ('v', 2), 'ǚ': ('v', 3), 'ǜ': ('v', 4), 'ü': ('v', 5),
+    'ń': ('n', 2), 'ň': ('n', 3), 'ǹ': ('n', 4),
+    'ḿ': ('m', 2),
+}
+# Unicode 中没有对应的预组合字符，只能用组合字符表示
+# ê̄=ê+̄ , ê̌=ê+̌ , m̀=m+̀
+TONE_SEQUENCES = {
+    'ê̄': ('e', 1),
+    'ê̌': ('e', 3),
+    'm̀': ('m', 4),
+}
+
+_ASCII_TABLE = str.maketrans({
+    mark: letter for mark, (letter, _) in TONE_MARKS.items()
+})
+
+
+@functools.lru_cache(maxsize=None)
+def convert(pinyin):
+    ascii = pinyin
+    tone = 5
+    tone_position = -1
+    for sequence, (letter, sequence_tone) in TONE_SEQUENCES.items():
+        if sequence in ascii:
+            tone_position = ascii.index(sequence)
+            tone = sequence_tone
+            ascii = ascii.replace(sequence, letter)
+    if not ascii.isascii():
+        for i, char in enumerate(ascii):
+            _, char_tone = TONE_MARKS.get(char, (None, 5))
+            if char_tone < tone:
+                tone = char_tone
+                tone_position = i
+        ascii = ascii.translate(_ASCII_TABLE)
+    return PinyinForms(pinyin, ascii, ascii + str(tone), tone, tone_position)
+
+
+def convert_all(pinyins):
+    return [convert(pinyin) for pinyin in pinyins]
+
+
+def to_ascii(pinyin):
+    return convert(pinyin).ascii
+
+
+def to_ascii_num(pinyin):
+    return convert(pinyin).ascii_num  # 轻声用 5，0 不好输入
+
+
+def to_ascii_all(pinyins):
+    return [convert(pinyin).ascii for pinyin in pinyins]
+
+
+def to_ascii_num_all(pinyins):
+    return [convert(pinyin).ascii_num for pinyin in pinyins]
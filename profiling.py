@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""merge_unihan.py 的分阶段性能记录
+
+    python merge_unihan.py --profile report.json --cprofile slowest.prof
+    PINYIN_DATA_PROFILE=report.json python merge_unihan.py
+
+报告是 JSON，包括每个阶段的耗时、tracemalloc 峰值内存和条目数，以及每个输入文件的条目数和拼音数。
+指定 cProfile 文件时每个阶段都会运行在 cProfile 下（耗时会变长），只保存最慢阶段的结果，
+可以用 python -m pstats slowest.prof 查看。
+"""
+import contextlib
+import cProfile
+import json
+import platform
+import time
+import tracemalloc
+
+ENV_REPORT = 'PINYIN_DATA_PROFILE'
+ENV_CPROFILE = 'PINYIN_DATA_CPROFILE'
+
+
+def count_pinyins(items):
+    """(pinyins, ...) 的条目数和拼音数"""
+    items = list(items)
+    return {'entries': len(items), 'syllables': sum(map(len, items))}
+
+
+class Profiler:
+    def __init__(self, enabled=True, cprofile=False):
+        self.enabled = enabled
+        self.cprofile = cprofile
+        self.stages = []  # [{'name', 'seconds', 'peak_memory', 'counts'}]
+        self.inputs = {}  # {输入文件: {'entries', 'syllables'}}
+        self._profiles = {}  # {阶段: cProfile.Profile}
+        self._active = False
+        self._start = time.perf_counter()
+        if enabled and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """记录一个阶段，可以往 yield 的 dict 中写入条目数等计数
+
+        阶段不能嵌套，否则峰值内存会互相干扰
+        """
+        counts = {}
+        if not self.enabled:
+            yield counts
+            return
+        assert not self._active, 'nested stage: {}'.format(name)
+        self._active = True
+        profile = None
+        if self.cprofile:
+            profile = self._profiles[name] = cProfile.Profile()
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        if profile is not None:
+            profile.enable()
+        try:
+            yield counts
+        finally:
+            if profile is not None:
+                profile.disable()
+            seconds = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            self._active = False
+            self.stages.append({
+                'name': name,
+                'seconds': seconds,
+                'peak_memory': peak - base,
+                'counts': counts,
+            })
+
+    def record_input(self, name, pinyin_lists):
+        if self.enabled:
+            self.inputs[name] = count_pinyins(pinyin_lists)
+
+    def slowest(self):
+        if not self.stages:
+            return None
+        return max(self.stages, key=lambda stage: stage['seconds'])['name']
+
+    def report(self):
+        return {
+            'python': platform.python_version(),
+            'total_seconds': time.perf_counter() - self._start,
+            'cprofile': self.cprofile,
+            'slowest': self.slowest(),
+            'stages': self.stages,
+            'inputs': self.inputs,
+        }
+
+    def save(self, report_path=None, cprofile_path=None):
+        if report_path:
+            with open(report_path, 'w', encoding='utf8') as fp:
+                json.dump(self.report(), fp, indent=2, ensure_ascii=False)
+        slowest = self.slowest()
+        if cprofile_path and slowest in self._profiles:
+            self._profiles[slowest].dump_stats(cprofile_path)
+
+
+NULL_PROFILER = Profiler(enabled=False)
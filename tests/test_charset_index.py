@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+import io
+import os
+import tempfile
+import unittest
+
+import charset_index
+import merge_unihan
+
+
+class LoadOrBuildTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.pinyin_path = os.path.join(tmp.name, 'pinyin.txt')
+        self.path = os.path.join(tmp.name, 'charset_index.bin')
+        self._write_pinyin('U+4E00: yī  # 一\n')
+
+    def _write_pinyin(self, text):
+        with open(self.pinyin_path, 'w', encoding='utf8') as fp:
+            fp.write(text)
+
+    def _save(self):
+        index = charset_index.build(
+            charset_index.load_codes(self.pinyin_path), levels={},
+            source_hash=merge_unihan.file_hash(self.pinyin_path))
+        f = io.BytesIO()
+        charset_index.save_binary(index, f)
+        with open(self.path, 'wb') as fp:
+            fp.write(f.getvalue())
+
+    def test_up_to_date(self):
+        self._save()
+        index = charset_index.load_or_build(self.path, self.pinyin_path)
+        self.assertEqual(list(index['gb2312']), [0x4E00])
+        self.assertEqual(index.source_hash, merge_unihan.file_hash(self.pinyin_path))
+
+    def test_stale(self):
+        """pinyin.txt 比 charset_index.bin 新时，新加的汉字不能丢失"""
+        self._save()
+        self._write_pinyin('U+4E00: yī  # 一\nU+4E2D: zhōng  # 中\n')
+        index = charset_index.load_or_build(self.path, self.pinyin_path)
+        self.assertEqual(list(index['gb2312']), [0x4E00, 0x4E2D])
+
+    def test_missing(self):
+        index = charset_index.load_or_build(self.path, self.pinyin_path)
+        self.assertEqual(list(index['gbk']), [0x4E00])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import http.server
+import os
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                             'tools'))
+
+import fetcher  # noqa: E402
+
+ORIGIN = 'http://www.guoxuedashi.com'
+PATH = '/zidian/so.php'
+PAGES = {'中': '<html>中 zhōng</html>'.encode('utf8'),
+         '国': '<html>国 guó</html>'.encode('utf8')}
+
+
+class FetcherTest(unittest.TestCase):
+    """用 make_handler 和录制的网页代替原来的网站"""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp = tmp.name
+        recorded = fetcher.ResponseCache(os.path.join(tmp.name, 'recorded'))
+        for hanzi, content in PAGES.items():
+            recorded.put(fetcher.cache_key(ORIGIN + PATH, {'sokeyzi': hanzi}), content)
+
+        self.failures = 0  # 之后的这么多个请求返回 503
+        self.hits = 0
+        test = self
+        base = fetcher.make_handler(recorded, ORIGIN)
+
+        class Handler(base):
+            def do_GET(self):
+                test.hits += 1
+                if test.failures:
+                    test.failures -= 1
+                    self.send_error(503)
+                    return
+                super().do_GET()
+
+        server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.url = 'http://127.0.0.1:{}{}'.format(server.server_address[1], PATH)
+
+    def _fetcher(self, **kwargs):
+        kwargs.setdefault('cache_dir', os.path.join(self.tmp, 'cache'))
+        return fetcher.Fetcher(rate=0, backoff=0, timeout=5, **kwargs)
+
+    def _fetch(self, client, hanzi):
+        return asyncio.run(client.fetch(self.url, {'sokeyzi': hanzi}))
+
+    def test_cache_hit(self):
+        self.assertEqual(self._fetch(self._fetcher(), '中'), PAGES['中'])
+        client = self._fetcher()
+        self.assertEqual(self._fetch(client, '中'), PAGES['中'])
+        self.assertEqual(client.requests, 0)
+        self.assertEqual(self.hits, 1)
+
+    def test_retry_5xx(self):
+        self.failures = 2
+        client = self._fetcher(retries=2)
+        self.assertEqual(self._fetch(client, '国'), PAGES['国'])
+        self.assertEqual(client.requests, 3)
+
+    def test_retries_exhausted(self):
+        self.failures = 5
+        client = self._fetcher(retries=1, cache_dir=None)
+        with self.assertRaises(fetcher.FetchError):
+            self._fetch(client, '国')
+        self.assertEqual(client.requests, 2)
+
+    def test_404(self):
+        client = self._fetcher(retries=3)
+        with self.assertRaises(fetcher.FetchError):
+            self._fetch(client, '字')
+        self.assertEqual(client.requests, 1)  # 不重试
+
+    def test_resume(self):
+        path = os.path.join(self.tmp, 'checkpoint.jsonl')
+        with open(path, 'w', encoding='utf8') as fp:
+            # 上次中断时 中 已经完成，最后一行没有写完
+            fp.write('["中", "zhōng"]\n["国", "gu')
+        client = self._fetcher(cache_dir=None)
+
+        async def func(hanzi):
+            content = await client.fetch(self.url, {'sokeyzi': hanzi})
+            return content.decode('utf8')
+
+        checkpoint = fetcher.Checkpoint(path)
+        result = asyncio.run(fetcher.run_all(['中', '国'], func, checkpoint))
+        self.assertEqual(result, {'中': 'zhōng', '国': PAGES['国'].decode('utf8')})
+        self.assertEqual(client.requests, 1)
+        self.assertIn('国', fetcher.Checkpoint(path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                             'unihan'))
+
+import parse_pinyin  # noqa: E402
+
+OLD = '''U+4E00: yī  # 一
+U+4E01: dīng  # 丁
+U+4E03: qī  # 七
+'''
+READINGS = '''# Unihan_Readings.txt
+U+4E00\tkMandarin\tyī
+U+4E01\tkMandarin\tzhēng
+U+4E02\tkMandarin\tkǎo
+U+4E07\tkMandarin\twàn
+'''
+
+
+class SaveAllTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.directory = tmp.name
+        # 与 unihan/k*.txt 一样是符号链接
+        self.target = os.path.join(tmp.name, 'real.txt')
+        with open(self.target, 'w', encoding='utf8') as fp:
+            fp.write(OLD)
+        self.path = os.path.join(tmp.name, 'kMandarin.txt')
+        os.symlink(self.target, self.path)
+
+    def _read(self):
+        with open(self.path, encoding='utf8') as fp:
+            return fp.read()
+
+    def test_delta(self):
+        delta = parse_pinyin.save_all(READINGS.splitlines(True), ('kMandarin',),
+                                      self.directory)
+        self.assertEqual(delta['kMandarin'], {
+            'added': {'4E02': 'kǎo', '4E07': 'wàn'},
+            'removed': {'4E03': 'qī'},
+            'changed': {'4E01': ['dīng', 'zhēng']},
+        })
+        self.assertTrue(os.path.islink(self.path))
+        self.assertEqual(self._read(), 'U+4E00: yī  # 一\nU+4E01: zhēng  # 丁\n'
+                                       'U+4E02: kǎo  # 丂\nU+4E07: wàn  # 万\n')
+        self.assertEqual(sorted(os.listdir(self.directory)), ['kMandarin.txt', 'real.txt'])
+
+    def test_dry_run(self):
+        delta = parse_pinyin.save_all(READINGS.splitlines(True), ('kMandarin',),
+                                      self.directory, dry_run=True)
+        self.assertEqual(len(delta['kMandarin']['added']), 2)
+        self.assertEqual(self._read(), OLD)
+
+    def test_unchanged(self):
+        lines = ['U+{}\tkMandarin\t{}\n'.format(code, pinyin)
+                 for code, pinyin in parse_pinyin.iter_kind(self.path)]
+        mtime = os.stat(self.target).st_mtime_ns
+        delta = parse_pinyin.save_all(lines, ('kMandarin',), self.directory)
+        self.assertFalse(any(delta['kMandarin'].values()))
+        self.assertEqual(os.stat(self.target).st_mtime_ns, mtime)
+        self.assertEqual(sorted(os.listdir(self.directory)), ['kMandarin.txt', 'real.txt'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+import benchmark
+import pinyin_compact
+
+
+class _Buffer:
+    """记录从中复制出的最大字节数的 bytes"""
+
+    def __init__(self, data):
+        self.data = data
+        self.largest = 0
+
+    def __getitem__(self, key):
+        result = self.data[key]
+        if isinstance(key, slice):
+            self.largest = max(self.largest, len(result))
+        return result
+
+
+def _lazy_table(values):
+    line = ','.join(map(str, values)).encode('ascii')
+    buffer = _Buffer(b'0x0, 0x0:\n' + line + b'\n')
+    begin = len(b'0x0, 0x0:\n')
+    return buffer, pinyin_compact.LazyTable(buffer, begin, begin + len(line), len(values))
+
+
+class LazyTableTest(unittest.TestCase):
+    def setUp(self):
+        # 最后一页不满，值的位数不同
+        self.values = [i * 7 % 65536 for i in range(pinyin_compact.PAGE_SIZE * 40 + 123)]
+
+    def test_values(self):
+        _, table = _lazy_table(self.values)
+        for index in (0, len(self.values) - 1, pinyin_compact.PAGE_SIZE * 20,
+                      pinyin_compact.PAGE_SIZE * 35 - 1, 5000, 12345):
+            self.assertEqual(table[index], self.values[index])
+        self.assertEqual(list(table), self.values)
+
+    def test_read_one_page(self):
+        buffer, table = _lazy_table(self.values)
+        for index in (pinyin_compact.PAGE_SIZE * 20 + 5, len(self.values) - 1):
+            self.assertEqual(table[index], self.values[index])
+        self.assertLessEqual(buffer.largest, pinyin_compact.PAGE_SIZE * len('65535,'))
+        self.assertEqual(table.loaded_pages, 2)
+
+    def test_default_data(self):
+        eager = pinyin_compact.load()
+        lazy = pinyin_compact.load_lazy()
+        start, stop, _ = max(eager.ranges, key=lambda rng: rng[1] - rng[0])
+        for code in range(stop - 1, start - 1, -97):
+            self.assertEqual(lazy.lookup_codepoint(code), eager.lookup_codepoint(code))
+
+
+class RangeIndexTest(unittest.TestCase):
+    def test_lookup(self):
+        # 两个范围在同一块中，一个范围跨越多块
+        ranges = [(0x3007, 0x3008, [1]), (0x3010, 0x3020, list(range(16))),
+                  (0x3400, 0x4000, list(range(0xC00)))]
+        index = pinyin_compact.RangeIndex(ranges)
+        self.assertEqual(index[0x3007], 1)
+        self.assertEqual(index[0x301F], 15)
+        self.assertEqual(index[0x3FFF], 0xBFF)
+        for code in (0, 0x3008, 0x3020, 0x4000, 0x10FFFF):
+            self.assertEqual(index[code], pinyin_compact.NO_PINYIN)
+
+    def test_default(self):
+        compact = pinyin_compact.get_default()
+        self.assertIsInstance(compact.table, pinyin_compact.RangeIndex)
+        self.assertEqual(compact.lookup('中')[0].pinyin, 'zhōng')
+
+
+class StartupTest(unittest.TestCase):
+    def test_limits(self):
+        """导入并查询一个 BMP 汉字不超过 benchmark.STARTUP_LIMITS，只解析一页"""
+        startup = {'load_lazy': benchmark.measure_startup('load_lazy')}
+        self.assertEqual(benchmark.check_startup(startup), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+import os
+import tempfile
+import unittest
+
+import pinyin_converter
+from pinyin_converter import Converter
+
+
+class InitialStyleTest(unittest.TestCase):
+    def test_zero_initial_uses_first_letter(self):
+        converter = Converter(style='initial')
+        self.assertEqual(converter.convert('中国人爱玩'), 'zh g r a w')
+        self.assertEqual(converter.convert('鹅欧'), 'e o')
+
+
+class ConvertFileTest(unittest.TestCase):
+    def _run(self, directory, text, processes):
+        path = os.path.join(directory, 'input.txt')
+        with open(path, 'wb') as fp:
+            fp.write(text.encode('utf8'))
+        output = os.path.join(directory, 'output-{}.txt'.format(processes))
+        pinyin_converter.main([path, output, '-j', str(processes)])
+        with open(output, 'rb') as fp:
+            return fp.read()
+
+    def test_crlf_input_same_with_and_without_processes(self):
+        text = '中国人\r\n我爱Python。\r\n\r\n银行\n'
+        with tempfile.TemporaryDirectory() as directory:
+            single = self._run(directory, text, 1)
+            multi = self._run(directory, text, 2)
+        self.assertEqual(single, multi)
+        self.assertEqual(single.decode('utf8'),
+                         'zhōng guó rén\r\nwǒ ài Python。\r\n\r\nyín xíng\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from pinyin_map import PinyinMap
+
+
+class PinyinMapKeyTest(unittest.TestCase):
+    def setUp(self):
+        self.pinyin_map = PinyinMap.from_items([('U+4E2D', ['zhōng', 'zhòng']),
+                                                (0x4E00, ['yī'])])
+
+    def test_str_keys(self):
+        self.assertEqual(self.pinyin_map['U+4E2D'], ('zhōng', 'zhòng'))
+        self.assertIn('U+4E00', self.pinyin_map)
+        self.assertEqual(self.pinyin_map.get('U+4E00'), ('yī',))
+        self.pinyin_map['U+4E01'] = ['dīng']
+        self.assertEqual(list(self.pinyin_map), [0x4E00, 0x4E01, 0x4E2D])
+        del self.pinyin_map['U+4E01']
+        self.assertNotIn(0x4E01, self.pinyin_map)
+
+    def test_missing(self):
+        for key in ('U+4E01', 0x4E01, '中', None, 1.5):
+            self.assertNotIn(key, self.pinyin_map)
+            self.assertIsNone(self.pinyin_map.get(key))
+            with self.assertRaises(KeyError):
+                self.pinyin_map[key]
+
+
+if __name__ == '__main__':
+    unittest.main()
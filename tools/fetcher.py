@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+"""并发抓取网页，带磁盘缓存、按主机限速、失败重试
+
+    fetcher = Fetcher(concurrency=8, rate=4)
+    html = await fetcher.fetch('http://www.guoxuedashi.com/zidian/so.php', {'sokeyzi': '中'})
+
+请求在线程池中用 requests 发出，同时进行的请求数不超过 concurrency，
+同一个主机每秒不超过 rate 个请求。失败（网络错误、429、5xx）时等待
+backoff * 2 ** n 秒后重试。成功的响应按 URL 和参数保存在 cache_dir 中，
+再次抓取时直接读取，所以中断后重新运行不会重复请求。
+
+缓存目录也可以作为录制的网页，用本地服务器代替原来的网站：
+
+    python tools/fetcher.py serve .cache/guoxuedashi --origin http://www.guoxuedashi.com
+    python tools/improve_8105.py --url http://127.0.0.1:8000/zidian/so.php ...
+"""
+import argparse
+import asyncio
+import hashlib
+import http.server
+import json
+import os
+import sys
+import tempfile
+import urllib.parse
+
+import requests
+
+DEFAULT_CACHE_DIR = '.cache/guoxuedashi'
+
+
+class FetchError(Exception):
+    pass
+
+
+def cache_key(url, params=None):
+    """URL 和参数的哈希，参数的顺序不影响结果"""
+    query = urllib.parse.urlencode(sorted((params or {}).items()))
+    return hashlib.sha256('{}?{}'.format(url, query).encode('utf8')).hexdigest()
+
+
+class ResponseCache:
+    """每个响应一个文件：cache_dir/ab/abcdef...，写入时先写临时文件再改名"""
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR):
+        self.directory = directory
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def get(self, key):
+        try:
+            with open(self.path(key), 'rb') as fp:
+                return fp.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, key, content):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, 'wb') as fp:
+            fp.write(content)
+        os.replace(tmp, path)
+
+
+class RateLimiter:
+    """同一个主机的请求之间至少间隔 1 / rate 秒"""
+
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate else 0
+        self._next = {}  # {主机: 下一个请求最早的时间}
+
+    async def wait(self, host):
+        loop = asyncio.get_event_loop()
+        now = loop.time()
+        start = max(now, self._next.get(host, now))
+        self._next[host] = start + self.interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+
+def _requests_get(url, params, timeout):
+    response = requests.get(url, params=params, timeout=timeout)
+    return response.status_code, response.content
+
+
+class Fetcher:
+    """get(url, params, timeout) -> (status, content) 是实际发出请求的函数，在线程池中调用"""
+
+    def __init__(self, concurrency=8, rate=4.0, retries=3, backoff=1.0, timeout=10,
+                 cache_dir=DEFAULT_CACHE_DIR, get=_requests_get):
+        self.concurrency = concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.cache = ResponseCache(cache_dir) if cache_dir else None
+        self.get = get
+        self.limiter = RateLimiter(rate)
+        self._semaphore = None
+        self.requests = 0  # 实际发出的请求数，不包括缓存命中
+
+    async def fetch(self, url, params=None):
+        key = cache_key(url, params)
+        if self.cache is not None:
+            content = self.cache.get(key)
+            if content is not None:
+                return content
+        if self._semaphore is None:  # 需要在事件循环中创建
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+
+        host = urllib.parse.urlsplit(url).netloc
+        loop = asyncio.get_event_loop()
+        error = None
+        async with self._semaphore:
+            for attempt in range(self.retries + 1):
+                if attempt:
+                    await asyncio.sleep(self.backoff * 2 ** (attempt - 1))
+                await self.limiter.wait(host)
+                self.requests += 1
+                try:
+                    status, content = await loop.run_in_executor(
+                        None, self.get, url, params, self.timeout)
+                except Exception as e:  # 网络错误都重试
+                    error = e
+                    continue
+                if status == 429 or status >= 500:
+                    error = FetchError('HTTP {}'.format(status))
+                    continue
+                if status != 200:
+                    raise FetchError('{} {}: HTTP {}'.format(url, params, status))
+                if self.cache is not None:
+                    self.cache.put(key, content)
+                return content
+        raise FetchError('{} {}: {!r}'.format(url, params, error))
+
+
+class Checkpoint:
+    """已经完成的结果，每完成一项追加一行 JSON，重新运行时跳过这些项"""
+
+    def __init__(self, path):
+        self.path = path
+        self.done = {}
+        self._partial = False  # 最后一行不完整，追加前先换行
+        if path and os.path.exists(path):
+            with open(path, encoding='utf8') as fp:
+                for line in fp:
+                    self._partial = not line.endswith('\n')
+                    try:
+                        key, value = json.loads(line)
+                    except ValueError:  # 中断时最后一行可能不完整
+                        continue
+                    self.done[key] = value
+
+    def __contains__(self, key):
+        return key in self.done
+
+    def __getitem__(self, key):
+        return self.done[key]
+
+    def add(self, key, value):
+        self.done[key] = value
+        if self.path:
+            with open(self.path, 'a', encoding='utf8') as fp:
+                if self._partial:
+                    fp.write('\n')
+                    self._partial = False
+                fp.write(json.dumps([key, value], ensure_ascii=False) + '\n')
+
+
+async def run_all(keys, func, checkpoint):
+    """对没有完成的 key 并发调用 async func(key)，返回 {key: 结果}，失败的 key 不在结果中"""
+    async def run(key):
+        try:
+            value = await func(key)
+        except FetchError as e:
+            print('{}: {}'.format(key, e), file=sys.stderr)
+            return
+        checkpoint.add(key, value)
+
+    await asyncio.gather(*(run(key) for key in dict.fromkeys(keys)
+                           if key not in checkpoint))
+    return {key: checkpoint[key] for key in keys if key in checkpoint}
+
+
+def make_handler(cache, origin):
+    """把 path?query 当作 origin 上的请求，从 cache 中返回录制的响应"""
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            path, _, query = self.path.partition('?')
+            params = dict(urllib.parse.parse_qsl(query, keep_blank_values=True))
+            content = cache.get(cache_key(origin + path, params))
+            if content is None:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        def log_message(self, format, *args):
+            pass
+    return Handler
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='serve recorded responses')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    serve = subparsers.add_parser('serve', help='serve a cache directory over HTTP')
+    serve.add_argument('cache_dir', nargs='?', default=DEFAULT_CACHE_DIR)
+    serve.add_argument('--origin', default='http://www.guoxuedashi.com',
+                       help='scheme and host the responses were recorded from')
+    serve.add_argument('--port', type=int, default=8000)
+    args = parser.parse_args(argv)
+
+    server = http.server.ThreadingHTTPServer(
+        ('127.0.0.1', args.port), make_handler(ResponseCache(args.cache_dir), args.origin))
+    print('serving {} on http://127.0.0.1:{}'.format(args.cache_dir, args.port))
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,6 +1,11 @@
 # -*- coding: utf-8 -*-
 """生成初始的 kMandarin_8105.txt"""
-from merge_unihan import parse_pinyins, code_to_hanzi
+import sys
+
+sys.path.append('.')
+
+from merge_unihan import load_pinyin_map
+from pinyin_map import code_to_int
 
 
 def parse_china_x():
@@ -13,28 +18,29 @@ def parse_china_x():
 
 
 def parse_zdic():
-    with open('zdic.txt') as fp:
-        return parse_pinyins(fp)
+    with open('zdic.txt', encoding='utf8') as fp:
+        return load_pinyin_map(fp)
 
 
 def parse_kmandain():
-    with open('pinyin.txt') as fp:
-        return parse_pinyins(fp)
+    with open('pinyin.txt', encoding='utf8') as fp:
+        return load_pinyin_map(fp)
 
 
 def diff(kmandarin, zdic, commons):
     for key in commons:
-        hanzi = code_to_hanzi(key)
-        if key in kmandarin:
-            value = kmandarin[key][0]
-            if key in zdic and value != zdic[key][0]:
+        code = code_to_int(key)
+        hanzi = chr(code)
+        if code in kmandarin:
+            value = kmandarin[code][0]
+            if code in zdic and value != zdic[code][0]:
                 yield '{0}: {1}  # {2} -> {3}'.format(
-                    key, value, hanzi, zdic[key][0]
+                    key, value, hanzi, zdic[code][0]
                 )
             else:
                 yield '{0}: {1}  # {2}'.format(key, value, hanzi)
-        elif key in zdic:
-            value = zdic[key][0]
+        elif code in zdic:
+            value = zdic[code][0]
             yield '{0}: {1}  # {2}'.format(key, value, hanzi)
         else:
             yield '# {0}: {1}  # {2}'.format(key, '<-', hanzi)
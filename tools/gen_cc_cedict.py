@@ -1,44 +1,70 @@
 # -*- coding: utf-8 -*-
-from cc_cedict import phrases_dict
+"""根据 phrase-pinyin-data 中的词语拼音统计单个汉字的读音
 
+    python gen_cc_cedict.py phrase-pinyin-data/cc_cedict.txt > ../cc_cedict.txt
+    python gen_cc_cedict.py phrase-pinyin-data/cc_cedict.txt --weights weights.txt
 
-class Counter:
-    def __init__(self):
-        self._data = {}
-
-    def add(self, item):
-        if item not in self._data:
-            self._data[item] = 0
-        self._data[item] += 1
-
-    def most_common(self):
-        items = self._data.items()
-        return sorted(items, key=lambda x: x[1], reverse=True)
+逐行读取词语数据，一次遍历统计每个汉字各个读音出现的次数，
+读音按次数从多到少排列，次数相同时按第一次出现的顺序。
+--weights 同时输出每个读音的次数：U+4E00: yī:1200,yí:300  # 一
+"""
+import argparse
+import collections
+import sys
 
 
 def han_to_code(han):
     return 'U+' + hex(ord(han))[2:].upper()
 
 
-def main():
-    # { 'han': pinyin_counter }
-    han_counter = {}
-    for hans, pinyin_list in phrases_dict.items():
-        if len(hans) != len(pinyin_list):
+def iter_phrases(fp):
+    """产生 (词语, [拼音])，格式与 phrase-pinyin-data 相同：一一对应: yī yī duì yìng"""
+    for line in fp:
+        line = line.split('#', 1)[0].strip()
+        if not line:
+            continue
+        hans, pinyins = line.split(':', 1)
+        yield hans.strip(), pinyins.split()
+
+
+def count_pinyins(phrases):
+    """{汉字: Counter({拼音: 次数})}，拼音数与字数不同的词语会被忽略"""
+    # 读音字符串大量重复，intern 后每个读音只保存一份
+    intern = {}
+    han_counter = collections.defaultdict(collections.Counter)
+    for hans, pinyins in phrases:
+        if len(hans) != len(pinyins):
             continue
-        for i, han in enumerate(hans):
-            pinyins = pinyin_list[i]
-            for pinyin in pinyins:
-                if han not in han_counter:
-                    han_counter[han] = Counter()
-                counter = han_counter[han]
-                counter.add(pinyin)
+        for han, pinyin in zip(hans, pinyins):
+            han_counter[han][intern.setdefault(pinyin, pinyin)] += 1
+    return han_counter
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='generate cc_cedict.txt')
+    parser.add_argument('input', nargs='?', default='phrase-pinyin-data/cc_cedict.txt',
+                        help='phrase pinyin data, default: %(default)s')
+    parser.add_argument('--weights', metavar='PATH',
+                        help='also write reading counts as frequency weights')
+    args = parser.parse_args(argv)
+
+    with open(args.input, encoding='utf8') as fp:
+        han_counter = count_pinyins(iter_phrases(fp))
 
-    for han, counter in sorted(han_counter.items(), key=lambda x: ord(x[0])):
-        code = han_to_code(han)
-        pinyin = ','.join([x[0] for x in counter.most_common()])
-        print('{0}: {1}  # {2}'.format(code, pinyin, han))
+    weights = open(args.weights, 'w', encoding='utf8') if args.weights else None
+    try:
+        for han, counter in sorted(han_counter.items(), key=lambda x: ord(x[0])):
+            code = han_to_code(han)
+            most_common = counter.most_common()
+            pinyin = ','.join([x[0] for x in most_common])
+            print('{0}: {1}  # {2}'.format(code, pinyin, han))
+            if weights is not None:
+                weights.write('{0}: {1}  # {2}\n'.format(
+                    code, ','.join('{}:{}'.format(*x) for x in most_common), han))
+    finally:
+        if weights is not None:
+            weights.close()
 
 
 if __name__ == '__main__':
-    main()
+    sys.exit(main())
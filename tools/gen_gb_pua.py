@@ -4,12 +4,13 @@ import sys
 
 sys.path.append('.')
 
-from merge_unihan import parse_pinyins
+from merge_unihan import load_pinyin_map
+from pinyin_map import code_to_int
 
 
 def get_pinyins(file_path):
-    with open(file_path) as fp:
-        return parse_pinyins(fp)
+    with open(file_path, encoding='utf8') as fp:
+        return load_pinyin_map(fp)
 
 
 def get_pua_map():
@@ -148,7 +149,7 @@ def gen_pua_data(gbk, unicode_4_1, pinyin_map):
     gbk_point = point_to_u_point(gbk_point)
     unicode_4_1_point, unicode_4_1_han = unicode_4_1
     unicode_4_1_point = point_to_u_point(unicode_4_1_point)
-    pinyins = ','.join(pinyin_map.get(unicode_4_1_point, []))
+    pinyins = ','.join(pinyin_map.get(code_to_int(unicode_4_1_point), []))
     prefix = ''
     if not pinyins:
         prefix = '# '
@@ -1,31 +1,38 @@
 # -*- coding: utf-8 -*-
-"""补充 8105 中汉字的拼音数据"""
+"""补充 8105 中汉字的拼音数据
+
+    python tools/improve_8105.py kMandarin_8105.txt > new.txt
+
+并发抓取国学大师的汉字页面，响应缓存在 .cache/guoxuedashi 中，
+每个汉字的结果记录在 --checkpoint 文件中，中断后重新运行会从中断的地方继续。
+"""
+import argparse
+import asyncio
 from collections import namedtuple
+import os
 import re
 import sys
 
 from pyquery import PyQuery
-import requests
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from fetcher import DEFAULT_CACHE_DIR, Checkpoint, Fetcher, run_all
 
 re_pinyin = re.compile(r'拼音：(?P<pinyin>\S+) ')
 re_code = re.compile(r'统一码\w?：(?P<code>\S+) ')
 re_alternate = re.compile(r'异体字：\s+?(?P<alternate>\S+)')
 HanziInfo = namedtuple('HanziInfo', 'pinyin code alternate')
+URL = 'http://www.guoxuedashi.com/zidian/so.php'
 
 
-def fetch_html(url, params):
-    response = requests.get(url, params=params)
-    return response.content
-
-
-def fetch_info(hanzi):
-    url = 'http://www.guoxuedashi.com/zidian/so.php'
+async def fetch_info(fetcher, hanzi, url=URL):
     params = {
         'sokeyzi': hanzi,
         'kz': 1,
         'submit': '',
     }
-    html = fetch_html(url, params)
+    html = await fetcher.fetch(url, params)
     pq = PyQuery(html)
     pq = PyQuery(pq('table.zui td')[1])
     text = pq('tr').text()
@@ -44,23 +51,46 @@ def fetch_info(hanzi):
     return HanziInfo(pinyin, code, alternate)
 
 
-def parse_hanzi(hanzi):
-    info = fetch_info(hanzi)
+async def parse_hanzi(fetcher, hanzi, url=URL):
+    info = await fetch_info(fetcher, hanzi, url)
     if (not info.pinyin) and info.alternate:
-        alternate = fetch_info(info.alternate)
+        alternate = await fetch_info(fetcher, info.alternate, url)
     else:
         alternate = ''
     return HanziInfo(info.pinyin, info.code, alternate)
 
 
-def main(lines):
+def _missing_code(line):
+    if line.startswith('# U+') and '<-' in line:
+        # # U+xxx ... -> U+xxx
+        code = line.split(':')[0].strip('# ')
+        # U+xxx -> xxx
+        return code[2:]
+    return None
+
+
+def fetch_all(codes, fetcher, checkpoint, url=URL):
+    """{code: HanziInfo}，抓取失败的 code 不在结果中"""
+    async def parse(code):
+        info = await parse_hanzi(fetcher, code, url)
+        # checkpoint 中保存为 JSON
+        return [info.pinyin, info.code, list(info.alternate) if info.alternate else '']
+
+    results = asyncio.run(run_all(codes, parse, checkpoint))
+    return {
+        code: HanziInfo(pinyin, code_, HanziInfo(*alternate) if alternate else '')
+        for code, (pinyin, code_, alternate) in results.items()
+    }
+
+
+def main(lines, fetcher=None, checkpoint=None, url=URL):
+    lines = list(lines)
+    infos = fetch_all([code for code in map(_missing_code, lines) if code],
+                      fetcher or Fetcher(), checkpoint or Checkpoint(None), url)
     for line in lines:
-        if line.startswith('# U+') and '<-' in line:
-            # # U+xxx ... -> U+xxx
-            code = line.split(':')[0].strip('# ')
-            # U+xxx -> xxx
-            code = code[2:]
-            info = parse_hanzi(code)
+        code = _missing_code(line)
+        if code is not None and code in infos:
+            info = infos[code]
             pinyin = info.pinyin
             extra = ''
             if (not pinyin) and info.alternate:
@@ -81,8 +111,20 @@ def main(lines):
         yield line.strip()
 
 if __name__ == '__main__':
-    args = sys.argv[1:]
-    input_file = args[0]
-    with open(input_file) as fp:
-        for line in main(fp):
+    parser = argparse.ArgumentParser(description='fill in missing pinyin of 8105')
+    parser.add_argument('input_file')
+    parser.add_argument('--url', default=URL,
+                        help='search page, can be a local server of recorded pages')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--rate', type=float, default=4,
+                        help='max requests per second per host')
+    parser.add_argument('--retries', type=int, default=3)
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR)
+    parser.add_argument('--checkpoint', default='.cache/improve_8105.jsonl',
+                        help='finished characters, used to resume an interrupted run')
+    args = parser.parse_args()
+    fetcher = Fetcher(args.concurrency, args.rate, args.retries, cache_dir=args.cache_dir)
+    os.makedirs(os.path.dirname(args.checkpoint) or '.', exist_ok=True)
+    with open(args.input_file, encoding='utf8') as fp:
+        for line in main(fp, fetcher, Checkpoint(args.checkpoint), args.url):
             print(line)
@@ -1,13 +1,22 @@
 # -*- coding: utf-8 -*-
-import functools
-import operator
-import re
+"""从 Unihan 数据库解析拼音，生成 k*.txt
 
+    python parse_pinyin.py                        # 读取 Unihan.zip，没有时读取 Unihan_Readings.txt
+    python parse_pinyin.py Unihan.zip --delta delta.json
+    python parse_pinyin.py Unihan.zip --dry-run   # 只输出变化，不修改文件
 
-def re_match_pinyin_line(kind):
-    return re.compile(
-        r'^U\+(?P<code>[0-9A-Z]+)\t{}\t(?P<pinyin>.+)$'.format(kind)
-    )
+直接从 zip 中流式读取 Unihan_Readings.txt，不需要解压。
+写入前与现有的 k*.txt 比较，输出每种读音新增、删除和修改的码位，
+内容没有变化的文件不会重写；--delta 把所有变化写入 JSON 文件。
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import re
+import sys
+import zipfile
 
 
 PINYIN = r'[^\d\.,]+'
@@ -42,61 +51,198 @@ re_kinds_map = {
 }
 
 
-def remove_dup_items(lst):
-    new_list = []
-    for item in lst:
-        if item not in new_list:
-            new_list.append(item)
-    return new_list
+KINDS = ('kHanyuPinyin', 'kMandarin', 'kHanyuPinlu', 'kXHC1983', 'kTGHZ2013')
 
 
-def parse(lines, kind='kHanyuPinyin', ignore_prefix='#') -> str:
-    re_line = re_match_pinyin_line(kind)
-    re_pinyin = re_kinds_map[kind]
+def parse_pinyin(raw_pinyin, re_pinyin):
+    # 处理有三个或三个以上拼音的情况，此时 re_pinyin.findall 的结果类似
+    # [(' xī,', 'lǔ '), (' lǔ,', 'xī')] or [('shú,dú,', 'tù')]
+    pinyins = (
+        x.strip()
+        for values in re_pinyin.findall(raw_pinyin)
+        for v in values
+        for x in v.split(',')
+    )
+    # dict 保留插入顺序，用来去重
+    return ','.join(dict.fromkeys(x for x in pinyins if x))
+
+
+def parse_all(lines, kinds=KINDS, ignore_prefix='#'):
+    """只遍历一遍 lines，按字段名分发给对应的正则，产生 (kind, code, pinyin)"""
+    kinds = set(kinds)
     for line in lines:
         line = line.strip()
         if line.startswith(ignore_prefix):
             continue
-        match = re_line.match(line)
-        if match is None:
+        # U+3400\tkMandarin\tqiū
+        fields = line.split('\t', 2)
+        if len(fields) != 3 or fields[1] not in kinds:
+            continue
+        code, kind, raw_pinyin = fields
+        if not code.startswith('U+') or not raw_pinyin:
             continue
 
-        code = match.group('code')
-        raw_pinyin = match.group('pinyin')
-        raw_pinyins = re_pinyin.findall(raw_pinyin)
-        # 处理有三个或三个以上拼音的情况，此时 raw_pinyins 类似
-        # [(' xī,', 'lǔ '), (' lǔ,', 'xī')] or [('shú,dú,', 'tù')]
-        for n, values in enumerate(raw_pinyins):
-            value = []
-            for v in values:
-                value.extend(v.split(','))
-            raw_pinyins[n] = value
-
-        pinyins = functools.reduce(
-            operator.add, raw_pinyins
-        )
-        pinyins = [x.strip() for x in pinyins if x.strip()]
-        pinyins = remove_dup_items(pinyins)
-        pinyin = ','.join(pinyins)
+        pinyin = parse_pinyin(raw_pinyin, re_kinds_map[kind])
+        if pinyin:
+            yield kind, code[2:], pinyin
+
+
+def parse(lines, kind='kHanyuPinyin', ignore_prefix='#'):
+    for _, code, pinyin in parse_all(lines, (kind,), ignore_prefix):
         yield code, pinyin
 
 
+def format_line(code, pinyin):
+    return 'U+{code}: {pinyin}  # {hanzi}\n'.format(
+        code=code, pinyin=pinyin, hanzi=chr(int(code, 16))
+    )
+
+
 def save_data(pinyins, writer):
     for code, pinyin in pinyins:
-        gl = {}
-        exec('hanzi=chr(0x{})'.format(code), gl)
-        hanzi = gl['hanzi']
-        line = 'U+{code}: {pinyin}  # {hanzi}\n'.format(
-            code=code, pinyin=pinyin, hanzi=hanzi
-        )
-        writer.write(line)
+        writer.write(format_line(code, pinyin))
+
+
+@contextlib.contextmanager
+def open_readings(path):
+    """Unihan.zip 或 Unihan_Readings.txt，zip 中的文件不解压，直接流式读取"""
+    if not zipfile.is_zipfile(path):
+        with open(path, encoding='utf8') as fp:
+            yield fp
+        return
+    with zipfile.ZipFile(path) as archive, \
+            archive.open('Unihan_Readings.txt') as raw:
+        yield io.TextIOWrapper(raw, encoding='utf8')
+
+
+def iter_kind(path):
+    """现有的 k*.txt 中的 (code, pinyin)，文件不存在时什么也不产生"""
+    if not os.path.exists(path):
+        return
+    with open(path, encoding='utf8') as fp:
+        for line in fp:
+            code, _, rest = line.partition(': ')
+            yield code[2:], rest.split('  # ', 1)[0]
+
+
+def load_kind(path):
+    """现有的 k*.txt: {code: pinyin}，文件不存在时返回空 dict"""
+    return dict(iter_kind(path))
+
+
+def diff_kind(old, new):
+    """{'added': {code: pinyin}, 'removed': {code: pinyin}, 'changed': {code: [旧, 新]}}"""
+    return {
+        'added': {code: new[code] for code in new if code not in old},
+        'removed': {code: old[code] for code in old if code not in new},
+        'changed': {code: [old[code], new[code]] for code in new
+                    if code in old and old[code] != new[code]},
+    }
+
+
+class _KindWriter:
+    """一种读音的输出：边写临时文件边与现有文件按码位归并比较
+
+    新旧两边都按码位排序（Unihan_Readings.txt 和它生成的 k*.txt 都是），
+    所以只需要各读一遍，内存中只保存变化。有变化时才用临时文件替换现有文件，
+    k*.txt 是指向根目录的符号链接时替换链接指向的文件
+    """
+
+    def __init__(self, path, dry_run):
+        self.path = os.path.realpath(path)
+        self.tmp_path = None if dry_run else self.path + '.tmp'
+        self.delta = {'added': {}, 'removed': {}, 'changed': {}}
+        self._old = iter_kind(path)
+        self._old_item = next(self._old, None)
+        self._last = -1
+        self._fp = None
+
+    def __enter__(self):
+        if self.tmp_path is not None:
+            self._fp = open(self.tmp_path, 'w', encoding='utf8')
+        return self
+
+    def _pop_removed(self, before):
+        """旧文件中码位小于 before 的都是删除的"""
+        while self._old_item is not None and int(self._old_item[0], 16) < before:
+            self.delta['removed'][self._old_item[0]] = self._old_item[1]
+            self._old_item = next(self._old, None)
+
+    def write(self, code, pinyin):
+        value = int(code, 16)
+        if value <= self._last:
+            raise ValueError('U+{} is not sorted'.format(code))
+        self._last = value
+        self._pop_removed(value)
+        old = self._old_item
+        if old is not None and int(old[0], 16) == value:
+            if old[1] != pinyin:
+                self.delta['changed'][code] = [old[1], pinyin]
+            self._old_item = next(self._old, None)
+        else:
+            self.delta['added'][code] = pinyin
+        if self._fp is not None:
+            self._fp.write(format_line(code, pinyin))
+
+    def finish(self):
+        """写完所有读音后调用，返回 diff_kind 格式的变化"""
+        self._pop_removed(float('inf'))
+        if self._fp is not None:
+            self._fp.close()
+            self._fp = None
+            if any(self.delta.values()):
+                os.replace(self.tmp_path, self.path)
+            else:
+                os.remove(self.tmp_path)
+        return self.delta
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._fp is not None:  # 出错时保留现有文件
+            self._fp.close()
+            os.remove(self.tmp_path)
+
+
+def save_all(lines, kinds=KINDS, directory='.', dry_run=False):
+    """返回 {kind: diff_kind 的结果}，有变化的 kind 才重写文件
+
+    与 parse_all 一样只遍历一遍 lines，所有读音同时流式写入各自的文件，
+    不在内存中保存解析结果
+    """
+    with contextlib.ExitStack() as stack:
+        writers = {
+            kind: stack.enter_context(_KindWriter(
+                os.path.join(directory, '{}.txt'.format(kind)), dry_run))
+            for kind in kinds
+        }
+        for kind, code, pinyin in parse_all(lines, kinds):
+            writers[kind].write(code, pinyin)
+        return {kind: writer.finish() for kind, writer in writers.items()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='parse pinyin from the Unihan database')
+    parser.add_argument('input', nargs='?',
+                        help='Unihan.zip or Unihan_Readings.txt, default whichever exists')
+    parser.add_argument('--delta', metavar='PATH',
+                        help='write added, removed and changed code points as JSON')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='only report changes, do not write k*.txt')
+    args = parser.parse_args(argv)
+
+    path = args.input
+    if path is None:
+        path = 'Unihan.zip' if os.path.exists('Unihan.zip') else 'Unihan_Readings.txt'
+    with open_readings(path) as fp:
+        delta = save_all(fp, dry_run=args.dry_run)
+
+    print('{:14} {:>8} {:>8} {:>8}'.format('', 'added', 'removed', 'changed'))
+    for kind, changes in delta.items():
+        print('{:14} {:8} {:8} {:8}'.format(kind, *map(len, changes.values())))
+    if args.delta:
+        with open(args.delta, 'w', encoding='utf8') as fp:
+            json.dump(delta, fp, ensure_ascii=False, indent=1, sort_keys=True)
+    return 0
 
 
 if __name__ == '__main__':
-    with open('Unihan_Readings.txt') as fp:
-        for kind in ('kHanyuPinyin', 'kMandarin',
-                     'kHanyuPinlu', 'kXHC1983', 'kTGHZ2013'):
-            fp.seek(0)
-            with open('{}.txt'.format(kind), 'w') as writer:
-                pinyins = parse(fp.readlines(), kind=kind)
-                save_data(pinyins, writer)
+    sys.exit(main())
@@ -0,0 +1,320 @@
+# -*- coding: utf-8 -*-
+"""检查所有拼音数据文件
+
+    python validate.py                  # 检查所有数据文件
+    python validate.py overwrite.txt    # 只检查指定的文件，可以作为 pre-commit 钩子
+
+每个文件在进程池中分块读取，检查：
+
+* 格式：merge_unihan.parse_pinyins 不能解析的行是错误，
+  不是 U+XXXX: 拼音,拼音  # 汉字（拼音也可以用一个空格分隔）的行是警告
+* 注释中的汉字与码位一致
+* 码位没有重复，手工维护的文件以外码位是有序的
+* 拼音去掉声调后是已知的音节（SYLLABLES），同一行中没有重复的拼音
+* 没有组合字符和形近字符，例如 i + U+0301 代替 í、ɡ (U+0261) 代替 g
+
+合并时使用的文件（merge_unihan.SOURCES）和 pinyin.txt 中的问题是错误，
+其他文件（zdic.txt、Unihan 的 kHanyuPinyin.txt 等）只用于参考，问题作为警告输出。
+有错误时返回 1。没有改动的文件使用 .cache/validate.json 中上次的结果。
+"""
+import argparse
+from collections import namedtuple
+import concurrent.futures
+import functools
+import glob
+import itertools
+import json
+import os
+import re
+import sys
+import unicodedata
+
+import merge_unihan
+import pinyin_tone
+
+DATA_DIR = os.path.dirname(os.path.abspath(__file__))
+# 不是 U+XXXX: 拼音 格式的 txt 文件的前缀：生成的 pinyin_compact.txt、
+# pinyin_compact_gb2312.txt 等子集和 output_*.txt
+NOT_DATA = ('pinyin_compact', 'output_')
+STRICT_FILES = frozenset(merge_unihan.SOURCES + ('pinyin.txt',))  # 相对于 DATA_DIR
+
+# 去掉声调后的所有音节，最后的 r 是 kHanyuPinlu 中的儿化音
+SYLLABLES = frozenset('''
+a ai an ang ao e ei en eng er o ou
+ba bai ban bang bao bei ben beng bi bian biang biao bie bin bing bo bu
+pa pai pan pang pao pei pen peng pi pian piao pie pin ping po pou pu
+ma mai man mang mao me mei men meng mi mian miao mie min ming miu mo mou mu
+fa fan fang fei fen feng fiao fo fou fu
+da dai dan dang dao de dei den deng di dia dian diao die din ding diu dong dou du
+duan dui dun duo
+ta tai tan tang tao te tei teng ti tian tiao tie ting tong tou tu tuan tui tun tuo
+na nai nan nang nao ne nei nen neng ni nian niang niao nie nin ning niu nong nou
+nu nuan nun nuo nv nve
+la lai lan lang lao le lei leng li lia lian liang liao lie lin ling liu lo long lou
+lu luan lun luo lv lve
+ga gai gan gang gao ge gei gen geng gong gou gu gua guai guan guang gui gun guo
+ka kai kan kang kao ke kei ken keng kong kou ku kua kuai kuan kuang kui kun kuo
+ha hai han hang hao he hei hen heng hong hou hu hua huai huan huang hui hun huo
+ji jia jian jiang jiao jie jin jing jiong jiu ju juan jue jun
+qi qia qian qiang qiao qie qin qing qiong qiu qu quan que qun
+xi xia xian xiang xiao xie xin xing xiong xiu xu xuan xue xun
+zha zhai zhan zhang zhao zhe zhei zhen zheng zhi zhong zhou zhu zhua zhuai zhuan
+zhuang zhui zhun zhuo
+cha chai chan chang chao che chen cheng chi chong chou chu chua chuai chuan chuang
+chui chun chuo
+sha shai shan shang shao she shei shen sheng shi shou shu shua shuai shuan shuang
+shui shun shuo
+ran rang rao re ren reng ri rong rou ru rua ruan rui run ruo
+za zai zan zang zao ze zei zen zeng zi zong zou zu zuan zui zun zuo
+ca cai can cang cao ce cei cen ceng ci cong cou cu cuan cui cun cuo
+sa sai san sang sao se sen seng si song sou su suan sui sun suo
+ya yan yang yao ye yi yin ying yo yong you yu yuan yue yun
+wa wai wan wang wei wen weng wo wong wu
+hm hng m n ng
+r
+'''.split())
+# 拼音中可以出现的字符，组合字符只能出现在 pinyin_tone.TONE_SEQUENCES 中
+LETTERS = frozenset('abcdefghijklmnopqrstuvwxyz') | frozenset(pinyin_tone.TONE_MARKS)
+
+# 与 merge_unihan.iter_pinyins 接受的格式相同：前后和冒号两边可以有空白，注释可以省略，
+# 拼音之间用一个逗号或任意个空白分隔（", " 会被解析出一个空拼音）
+_READINGS = r'[^\s,#:]+(?:(?:,|\s+)[^\s,#:]+)*'
+_LINE = re.compile(r'\s*U\+([0-9A-Fa-f]{4,6})\s*:\s*(' + _READINGS
+                   + r')\s*(?:#\s*(\S?).*)?$')
+# 标准格式，其他能解析的格式只是警告
+_FORMAT = re.compile(r'U\+[0-9A-F]{4,6}: [^\s,#]+(?:[, ][^\s,#]+)*  # \S')
+_FORMAT_READINGS = re.compile(rb'[^\s,#]+(?:[, ][^\s,#]+)*')
+# 用于在整块 bytes 中查找，\n 开头比 ^ 和 re.M 快得多；
+# 拼音部分的格式由 check_readings 和 _FORMAT_READINGS 检查，这里的正则尽量简单
+_BLOCK_LINE = re.compile(rb'\nU\+([0-9A-F]{4,6}): ([^\n#]+)  # (\S+)')
+_READINGS = re.compile(_READINGS)
+BLOCK_SIZE = 1 << 14
+CACHE_PATH = os.path.join(DATA_DIR, '.cache', 'validate.json')
+
+Problem = namedtuple('Problem', 'path line level message')
+
+
+def is_data_file(path):
+    """根目录和 unihan 目录中的 U+XXXX: 拼音 格式的 txt 文件"""
+    directory, name = os.path.split(os.path.abspath(path))
+    return (directory in (DATA_DIR, os.path.join(DATA_DIR, 'unihan'))
+            and name.endswith('.txt') and not name.startswith(NOT_DATA))
+
+
+def data_files():
+    paths = sorted(glob.glob(os.path.join(DATA_DIR, '*.txt')))
+    paths += sorted(glob.glob(os.path.join(DATA_DIR, 'unihan', '*.txt')))
+    return [path for path in paths if is_data_file(path)]
+
+
+@functools.lru_cache(maxsize=None)
+def _check_reading(reading):
+    letters = reading
+    for sequence in pinyin_tone.TONE_SEQUENCES:
+        letters = letters.replace(sequence, '')
+    for char in letters:
+        if char in LETTERS:
+            continue
+        nfc = unicodedata.normalize('NFC', reading)
+        if unicodedata.combining(char) and nfc != reading:
+            return '{!r}: combining character U+{:04X}, use {!r}'.format(
+                reading, ord(char), nfc)
+        return '{!r}: unexpected character U+{:04X} {}'.format(
+            reading, ord(char), unicodedata.name(char, ''))
+    if pinyin_tone.convert(reading).ascii not in SYLLABLES:
+        return '{!r}: unknown syllable'.format(reading)
+    return None
+
+
+@functools.lru_cache(maxsize=None)
+def check_readings(pinyins):
+    """一行中拼音部分的问题，拼音部分大量重复，结果缓存起来"""
+    if not _READINGS.fullmatch(pinyins):
+        return ('syntax: {!r}'.format(pinyins),)
+    messages = []
+    readings = pinyins.replace(',', ' ').split()
+    for reading in dict.fromkeys(readings):
+        message = _check_reading(reading)
+        if message is not None:
+            messages.append(message)
+    if len(set(readings)) != len(readings):
+        messages.append('duplicate readings: {}'.format(pinyins))
+    return tuple(messages)
+
+
+@functools.lru_cache(maxsize=None)
+def _check_readings_bytes(pinyins):
+    try:
+        return check_readings(pinyins.decode('utf8'))
+    except UnicodeDecodeError:
+        return ('invalid UTF-8',)
+
+
+class _FileChecker:
+    """逐块检查一个文件，码位是否重复和有序需要跨块记录"""
+
+    def __init__(self, path):
+        name = os.path.relpath(path, DATA_DIR)
+        self.path = path
+        self.level = 'error' if name in STRICT_FILES else 'warning'
+        self.check_order = name not in merge_unihan.EDITABLE_SOURCES
+        self.seen = set()
+        self.last = -1
+
+    def block_ok(self, lines):
+        """整块没有问题时返回 True
+
+        lines 是 bytes，只用正则和内置函数检查，不逐行执行 Python 代码。
+        以 U 开头的行都匹配 _BLOCK_LINE，其他行都是注释或空行时格式才是正确的
+        """
+        text = b'\n' + b''.join(lines)
+        found = _BLOCK_LINE.findall(text)
+        if (len(found) != text.count(b'\nU') or len(lines) != len(found)
+                + text.count(b'\n#') + text.count(b'\n\n')):
+            return False
+        if not found:
+            return True
+        hexes, pinyins, hanzi = zip(*found)
+        codes = list(map(int, hexes, itertools.repeat(16)))
+        if ''.join(map(chr, codes)).encode('utf8') != b''.join(hanzi):
+            return False
+        if len(set(codes)) != len(codes) or not self.seen.isdisjoint(codes):
+            return False
+        if self.check_order and (codes[0] < self.last or codes != sorted(codes)):
+            return False
+        pinyins = set(pinyins)
+        if (not all(map(_FORMAT_READINGS.fullmatch, pinyins))
+                or any(map(_check_readings_bytes, pinyins))):
+            return False
+        self.seen.update(codes)
+        self.last = max(self.last, codes[-1] if self.check_order else max(codes))
+        return True
+
+    def check_lines(self, lines, first):
+        problems = []
+        level = self.level
+        for number, line in enumerate(lines, first):
+            if line.lstrip().startswith('#') or not line.strip():
+                continue
+            m = _LINE.match(line)
+            if m is None:
+                problems.append(Problem(self.path, number, level, 'syntax: {}'.format(
+                    line.rstrip('\r\n'))))
+                continue
+            if _FORMAT.match(line) is None:
+                problems.append(Problem(self.path, number, 'warning', 'format: {}'.format(
+                    line.rstrip('\r\n'))))
+            code, pinyins, hanzi = m.groups()
+            code = int(code, 16)
+            if hanzi and hanzi != chr(code):
+                problems.append(Problem(self.path, number, level,
+                                        'U+{:04X} is {} but comment is {}'.format(
+                                            code, chr(code), hanzi)))
+            if code in self.seen:
+                problems.append(Problem(self.path, number, level,
+                                        'duplicate code U+{:04X}'.format(code)))
+            elif self.check_order and code < self.last:
+                problems.append(Problem(self.path, number, level,
+                                        'U+{:04X} is not sorted'.format(code)))
+            self.seen.add(code)
+            self.last = max(self.last, code)
+            for message in check_readings(pinyins):
+                problems.append(Problem(self.path, number, level, message))
+        return problems
+
+
+def validate_file(path):
+    """返回 [Problem]
+
+    每次读入 BLOCK_SIZE 左右的行，整块检查，只有块中有问题时才逐行检查找出行号
+    """
+    checker = _FileChecker(path)
+    problems = []
+    first = 1
+    with open(path, 'rb') as fp:
+        while True:
+            lines = fp.readlines(BLOCK_SIZE)
+            if not lines:
+                break
+            if not checker.block_ok(lines):
+                problems.extend(checker.check_lines(
+                    [line.decode('utf8', 'replace') for line in lines], first))
+            first += len(lines)
+    return problems
+
+
+def _load_state(path):
+    try:
+        with open(path, encoding='utf8') as fp:
+            return json.load(fp)
+    except (OSError, ValueError):
+        return {}
+
+
+def validate(paths, processes=None, cache_path=CACHE_PATH):
+    """并行检查多个文件，按文件和行号排序返回所有 Problem
+
+    cache_path 不为 None 时，内容和检查代码都没有变化的文件直接使用上次的结果
+    """
+    state = {}
+    # 读音的解析和声调规则也在 merge_unihan 和 pinyin_tone 中
+    code = ','.join(merge_unihan.file_hash(os.path.abspath(path)) for path in (
+        __file__, merge_unihan.__file__, pinyin_tone.__file__))
+    if cache_path is not None:
+        state = _load_state(cache_path)
+        if state.get('code') != code:
+            state = {}
+    files = state.setdefault('files', {})
+    hashes = {path: merge_unihan.file_hash(path) for path in paths}
+    todo = [path for path in paths
+            if files.get(os.path.abspath(path), {}).get('hash') != hashes[path]]
+
+    if processes is None:
+        processes = os.cpu_count() or 1
+    if len(todo) < 2 or processes == 1:
+        results = map(validate_file, todo)
+    else:
+        with concurrent.futures.ProcessPoolExecutor(processes) as pool:
+            results = pool.map(validate_file, todo)
+    for path, problems in zip(todo, results):
+        files[os.path.abspath(path)] = {
+            'hash': hashes[path],
+            'problems': [problem[1:] for problem in problems],
+        }
+
+    if cache_path is not None and todo:
+        state['code'] = code
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        with open(cache_path, 'w', encoding='utf8') as fp:
+            json.dump(state, fp, ensure_ascii=False)
+    return [Problem(path, *problem) for path in paths
+            for problem in files[os.path.abspath(path)]['problems']]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='validate pinyin data files')
+    parser.add_argument('paths', nargs='*', help='files to check, default all data files')
+    parser.add_argument('-j', '--processes', type=int, default=None,
+                        help='number of worker processes, default all cores')
+    parser.add_argument('-q', '--quiet', action='store_true', help='do not print warnings')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='check all files even if they did not change')
+    args = parser.parse_args(argv)
+
+    # 作为 pre-commit 钩子时会传入所有改动的文件，只检查其中的数据文件
+    paths = [path for path in args.paths if is_data_file(path)] if args.paths else data_files()
+    problems = validate(paths, args.processes,
+                        None if args.no_cache else CACHE_PATH)
+    errors = 0
+    for problem in problems:
+        if problem.level == 'error':
+            errors += 1
+        elif args.quiet:
+            continue
+        print('{}:{}: {}: {}'.format(os.path.relpath(problem.path), problem.line,
+                                     problem.level, problem.message))
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())